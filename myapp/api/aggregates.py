@@ -0,0 +1,191 @@
+import math
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from api import catalogue
+from api.models import ProfessorAggregate, ProfessorModuleAggregate, ProfessorTermAggregate, Rating
+
+# Aggregates
+# Description: Maintain the materialised rating totals read by the view, average and trends endpoints,
+# per professor, per professor/module pair and per professor/module pair in each (year, semester) term.
+# Each aggregate row stores the sum and count of matching ratings so an average is one lookup,
+# and how many of them gave each star value so the distribution is one lookup too.
+# Totals are handled as tuples of (total, count, stars_1, ..., stars_5).
+
+STARS = range(1, 6)
+STAR_FIELDS = tuple(f'stars_{star}' for star in STARS)
+FIELDS = ('total', 'count') + STAR_FIELDS
+EMPTY = (0,) * len(FIELDS)
+
+
+# Totals of a single rating
+def _totals(rating):
+    rating = int(rating)
+    return (rating, 1) + tuple(int(star == rating) for star in STARS)
+
+
+def _add(a, b):
+    return tuple(x + y for x, y in zip(a, b))
+
+
+# Apply a batch of rating changes to the aggregates
+# ratings: iterable of (moduleInstanceProfessor id, rating value) pairs
+# sign: 1 when the ratings were added, -1 when they were removed
+# targets: {moduleInstanceProfessor id: (professor_id, module_id, year, semester)} to count the ratings
+#          under, if not the catalogue's current ones (e.g. where they were before the catalogue changed)
+def record(ratings, sign=1, targets=None):
+    ratings = list(ratings)
+    if not ratings:
+        return
+
+    # Resolve the professor, module and term behind each module instance professor, from the catalogue index
+    if targets is None:
+        targets = catalogue.targets({mip_id for mip_id, _ in ratings})
+
+    # Sum up the changes per professor, per professor/module pair and per pair in each term
+    professor_deltas = defaultdict(lambda: EMPTY)
+    pair_deltas = defaultdict(lambda: EMPTY)
+    term_deltas = defaultdict(lambda: EMPTY)
+    for mip_id, rating in ratings:
+        if mip_id not in targets:
+            continue
+        professor_id, module_id, year, semester = targets[mip_id]
+        delta = tuple(sign * value for value in _totals(rating))
+        professor_deltas[professor_id] = _add(professor_deltas[professor_id], delta)
+        pair_deltas[(professor_id, module_id)] = _add(pair_deltas[(professor_id, module_id)], delta)
+        term = (professor_id, module_id, year, semester)
+        term_deltas[term] = _add(term_deltas[term], delta)
+
+    with transaction.atomic():
+        for professor_id, delta in professor_deltas.items():
+            _apply(ProfessorAggregate, {'professor_id': professor_id}, delta)
+        for (professor_id, module_id), delta in pair_deltas.items():
+            _apply(ProfessorModuleAggregate, {'professor_id': professor_id, 'module_id': module_id}, delta)
+        for (professor_id, module_id, year, semester), delta in term_deltas.items():
+            _apply(ProfessorTermAggregate, {'professor_id': professor_id, 'module_id': module_id, 'year': year, 'semester': semester}, delta)
+
+
+def _apply(model, lookup, delta):
+    # Increment in the database so concurrent writers don't lose updates
+    changes = {field: F(field) + value for field, value in zip(FIELDS, delta) if value}
+    if not changes:
+        return
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    # Removing ratings from a row that doesn't exist (e.g. deleted with its professor) has nothing to undo
+    if delta[FIELDS.index('count')] < 0:
+        return
+    model.objects.get_or_create(**lookup)
+    model.objects.filter(**lookup).update(**changes)
+
+
+# Compute the aggregates from scratch using the raw ratings
+# Returns ({professor_id: totals}, {(professor_id, module_id): totals},
+#          {(professor_id, module_id, year, semester): totals})
+def compute():
+    professors = defaultdict(lambda: EMPTY)
+    pairs = defaultdict(lambda: EMPTY)
+    terms = defaultdict(lambda: EMPTY)
+    rows = Rating.objects.values_list(
+        'moduleInstanceProfessor__professor_id',
+        'moduleInstanceProfessor__moduleInstance__module_id',
+        'moduleInstanceProfessor__moduleInstance__year',
+        'moduleInstanceProfessor__moduleInstance__semester',
+        'rating',
+    ).annotate(count=Count('id')).order_by()
+    for professor_id, module_id, year, semester, rating, count in rows:
+        totals = tuple(value * count for value in _totals(rating))
+        professors[professor_id] = _add(professors[professor_id], totals)
+        pairs[(professor_id, module_id)] = _add(pairs[(professor_id, module_id)], totals)
+        terms[(professor_id, module_id, year, semester)] = _add(terms[(professor_id, module_id, year, semester)], totals)
+    return dict(professors), dict(pairs), dict(terms)
+
+
+# Read the stored aggregates in the same shape as compute(), ignoring empty rows
+def stored():
+    professors = {
+        row[0]: tuple(row[1:])
+        for row in ProfessorAggregate.objects.filter(count__gt=0).values_list('professor_id', *FIELDS)
+    }
+    pairs = {
+        tuple(row[:2]): tuple(row[2:])
+        for row in ProfessorModuleAggregate.objects.filter(count__gt=0).values_list('professor_id', 'module_id', *FIELDS)
+    }
+    terms = {
+        tuple(row[:4]): tuple(row[4:])
+        for row in ProfessorTermAggregate.objects.filter(count__gt=0).values_list('professor_id', 'module_id', 'year', 'semester', *FIELDS)
+    }
+    return professors, pairs, terms
+
+
+# Replace the stored aggregates with ones computed from the raw ratings
+def rebuild():
+    professors, pairs, terms = compute()
+    with transaction.atomic():
+        ProfessorAggregate.objects.all().delete()
+        ProfessorModuleAggregate.objects.all().delete()
+        ProfessorTermAggregate.objects.all().delete()
+        ProfessorAggregate.objects.bulk_create(
+            ProfessorAggregate(professor_id=professor_id, **dict(zip(FIELDS, totals)))
+            for professor_id, totals in professors.items()
+        )
+        ProfessorModuleAggregate.objects.bulk_create(
+            ProfessorModuleAggregate(professor_id=professor_id, module_id=module_id, **dict(zip(FIELDS, totals)))
+            for (professor_id, module_id), totals in pairs.items()
+        )
+        ProfessorTermAggregate.objects.bulk_create(
+            ProfessorTermAggregate(professor_id=professor_id, module_id=module_id, year=year, semester=semester, **dict(zip(FIELDS, totals)))
+            for (professor_id, module_id, year, semester), totals in terms.items()
+        )
+
+
+# Compare the stored aggregates against the raw ratings
+# Returns a list of human readable mismatches, empty if the aggregates are correct
+def verify():
+    mismatches = []
+    labels = (
+        lambda professor_id: f"professor {professor_id}",
+        lambda pair: f"professor {pair[0]} module {pair[1]}",
+        lambda term: f"professor {term[0]} module {term[1]} {term[2]} semester {term[3]}",
+    )
+    for label, expected_rows, actual_rows in zip(labels, compute(), stored()):
+        for key in sorted(expected_rows.keys() | actual_rows.keys()):
+            expected = expected_rows.get(key, EMPTY)
+            actual = actual_rows.get(key, EMPTY)
+            if expected != actual:
+                mismatches.append(f"{label(key)}: expected {expected}, stored {actual}")
+    return mismatches
+
+
+# Average of an aggregate row, rounded as the endpoints report it
+def average(total, count):
+    if not count:
+        return None
+    return round(total / count)
+
+
+# Distribution of the star values counted by an aggregate row (or None for no ratings)
+# Computed from the star counts alone, so it takes the same time however many ratings there are
+# Returns {counts: {star: count}, mean, median, stdev}, with None statistics when there are no ratings
+def distribution(aggregate):
+    counts = [getattr(aggregate, field) for field in STAR_FIELDS] if aggregate else [0] * len(STARS)
+    count = sum(counts)
+    result = {"counts": {str(star): n for star, n in zip(STARS, counts)}, "mean": None, "median": None, "stdev": None}
+    if not count:
+        return result
+
+    mean = sum(star * n for star, n in zip(STARS, counts)) / count
+
+    # Star value at a position in the sorted ratings
+    def nth(index):
+        for star, n in zip(STARS, counts):
+            if index < n:
+                return star
+            index -= n
+
+    median = (nth((count - 1) // 2) + nth(count // 2)) / 2
+    stdev = math.sqrt(sum(n * (star - mean) ** 2 for star, n in zip(STARS, counts)) / count)
+    result.update(mean=round(mean, 2), median=median, stdev=round(stdev, 2))
+    return result
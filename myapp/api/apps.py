@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Connect signal receivers
+        from api import signals  # noqa: F401
+
+        # Time the queries of every database connection, see api/timing.py
+        from django.db.backends.signals import connection_created
+        from api import timing
+        connection_created.connect(timing.connect_query_recorder)
+
+        # Start the write-behind drainer with the first request, see api/writebehind.py
+        from django.core.signals import request_started
+        from api import writebehind
+        request_started.connect(writebehind.start_worker, dispatch_uid='api.writebehind.start_worker')
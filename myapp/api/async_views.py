@@ -0,0 +1,115 @@
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods
+
+from api import catalogue, pagination, versions
+from api.cache import cached_response
+from api.conditional import conditional_response
+from api.models import Professor, ProfessorModuleAggregate
+from api.timing import JsonResponse
+from api.views import _average_row, _filter_instances, _filter_professors, _list_queryset, _list_row, _view_row
+
+# Async views
+# Description: Async versions of the read endpoints in api/views.py, using the async ORM so an
+# ASGI server doesn't tie up a thread per request while waiting on the database.
+# They take the same parameters and return the same responses as their sync counterparts.
+# Routed instead of the sync views when API_ASYNC_VIEWS is set, see api/urls.py.
+
+
+# Stream list rows as NDJSON, one JSON object per line
+async def _astream_list_rows(first, rows):
+    yield json.dumps(_list_row(first)) + "\n"
+    async for instance in rows:
+        yield json.dumps(_list_row(instance)) + "\n"
+
+
+# List
+# Description: Async version of api.views.list_view
+@require_http_methods(["GET"])
+@conditional_response([versions.CATALOGUE])
+@cached_response("list", [versions.CATALOGUE])
+async def alist_view(request):
+    try:
+        instances = _list_queryset()
+
+        # Apply filters and pagination
+        try:
+            instances = _filter_instances(request, instances)
+            instances, next_url = await pagination.apaginate(request, instances)
+        except ValueError:
+            return HttpResponse("Filters and page parameters must be numbers where expected", status=400, content_type="text/plain")
+
+        if request.GET.get('format') == 'ndjson':
+            rows = aiter(instances.aiterator(chunk_size=getattr(settings, 'API_LIST_CHUNK_SIZE', 500)))
+            first = await anext(rows, None)
+            if first is None:
+                return HttpResponse("No module instances found", status=404, content_type="text/plain")
+            response = StreamingHttpResponse(_astream_list_rows(first, rows), status=200, content_type="application/x-ndjson")
+            return pagination.link(response, next_url)
+
+        # Build response
+        data = [_list_row(instance) async for instance in instances]
+        if not data:
+            return HttpResponse("No module instances found", status=404, content_type="text/plain")
+        return pagination.link(JsonResponse(data, safe=False, status=200), next_url)
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
+
+
+# View
+# Description: Async version of api.views.view_view
+@require_http_methods(["GET"])
+@conditional_response([versions.CATALOGUE, versions.RATINGS])
+@cached_response("view", [versions.CATALOGUE, versions.RATINGS])
+async def aview_view(request):
+    try:
+        professors = Professor.objects.select_related('aggregate').order_by('id')
+
+        # Apply filters and pagination
+        try:
+            professors = _filter_professors(request, professors)
+            professors, next_url = await pagination.apaginate(request, professors)
+        except ValueError:
+            return HttpResponse("Filters and page parameters must be numbers where expected", status=400, content_type="text/plain")
+
+        # Build response
+        data = [_view_row(professor) async for professor in professors]
+        if not data:
+            return HttpResponse("No ratings found", status=404, content_type="text/plain")
+        return pagination.link(JsonResponse(data, safe=False, status=200), next_url)
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
+
+
+# Average
+# Description: Async version of api.views.average_view
+@require_http_methods(["GET"])
+@conditional_response([versions.CATALOGUE, versions.RATINGS])
+@cached_response("average", [versions.CATALOGUE, versions.RATINGS])
+async def aaverage_view(request):
+    try:
+        # Unpack params
+        professor_code = request.GET.get('professor_code')
+        module_code = request.GET.get('module_code')
+        if not professor_code or not module_code:
+            return HttpResponse("Missing required fields", status=422, content_type="text/plain")
+
+        # Look up professor and module details in the catalogue index, at the catalogue version the request was checked against
+        index = await catalogue.aindex((await versions.afor_request(request, versions.CATALOGUE, versions.RATINGS))[0])
+        professor = index.professors.get(professor_code)
+        module = index.modules.get(module_code)
+        if professor is None or module is None:
+            return HttpResponse("Professor or module not found", status=404, content_type="text/plain")
+
+        # Look up the materialised rating totals for the professor/module pair
+        aggregate = await ProfessorModuleAggregate.objects.filter(professor=professor, module=module).afirst()
+
+        # Build response
+        return JsonResponse(_average_row(professor, module, aggregate), status=200)
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
@@ -0,0 +1,99 @@
+import json
+
+from api.models import ModuleInstanceProfessor, Rating
+
+# Bulk
+# Description: Helpers for rating many module instance professors in one request.
+# Rows are validated and resolved as sets so the number of queries doesn't depend on the
+# number of rows, then the view inserts whatever is left with bulk_create.
+
+FIELDS = ("professor_code", "module_code", "year", "semester", "rating")
+# Largest number of targets looked up per query, keeping each query well under SQLite's bound variable limit
+LOOKUP_CHUNK_SIZE = 500
+
+
+# Convert a JSON number or string to an int, rejecting fractions rather than truncating them
+# Raises ValueError (or TypeError) if the value isn't a whole number
+def _whole_number(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, float) and not value.is_integer():
+        raise ValueError
+    return int(value)
+
+
+# Parse a request body holding either a JSON array or NDJSON (one JSON object per line)
+# Raises ValueError if the body can't be parsed
+def parse_body(body, content_type):
+    text = body.decode("utf-8")
+    if content_type == "application/x-ndjson" or not text.lstrip().startswith("["):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    rows = json.loads(text)
+    if not isinstance(rows, list):
+        raise ValueError("Expected a JSON array")
+    return rows
+
+
+# Validate a single row
+# Returns ((module_code, year, semester, professor_code), rating) on success
+# Raises ValueError with a reason otherwise
+def validate_row(row):
+    if not isinstance(row, dict):
+        raise ValueError("Row is not an object")
+    missing = [field for field in FIELDS if row.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    try:
+        year = _whole_number(row["year"])
+        semester = _whole_number(row["semester"])
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("Year and semester must be whole numbers")
+    try:
+        rating = round(float(row["rating"]))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError("Provided rating is not a number")
+    if rating < 1 or rating > 5:
+        raise ValueError("Rating must be between 1 and 5")
+    return (str(row["module_code"]), year, semester, str(row["professor_code"])), rating
+
+
+# Split values into sorted lists of at most LOOKUP_CHUNK_SIZE, one per lookup query
+def _chunks(values):
+    values = sorted(values)
+    for start in range(0, len(values), LOOKUP_CHUNK_SIZE):
+        yield values[start:start + LOOKUP_CHUNK_SIZE]
+
+
+# Resolve (module_code, year, semester, professor_code) keys to module instance professor ids,
+# with one query per LOOKUP_CHUNK_SIZE keys
+# Returns {key: moduleInstanceProfessor id} for the keys that exist
+def resolve_targets(keys):
+    keys = set(keys)
+    targets = {}
+    for chunk in _chunks(keys):
+        candidates = ModuleInstanceProfessor.objects.filter(
+            moduleInstance__module__code__in={key[0] for key in chunk},
+            moduleInstance__year__in={key[1] for key in chunk},
+            moduleInstance__semester__in={key[2] for key in chunk},
+            professor__code__in={key[3] for key in chunk},
+        ).order_by('id').values_list(
+            'id', 'moduleInstance__module__code', 'moduleInstance__year', 'moduleInstance__semester', 'professor__code'
+        )
+        for mip_id, module_code, year, semester, professor_code in candidates:
+            key = (module_code, year, semester, professor_code)
+            # The filter above matches the cross product of the keys, so only keep the ones asked for
+            if key in keys:
+                targets.setdefault(key, mip_id)
+    return targets
+
+
+# Get the module instance professor ids out of the given ones that a user has already rated,
+# with one query per LOOKUP_CHUNK_SIZE ids
+def already_rated(user_id, mip_ids):
+    rated = set()
+    for chunk in _chunks(set(mip_ids)):
+        rated.update(Rating.objects.filter(
+            user_id=user_id,
+            moduleInstanceProfessor_id__in=chunk,
+        ).values_list('moduleInstanceProfessor_id', flat=True))
+    return rated
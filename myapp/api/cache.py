@@ -0,0 +1,109 @@
+import hashlib
+import threading
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from api import versions
+
+# Cache
+# Description: Cache the bodies of read endpoints, keyed by endpoint, query parameters and
+# the data versions the endpoint depends on. Writes change the versions, so stale entries
+# are never served and simply age out of the cache.
+# The backend is the Django cache named by API_CACHE_ALIAS - see CACHES in settings.py.
+
+# Response headers stored alongside cached bodies
+CACHED_HEADERS = ('Content-Type', 'Link')
+
+_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0}
+
+
+def _count(counter):
+    with _lock:
+        _counters[counter] += 1
+
+
+# Hit and miss counts for this process
+def stats():
+    with _lock:
+        return dict(_counters)
+
+
+def reset_stats():
+    with _lock:
+        for counter in _counters:
+            _counters[counter] = 0
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def make_key(endpoint, request, stamps):
+    params = sorted((key, value) for key in request.GET for value in request.GET.getlist(key))
+    digest = hashlib.md5(repr((params, stamps)).encode()).hexdigest()
+    return f"api:{endpoint}:{digest}"
+
+
+# Decorator to cache successful GET responses of a view, sync or async
+# endpoint: name used in the cache key
+# scopes: data version scopes the response is built from
+def cached_response(endpoint, scopes):
+    scopes = tuple(scopes)
+
+    # What to cache for a response, or None if it shouldn't be cached
+    def entry_for(response):
+        if response.status_code == 200 and not response.streaming:
+            headers = {header: response[header] for header in CACHED_HEADERS if response.has_header(header)}
+            return (headers, response.content)
+        return None
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method != 'GET':
+                    return await view(request, *args, **kwargs)
+
+                cache = get_cache()
+                rows = await versions.afor_request(request, *scopes)
+                key = make_key(endpoint, request, tuple(row.stamp for row in rows))
+                cached = await cache.aget(key)
+                if cached is not None:
+                    _count('hits')
+                    headers, content = cached
+                    return HttpResponse(content, status=200, headers=headers)
+
+                _count('misses')
+                response = await view(request, *args, **kwargs)
+                entry = entry_for(response)
+                if entry is not None:
+                    await cache.aset(key, entry)
+                return response
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            cache = get_cache()
+            key = make_key(endpoint, request, tuple(row.stamp for row in versions.for_request(request, *scopes)))
+            cached = cache.get(key)
+            if cached is not None:
+                _count('hits')
+                headers, content = cached
+                return HttpResponse(content, status=200, headers=headers)
+
+            _count('misses')
+            response = view(request, *args, **kwargs)
+            entry = entry_for(response)
+            if entry is not None:
+                cache.set(key, entry)
+            return response
+        return wrapper
+    return decorator
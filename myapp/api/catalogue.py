@@ -0,0 +1,121 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from api import versions
+from api.models import Module, ModuleInstanceProfessor, Professor
+
+# Catalogue
+# Description: Per-process index of the catalogue, so resolving the codes in a request to ids is a
+# dictionary lookup instead of a query. The catalogue changes perhaps once a term, so the index is
+# loaded on first use and only reloaded when the catalogue data version moves on.
+# Callers that have already read the catalogue version for the request (the conditional and cached
+# read endpoints) pass it in. Otherwise the version is read at most every
+# API_CATALOGUE_CHECK_INTERVAL seconds, so another process's catalogue change can take that long to
+# show up. Changes made in this process reset the index straight away, see api/signals.py.
+# The index is only reloaded for a version modified later than its own, so requests still holding an
+# older version don't make it flip back and forth.
+
+
+class Index:
+    # version: the catalogue DataVersion read before loading, so anything added while loading belongs
+    # to a later version and gets loaded with it
+    def __init__(self, version):
+        self.stamp = version.stamp
+        self.modified = version.modified
+        # {code: Professor}, {code: Module}, with only their id, name and code loaded
+        self.professors = {
+            code: Professor(id=id, name=name, code=code) for id, name, code in Professor.objects.values_list('id', 'name', 'code')
+        }
+        self.modules = {
+            code: Module(id=id, name=name, code=code) for id, name, code in Module.objects.values_list('id', 'name', 'code')
+        }
+        # {(module_code, year, semester, professor_code): moduleInstanceProfessor id}
+        self.instance_professors = {}
+        # {moduleInstanceProfessor id: (professor_id, module_id, year, semester)}, as aggregates.record needs
+        self.targets = {}
+        professor_codes = {professor.id: code for code, professor in self.professors.items()}
+        module_codes = {module.id: code for code, module in self.modules.items()}
+        for mip_id, professor_id, module_id, year, semester in ModuleInstanceProfessor.objects.values_list(
+            'id', 'professor_id', 'moduleInstance__module_id', 'moduleInstance__year', 'moduleInstance__semester'
+        ):
+            # The three queries aren't one snapshot (a transaction would take SQLite's write lock here),
+            # so skip teaching added along with a professor or module after those were read
+            if professor_id not in professor_codes or module_id not in module_codes:
+                continue
+            self.instance_professors[(module_codes[module_id], year, semester, professor_codes[professor_id])] = mip_id
+            self.targets[mip_id] = (professor_id, module_id, year, semester)
+
+    # Id of the module instance professor with these codes, None if there isn't one
+    # Raises ValueError if year or semester aren't whole numbers
+    def instance_professor(self, module_code, year, semester, professor_code):
+        return self.instance_professors.get((module_code, int(year), int(semester), professor_code))
+
+
+_index = None
+_checked = 0.0
+_lock = threading.Lock()
+
+
+# Whether an index is at least as new as a catalogue version
+def _covers(index, version):
+    return index.stamp == version.stamp or index.modified >= version.modified
+
+
+# The catalogue index, reloaded first if the catalogue has changed
+# version: the current catalogue DataVersion, if the caller has already read it
+def index(version=None):
+    global _index, _checked
+    current = _index
+    if current is not None and (_covers(current, version) if version is not None else
+                                time.monotonic() - _checked < getattr(settings, 'API_CATALOGUE_CHECK_INTERVAL', 5.0)):
+        return current
+    with _lock:
+        if version is None:
+            version = versions.current(versions.CATALOGUE)[0]
+            _checked = time.monotonic()
+        if _index is None or not _covers(_index, version):
+            _index = Index(version)
+        return _index
+
+
+# Async version of index()
+async def aindex(version=None):
+    current = _index
+    if current is not None and version is not None and _covers(current, version):
+        return current
+    return await sync_to_async(index)(version)
+
+
+# Drop the index, so the next use reloads it
+def reset():
+    global _index
+    with _lock:
+        _index = None
+
+
+# Professor, module, year and semester of module instance professors, from the index where it has them
+# Called while adding ratings, inside the write transaction, so only uses an index that is already
+# loaded and queries for the rest, rather than loading or reloading the whole catalogue there
+# Returns {moduleInstanceProfessor id: (professor_id, module_id, year, semester)} for the ids that exist
+def targets(mip_ids):
+    current = _index
+    known = current.targets if current is not None else {}
+    targets = {mip_id: known[mip_id] for mip_id in mip_ids if mip_id in known}
+    missing = set(mip_ids) - targets.keys()
+    if missing:
+        targets.update(query_targets(id__in=missing))
+    return targets
+
+
+# Professor, module, year and semester of the module instance professors matching a filter, from the database
+# Returns {moduleInstanceProfessor id: (professor_id, module_id, year, semester)}
+def query_targets(**lookup):
+    return {
+        mip_id: (professor_id, module_id, year, semester)
+        for mip_id, professor_id, module_id, year, semester in ModuleInstanceProfessor.objects.filter(**lookup).values_list(
+            'id', 'professor_id', 'moduleInstance__module_id', 'moduleInstance__year', 'moduleInstance__semester'
+        )
+    }
@@ -0,0 +1,69 @@
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from api import versions
+
+# Conditional
+# Description: Conditional GET support for read endpoints. The ETag is derived from the
+# request path, its query parameters and the data version stamps the endpoint depends on,
+# so a matching If-None-Match is answered with 304 Not Modified before the view runs.
+# This mirrors django.views.decorators.http.condition, but reads the stamps with the async
+# ORM when wrapping an async view.
+# Last-Modified only has whole seconds, so it is left out while the second the data last changed
+# in is still going on: a client given it then could miss another change later in that second.
+
+
+def make_etag(request, rows):
+    params = sorted((key, value) for key in request.GET for value in request.GET.getlist(key))
+    stamps = tuple(row.stamp for row in rows)
+    return quote_etag(hashlib.md5(repr((request.path, params, stamps)).encode()).hexdigest())
+
+
+# Returns (etag, last_modified), last_modified being None while the data's last second isn't over
+def _validators(request, rows):
+    last_modified = int(max(row.modified for row in rows).timestamp())
+    if int(time.time()) <= last_modified:
+        last_modified = None
+    return make_etag(request, rows), last_modified
+
+
+def _set_headers(request, response, etag, last_modified):
+    # Set the validators on successful responses to safe requests if the view hasn't already
+    # Errors aren't given them, so a client can't revalidate an error and keep it after the data changes
+    if request.method in ("GET", "HEAD") and response.status_code in (200, 304):
+        if last_modified is not None and not response.has_header("Last-Modified"):
+            response.headers["Last-Modified"] = http_date(last_modified)
+        response.headers.setdefault("ETag", etag)
+    return response
+
+
+# Decorator to add ETag and Last-Modified headers and answer matching conditional requests
+# scopes: data version scopes the response is built from
+def conditional_response(scopes):
+    scopes = tuple(scopes)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                etag, last_modified = _validators(request, await versions.afor_request(request, *scopes))
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is None:
+                    response = await view(request, *args, **kwargs)
+                return _set_headers(request, response, etag, last_modified)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag, last_modified = _validators(request, versions.for_request(request, *scopes))
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+            return _set_headers(request, response, etag, last_modified)
+        return wrapper
+    return decorator
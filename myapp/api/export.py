@@ -0,0 +1,138 @@
+import csv
+import io
+from itertools import islice
+
+from api.models import Rating
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Export
+# Description: Dump the ratings, joined with who and what they rate, for offline analysis.
+# Rows are read in id order in chunks with values_list and iterator(), and each chunk is encoded and
+# handed on before the next is read, so memory use doesn't grow with the number of ratings.
+# Parquet and Arrow IPC need pyarrow ('pip install pyarrow'), CSV is always available.
+# Exports can start after a given rating id, so later exports only need the ratings added since.
+
+# Column names, and the fields they are read from
+COLUMNS = ("rating_id", "user_id", "rating", "professor_code", "professor_name", "module_code", "module_name", "year", "semester")
+FIELDS = (
+    "id",
+    "user_id",
+    "rating",
+    "moduleInstanceProfessor__professor__code",
+    "moduleInstanceProfessor__professor__name",
+    "moduleInstanceProfessor__moduleInstance__module__code",
+    "moduleInstanceProfessor__moduleInstance__module__name",
+    "moduleInstanceProfessor__moduleInstance__year",
+    "moduleInstanceProfessor__moduleInstance__semester",
+)
+
+FORMATS = ("parquet", "arrow", "csv")
+CONTENT_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "csv": "text/csv",
+}
+
+
+# Parquet when pyarrow is installed, CSV otherwise
+def default_format():
+    return "parquet" if pyarrow is not None else "csv"
+
+
+# Read the ratings with ids above since in chunks of rows, in id order
+def chunks(since=None, chunk_size=10_000):
+    ratings = Rating.objects.order_by("id")
+    if since is not None:
+        ratings = ratings.filter(id__gt=since)
+    rows = ratings.values_list(*FIELDS).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        yield chunk
+
+
+class _Sink(io.RawIOBase):
+    # Write-only file that keeps what is written until it is taken, for streaming pyarrow output
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _schema():
+    return pyarrow.schema([
+        ("rating_id", pyarrow.int64()),
+        ("user_id", pyarrow.int64()),
+        ("rating", pyarrow.int8()),
+        ("professor_code", pyarrow.string()),
+        ("professor_name", pyarrow.string()),
+        ("module_code", pyarrow.string()),
+        ("module_name", pyarrow.string()),
+        ("year", pyarrow.int16()),
+        ("semester", pyarrow.int8()),
+    ])
+
+
+# Encode the ratings with ids above since, yielding the output as bytes a chunk at a time
+# summary: optional dict, filled in with the number of rows and the last rating id once exhausted
+# Raises ValueError if the format is unknown or needs pyarrow and it isn't installed
+def stream(format, since=None, chunk_size=10_000, summary=None):
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format: {format}")
+    if format != "csv" and pyarrow is None:
+        raise ValueError(f"The {format} format needs pyarrow, which isn't installed")
+    return _stream(format, since, chunk_size, summary if summary is not None else {})
+
+
+def _stream(format, since, chunk_size, summary):
+    summary.update(rows=0, last_id=since)
+
+    if format == "csv":
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(COLUMNS)
+        for chunk in chunks(since, chunk_size):
+            writer.writerows(chunk)
+            summary.update(rows=summary["rows"] + len(chunk), last_id=chunk[-1][0])
+            yield text.getvalue().encode()
+            text.seek(0)
+            text.truncate()
+        if summary["rows"] == 0:
+            yield text.getvalue().encode()
+        return
+
+    # Each chunk becomes one Parquet row group or one Arrow record batch
+    schema = _schema()
+    sink = _Sink()
+    if format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pyarrow.ipc.new_stream(sink, schema)
+    for chunk in chunks(since, chunk_size):
+        writer.write_batch(pyarrow.RecordBatch.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(zip(*chunk), schema)], schema=schema
+        ))
+        summary.update(rows=summary["rows"] + len(chunk), last_id=chunk[-1][0])
+        yield sink.take()
+    writer.close()
+    yield sink.take()
@@ -0,0 +1,14 @@
+from django.contrib.auth import hashers
+
+# Hashers
+# Description: Password hashers listed in PASSWORD_HASHERS in rateprofs/settings.py
+
+
+# Argon2id with OWASP's recommended minimum cost (19 MiB of memory, 2 passes, 1 lane) instead of
+# Django's 100 MiB over 8 lanes, which on a single core is about 7 times as many logins per second.
+# Shares the 'argon2' algorithm name, so hashes made with Django's costs are rehashed on login.
+# Needs 'pip install argon2-cffi'.
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    time_cost = 2
+    memory_cost = 19 * 1024
+    parallelism = 1
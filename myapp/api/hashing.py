@@ -0,0 +1,39 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Hashing
+# Description: Limit how many requests hash a password at once (registering and logging in), so a
+# burst of them can't take every CPU core from the read endpoints. A request waits up to
+# API_PASSWORD_HASH_TIMEOUT seconds for one of the API_PASSWORD_HASH_WORKERS slots, and raises
+# Busy if none frees up. Waiting requests sleep on a semaphore, so they cost no CPU.
+# The slots are per process.
+
+_slots = None
+_lock = threading.Lock()
+
+
+class Busy(Exception):
+    pass
+
+
+def _semaphore():
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(getattr(settings, 'API_PASSWORD_HASH_WORKERS', 1))
+        return _slots
+
+
+# Run the body of the with statement in a hashing slot
+# Raises Busy if no slot frees up in time
+@contextmanager
+def slot():
+    slots = _semaphore()
+    if not slots.acquire(timeout=getattr(settings, 'API_PASSWORD_HASH_TIMEOUT', 10)):
+        raise Busy()
+    try:
+        yield
+    finally:
+        slots.release()
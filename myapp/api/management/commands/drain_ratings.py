@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import writebehind
+
+
+class Command(BaseCommand):
+    help = "Add the ratings waiting in the write-behind queue, once with --once or every API_RATE_QUEUE_MAX_STALENESS seconds until stopped"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue once and exit",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            added, rejected = writebehind.drain()
+            if added or rejected or options["once"]:
+                self.stdout.write(f"Added {added} queued ratings, rejected {rejected}.")
+            if options["once"]:
+                return
+            time.sleep(writebehind.max_staleness())
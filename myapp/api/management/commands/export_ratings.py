@@ -0,0 +1,39 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import export
+
+
+class Command(BaseCommand):
+    help = "Export the ratings, joined with their professors, modules and module instances, to Parquet, Arrow IPC or CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="File to write, or - for stdout")
+        parser.add_argument(
+            "--format",
+            choices=export.FORMATS,
+            default=export.default_format(),
+            help="Output format (default: parquet if pyarrow is installed, csv otherwise)",
+        )
+        parser.add_argument("--since", type=int, help="Only export ratings with ids above this one, e.g. the last id of the previous export")
+        parser.add_argument("--chunk-size", type=int, default=getattr(settings, 'API_EXPORT_CHUNK_SIZE', 10_000), help="Ratings read and written at a time")
+
+    def handle(self, *args, **options):
+        summary = {}
+        try:
+            parts = export.stream(options["format"], options["since"], options["chunk_size"], summary)
+        except ValueError as e:
+            raise CommandError(e)
+
+        out = sys.stdout.buffer if options["output"] == "-" else open(options["output"], "wb")
+        try:
+            for part in parts:
+                out.write(part)
+        finally:
+            if out is not sys.stdout.buffer:
+                out.close()
+
+        # Report on stderr so it doesn't mix with an export written to stdout
+        self.stderr.write(f"Exported {summary['rows']} ratings, last rating id {summary['last_id']}.")
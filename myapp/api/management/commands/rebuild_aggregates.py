@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import aggregates
+
+
+class Command(BaseCommand):
+    help = "Rebuild the materialised rating aggregates from the raw ratings, or verify them with --verify"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verify",
+            action="store_true",
+            help="Only compare the stored aggregates against the raw ratings, without changing them",
+        )
+
+    def handle(self, *args, **options):
+        if not options["verify"]:
+            aggregates.rebuild()
+            self.stdout.write("Rebuilt rating aggregates.")
+
+        mismatches = aggregates.verify()
+        for mismatch in mismatches:
+            self.stderr.write(mismatch)
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} aggregate(s) do not match the raw ratings")
+        self.stdout.write(self.style.SUCCESS("Rating aggregates match the raw ratings."))
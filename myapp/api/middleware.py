@@ -0,0 +1,137 @@
+import json
+import logging
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.decorators import sync_and_async_middleware
+
+from api import throttle, timing
+
+# Middleware
+# Description: Middleware for the API project, registered in rateprofs/settings.py
+
+logger = logging.getLogger('api.timing')
+
+
+# Split the time spent on a request into database, serialisation and remaining view time,
+# then report it in a Server-Timing header, a log line and the /api/metrics histograms
+def _report(request, response, timings):
+    total = time.perf_counter() - timings.started
+    view = max(total - timings.db - timings.serialize, 0.0)
+    match = request.resolver_match
+    endpoint = match.url_name if match is not None and match.url_name else "unmatched"
+
+    response.headers["Server-Timing"] = ", ".join([
+        f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries"',
+        f"view;dur={view * 1000:.2f}",
+        f"serialize;dur={timings.serialize * 1000:.2f}",
+        f"total;dur={total * 1000:.2f}",
+    ])
+
+    timing.metrics.observe(endpoint, response.status_code, total, timings.db, timings.queries)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "endpoint": endpoint,
+            "status": response.status_code,
+            "queries": timings.queries,
+            "db_ms": round(timings.db * 1000, 2),
+            "view_ms": round(view * 1000, 2),
+            "serialize_ms": round(timings.serialize * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+        }))
+    return response
+
+
+# Timing
+# Description: Time every request, see api/timing.py. Place it first in MIDDLEWARE so the time
+# spent in the other middleware, such as loading the session, is included.
+# For streamed responses only the time to start the stream is measured.
+@sync_and_async_middleware
+def TimingMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            token = timing.start()
+            try:
+                response = await get_response(request)
+                return _report(request, response, timing.current())
+            finally:
+                timing.stop(token)
+        return middleware
+
+    def middleware(request):
+        token = timing.start()
+        try:
+            response = get_response(request)
+            return _report(request, response, timing.current())
+        finally:
+            timing.stop(token)
+    return middleware
+
+
+# Name of the write endpoint a request is for, None for reads and unknown paths
+def _write_endpoint(request):
+    if request.method in ('GET', 'HEAD', 'OPTIONS'):
+        return None
+    try:
+        endpoint = resolve(request.path_info).url_name
+    except Resolver404:
+        return None
+    return endpoint if endpoint in getattr(settings, 'API_WRITE_ENDPOINTS', ()) else None
+
+
+def _too_many(wait):
+    seconds = math.ceil(wait)
+    return HttpResponse(f'Too many requests, try again in {seconds} seconds', status=429, content_type="text/plain", headers={"Retry-After": str(seconds)})
+
+
+def _busy():
+    return HttpResponse('The server is busy, try again shortly', status=503, content_type="text/plain", headers={"Retry-After": "1"})
+
+
+# Throttle
+# Description: Rate limit the write endpoints per client, and turn write requests away straight
+# away once API_WRITE_CONCURRENCY are in progress, see api/throttle.py. Place it after
+# AuthenticationMiddleware so requests from logged-in users are limited per user.
+# Return 429 Too Many Requests with a text/plain reason and Retry-After if the client is over its limit
+# Return 503 Service Unavailable with a text/plain reason and Retry-After if too many writes are in progress
+@sync_and_async_middleware
+def ThrottleMiddleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            endpoint = _write_endpoint(request)
+            if endpoint is None:
+                return await get_response(request)
+            wait = await sync_to_async(throttle.check)(request, endpoint)
+            if wait:
+                return _too_many(wait)
+            slots = throttle.write_slots()
+            if not slots.acquire(blocking=False):
+                return _busy()
+            try:
+                return await get_response(request)
+            finally:
+                slots.release()
+        return middleware
+
+    def middleware(request):
+        endpoint = _write_endpoint(request)
+        if endpoint is None:
+            return get_response(request)
+        wait = throttle.check(request, endpoint)
+        if wait:
+            return _too_many(wait)
+        slots = throttle.write_slots()
+        if not slots.acquire(blocking=False):
+            return _busy()
+        try:
+            return get_response(request)
+        finally:
+            slots.release()
+    return middleware
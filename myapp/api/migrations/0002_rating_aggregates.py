@@ -0,0 +1,66 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_aggregates(apps, schema_editor):
+    # Backfill the aggregates from any ratings that already exist
+    Rating = apps.get_model('api', 'Rating')
+    ProfessorAggregate = apps.get_model('api', 'ProfessorAggregate')
+    ProfessorModuleAggregate = apps.get_model('api', 'ProfessorModuleAggregate')
+    professors = {}
+    pairs = []
+    rows = Rating.objects.values(
+        'moduleInstanceProfessor__professor_id',
+        'moduleInstanceProfessor__moduleInstance__module_id',
+    ).annotate(total=Sum('rating'), count=Count('id')).order_by()
+    for row in rows:
+        professor_id = row['moduleInstanceProfessor__professor_id']
+        pairs.append(ProfessorModuleAggregate(
+            professor_id=professor_id,
+            module_id=row['moduleInstanceProfessor__moduleInstance__module_id'],
+            total=row['total'],
+            count=row['count'],
+        ))
+        total, count = professors.get(professor_id, (0, 0))
+        professors[professor_id] = (total + row['total'], count + row['count'])
+    ProfessorAggregate.objects.bulk_create(
+        ProfessorAggregate(professor_id=professor_id, total=total, count=count)
+        for professor_id, (total, count) in professors.items()
+    )
+    ProfessorModuleAggregate.objects.bulk_create(pairs)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfessorAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.BigIntegerField(default=0)),
+                ('count', models.BigIntegerField(default=0)),
+                ('professor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='aggregate', to='api.professor')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProfessorModuleAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.BigIntegerField(default=0)),
+                ('count', models.BigIntegerField(default=0)),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.module')),
+                ('professor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.professor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('professor', 'module'), name='unique_professor_module_aggregate')],
+            },
+        ),
+        migrations.RunPython(populate_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:49
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_ratings(apps, schema_editor):
+    # Keep the first rating of any user who rated a module instance professor more than once,
+    # taking the removed ratings back out of the aggregates
+    Rating = apps.get_model('api', 'Rating')
+    ProfessorAggregate = apps.get_model('api', 'ProfessorAggregate')
+    ProfessorModuleAggregate = apps.get_model('api', 'ProfessorModuleAggregate')
+    duplicates = Rating.objects.values('user_id', 'moduleInstanceProfessor_id').annotate(
+        first_id=Min('id'), count=Count('id')
+    ).filter(count__gt=1).order_by()
+    for duplicate in duplicates:
+        removed = Rating.objects.filter(
+            user_id=duplicate['user_id'],
+            moduleInstanceProfessor_id=duplicate['moduleInstanceProfessor_id'],
+        ).exclude(id=duplicate['first_id']).values_list(
+            'id', 'rating', 'moduleInstanceProfessor__professor_id', 'moduleInstanceProfessor__moduleInstance__module_id'
+        )
+        for rating_id, rating, professor_id, module_id in list(removed):
+            ProfessorAggregate.objects.filter(professor_id=professor_id).update(
+                total=F('total') - rating, count=F('count') - 1
+            )
+            ProfessorModuleAggregate.objects.filter(professor_id=professor_id, module_id=module_id).update(
+                total=F('total') - rating, count=F('count') - 1
+            )
+            Rating.objects.filter(id=rating_id).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_rating_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moduleinstance',
+            index=models.Index(fields=['module', 'year', 'semester'], name='moduleinstance_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moduleinstanceprofessor',
+            index=models.Index(fields=['moduleInstance', 'professor'], name='mip_lookup_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rating',
+            index=models.Index(fields=['moduleInstanceProfessor', 'rating'], name='rating_mip_rating_idx'),
+        ),
+        migrations.RunPython(remove_duplicate_ratings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='rating',
+            constraint=models.UniqueConstraint(fields=('user', 'moduleInstanceProfessor'), name='unique_user_rating'),
+        ),
+    ]
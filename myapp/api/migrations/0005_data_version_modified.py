@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_data_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataversion',
+            name='modified',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_data_version_modified'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moduleinstance',
+            index=models.Index(fields=['year', 'semester'], name='moduleinstance_term_idx'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:14
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_star_counts(apps, schema_editor):
+    # Backfill the star counts of the existing aggregates from the ratings
+    Rating = apps.get_model('api', 'Rating')
+    ProfessorAggregate = apps.get_model('api', 'ProfessorAggregate')
+    ProfessorModuleAggregate = apps.get_model('api', 'ProfessorModuleAggregate')
+    professors = {}
+    pairs = {}
+    rows = Rating.objects.filter(rating__gte=1, rating__lte=5).values(
+        'moduleInstanceProfessor__professor_id',
+        'moduleInstanceProfessor__moduleInstance__module_id',
+        'rating',
+    ).annotate(count=Count('id')).order_by()
+    for row in rows:
+        professor_id = row['moduleInstanceProfessor__professor_id']
+        module_id = row['moduleInstanceProfessor__moduleInstance__module_id']
+        field = f"stars_{row['rating']}"
+        for stars in (professors.setdefault(professor_id, {}), pairs.setdefault((professor_id, module_id), {})):
+            stars[field] = stars.get(field, 0) + row['count']
+    for professor_id, stars in professors.items():
+        ProfessorAggregate.objects.filter(professor_id=professor_id).update(**stars)
+    for (professor_id, module_id), stars in pairs.items():
+        ProfessorModuleAggregate.objects.filter(professor_id=professor_id, module_id=module_id).update(**stars)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_term_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='professoraggregate',
+            name='stars_1',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professoraggregate',
+            name='stars_2',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professoraggregate',
+            name='stars_3',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professoraggregate',
+            name='stars_4',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professoraggregate',
+            name='stars_5',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleaggregate',
+            name='stars_1',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleaggregate',
+            name='stars_2',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleaggregate',
+            name='stars_3',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleaggregate',
+            name='stars_4',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='professormoduleaggregate',
+            name='stars_5',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_star_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_term_aggregates(apps, schema_editor):
+    # Backfill the term aggregates from any ratings that already exist
+    Rating = apps.get_model('api', 'Rating')
+    ProfessorTermAggregate = apps.get_model('api', 'ProfessorTermAggregate')
+    terms = {}
+    rows = Rating.objects.values(
+        'moduleInstanceProfessor__professor_id',
+        'moduleInstanceProfessor__moduleInstance__module_id',
+        'moduleInstanceProfessor__moduleInstance__year',
+        'moduleInstanceProfessor__moduleInstance__semester',
+        'rating',
+    ).annotate(count=Count('id')).order_by()
+    for row in rows:
+        key = (
+            row['moduleInstanceProfessor__professor_id'],
+            row['moduleInstanceProfessor__moduleInstance__module_id'],
+            row['moduleInstanceProfessor__moduleInstance__year'],
+            row['moduleInstanceProfessor__moduleInstance__semester'],
+        )
+        fields = terms.setdefault(key, {'total': 0, 'count': 0})
+        fields['total'] += row['rating'] * row['count']
+        fields['count'] += row['count']
+        if 1 <= row['rating'] <= 5:
+            field = f"stars_{row['rating']}"
+            fields[field] = fields.get(field, 0) + row['count']
+    ProfessorTermAggregate.objects.bulk_create(
+        ProfessorTermAggregate(professor_id=professor_id, module_id=module_id, year=year, semester=semester, **fields)
+        for (professor_id, module_id, year, semester), fields in terms.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_rating_star_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfessorTermAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.BigIntegerField(default=0)),
+                ('count', models.BigIntegerField(default=0)),
+                ('stars_1', models.BigIntegerField(default=0)),
+                ('stars_2', models.BigIntegerField(default=0)),
+                ('stars_3', models.BigIntegerField(default=0)),
+                ('stars_4', models.BigIntegerField(default=0)),
+                ('stars_5', models.BigIntegerField(default=0)),
+                ('year', models.IntegerField()),
+                ('semester', models.IntegerField()),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.module')),
+                ('professor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.professor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('professor', 'module', 'year', 'semester'), name='unique_professor_term_aggregate')],
+            },
+        ),
+        migrations.RunPython(populate_term_aggregates, migrations.RunPython.noop),
+    ]
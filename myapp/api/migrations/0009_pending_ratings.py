@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:29
+
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_term_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingRating',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.IntegerField(validators=[django.core.validators.MaxValueValidator(5), django.core.validators.MinValueValidator(1)])),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('added', 'Added'), ('rejected', 'Rejected')], default='pending', max_length=10)),
+                ('reason', models.CharField(blank=True, max_length=100)),
+                ('queued', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed', models.DateTimeField(blank=True, null=True)),
+                ('added', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.rating')),
+                ('moduleInstanceProfessor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.moduleinstanceprofessor')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='pending_rating_status_idx')],
+            },
+        ),
+    ]
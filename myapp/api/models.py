@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import MaxValueValidator, MinValueValidator
     
@@ -18,10 +19,21 @@ class ModuleInstance(models.Model):
         MinValueValidator(1)
     ])
     professors = models.ManyToManyField(Professor, related_name="moduleInstances", through='ModuleInstanceProfessor')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["module", "year", "semester"], name="moduleinstance_lookup_idx"),
+            models.Index(fields=["year", "semester"], name="moduleinstance_term_idx"),
+        ]
     
 class ModuleInstanceProfessor(models.Model):
     moduleInstance = models.ForeignKey(ModuleInstance, on_delete=models.CASCADE)
     professor = models.ForeignKey(Professor, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["moduleInstance", "professor"], name="mip_lookup_idx"),
+        ]
     
 class Rating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -30,4 +42,82 @@ class Rating(models.Model):
         MaxValueValidator(5),
         MinValueValidator(1)
     ])
-    
\ No newline at end of file
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["moduleInstanceProfessor", "rating"], name="rating_mip_rating_idx"),
+        ]
+        constraints = [
+            # One rating per user per module instance professor
+            models.UniqueConstraint(fields=["user", "moduleInstanceProfessor"], name="unique_user_rating"),
+        ]
+    
+# Running rating totals, and the number of ratings with each star value from 1 to 5
+class RatingTotals(models.Model):
+    total = models.BigIntegerField(default=0)
+    count = models.BigIntegerField(default=0)
+    stars_1 = models.BigIntegerField(default=0)
+    stars_2 = models.BigIntegerField(default=0)
+    stars_3 = models.BigIntegerField(default=0)
+    stars_4 = models.BigIntegerField(default=0)
+    stars_5 = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+# Running rating totals per professor, kept up to date as ratings are added and removed
+class ProfessorAggregate(RatingTotals):
+    professor = models.OneToOneField(Professor, on_delete=models.CASCADE, related_name="aggregate")
+
+# Running rating totals per professor in a module, across all of its instances
+class ProfessorModuleAggregate(RatingTotals):
+    professor = models.ForeignKey(Professor, on_delete=models.CASCADE)
+    module = models.ForeignKey(Module, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["professor", "module"], name="unique_professor_module_aggregate"),
+        ]
+
+# Running rating totals per professor in a module in each term, across the module's instances
+# in that year and semester
+class ProfessorTermAggregate(RatingTotals):
+    professor = models.ForeignKey(Professor, on_delete=models.CASCADE)
+    module = models.ForeignKey(Module, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    semester = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["professor", "module", "year", "semester"], name="unique_professor_term_aggregate"),
+        ]
+
+# Stamp that changes whenever data in a scope (e.g. the catalogue or the ratings) changes
+class DataVersion(models.Model):
+    scope = models.CharField(max_length=50, unique=True)
+    stamp = models.CharField(max_length=32)
+    modified = models.DateTimeField(default=timezone.now)
+
+# Rating waiting in the write-behind queue to be added in a batch, see api/writebehind.py
+class PendingRating(models.Model):
+    PENDING = 'pending'
+    ADDED = 'added'
+    REJECTED = 'rejected'
+    STATUSES = [(PENDING, 'Pending'), (ADDED, 'Added'), (REJECTED, 'Rejected')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    moduleInstanceProfessor = models.ForeignKey(ModuleInstanceProfessor, on_delete=models.CASCADE)
+    rating = models.IntegerField(validators=[
+        MaxValueValidator(5),
+        MinValueValidator(1)
+    ])
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    reason = models.CharField(max_length=100, blank=True)
+    added = models.ForeignKey(Rating, null=True, blank=True, on_delete=models.SET_NULL)
+    queued = models.DateTimeField(default=timezone.now)
+    processed = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="pending_rating_status_idx"),
+        ]
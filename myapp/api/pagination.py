@@ -0,0 +1,63 @@
+from django.conf import settings
+
+# Pagination
+# Description: Keyset (cursor) pagination over querysets ordered by id.
+# Params: limit - maximum number of rows per page, all rows if omitted
+#         after - id of the last row of the previous page
+# Each page starts with an index seek on id, so later pages cost the same as the first.
+# The URL of the next page, if there is one, is sent in a Link header with rel="next".
+
+# Read limit and after from the query string
+# Raises ValueError if either is given but isn't a positive whole number
+def parse(request):
+    limit = request.GET.get('limit')
+    after = request.GET.get('after')
+    limit = int(limit) if limit not in (None, '') else None
+    after = int(after) if after not in (None, '') else None
+    if (limit is not None and limit < 1) or (after is not None and after < 0):
+        raise ValueError("limit and after must be positive")
+    if limit is not None:
+        limit = min(limit, getattr(settings, 'API_PAGE_MAX_LIMIT', 1000))
+    return limit, after
+
+
+# Restrict a queryset ordered by id to the requested page
+# Returns (queryset, URL of the next page or None)
+def paginate(request, queryset):
+    limit, after = parse(request)
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    if limit is None:
+        return queryset, None
+
+    # Find the ids on this page with a cheap index-only query, one extra to see if there is a next page
+    ids = list(queryset.values_list('id', flat=True)[:limit + 1])
+    return queryset.filter(id__in=ids[:limit]), _next_url(request, ids, limit)
+
+
+# Async version of paginate()
+async def apaginate(request, queryset):
+    limit, after = parse(request)
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+    if limit is None:
+        return queryset, None
+
+    ids = [row_id async for row_id in queryset.values_list('id', flat=True)[:limit + 1]]
+    return queryset.filter(id__in=ids[:limit]), _next_url(request, ids, limit)
+
+
+# URL of the page after one whose ids (plus one extra, if there is a next page) are given
+def _next_url(request, ids, limit):
+    if len(ids) <= limit:
+        return None
+    params = request.GET.copy()
+    params['after'] = ids[limit - 1]
+    return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+
+# Add the Link header pointing at the next page to a response
+def link(response, next_url):
+    if next_url is not None:
+        response['Link'] = f'<{next_url}>; rel="next"'
+    return response
@@ -0,0 +1,93 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from api import aggregates, catalogue, versions
+from api.models import Module, ModuleInstance, ModuleInstanceProfessor, Professor, Rating
+
+# Signals
+# Description: Keep the rating aggregates in step with every change to the Rating table, and to the
+# module instances and module instance professors the aggregates are keyed by, and change the data
+# version of whatever scope a saved or deleted row belongs to.
+# Bulk operations bypass signals, so bulk writers must call aggregates.record and
+# versions.bump themselves.
+
+
+# Remember what an existing rating looked like before it is changed
+@receiver(pre_save, sender=Rating)
+def stash_previous_rating(sender, instance, raw=False, **kwargs):
+    instance._previous_rating = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_rating = Rating.objects.filter(pk=instance.pk).values_list(
+        'moduleInstanceProfessor_id', 'rating'
+    ).first()
+
+
+@receiver(post_save, sender=Rating)
+def rating_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is not None:
+        aggregates.record([previous], sign=-1)
+    aggregates.record([(instance.moduleInstanceProfessor_id, instance.rating)])
+
+
+# Take a deleted rating off the aggregates before anything is deleted. When the rating goes because
+# its professor, module or module instance is being deleted, pre_delete still runs while the catalogue
+# and aggregate rows exist, whereas by post_delete the cascade may already have removed them.
+@receiver(pre_delete, sender=Rating)
+def rating_deleted(sender, instance, **kwargs):
+    aggregates.record([(instance.moduleInstanceProfessor_id, instance.rating)], sign=-1)
+
+
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def ratings_changed(sender, **kwargs):
+    versions.bump(versions.RATINGS)
+
+
+def _targets_lookup(instance):
+    if isinstance(instance, ModuleInstance):
+        return {'moduleInstance_id': instance.pk}
+    return {'pk': instance.pk}
+
+
+# Remember where the ratings of a module instance or module instance professor are counted before it
+# is changed, since the aggregates are keyed by its professor, module, year and semester
+@receiver(pre_save, sender=ModuleInstance)
+@receiver(pre_save, sender=ModuleInstanceProfessor)
+def stash_previous_targets(sender, instance, raw=False, **kwargs):
+    instance._previous_targets = None
+    if raw or instance.pk is None:
+        return
+    instance._previous_targets = catalogue.query_targets(**_targets_lookup(instance))
+
+
+# Move the ratings of a changed module instance or module instance professor to their new aggregates
+@receiver(post_save, sender=ModuleInstance)
+@receiver(post_save, sender=ModuleInstanceProfessor)
+def move_ratings(sender, instance, raw=False, **kwargs):
+    previous = getattr(instance, '_previous_targets', None)
+    if raw or not previous:
+        return
+    current = catalogue.query_targets(**_targets_lookup(instance))
+    moved = {mip_id for mip_id, target in previous.items() if current.get(mip_id) != target}
+    ratings = list(Rating.objects.filter(moduleInstanceProfessor_id__in=moved).values_list('moduleInstanceProfessor_id', 'rating'))
+    if ratings:
+        aggregates.record(ratings, sign=-1, targets=previous)
+        aggregates.record(ratings, targets=current)
+        versions.bump(versions.RATINGS)
+
+
+@receiver(post_save, sender=Module)
+@receiver(post_delete, sender=Module)
+@receiver(post_save, sender=Professor)
+@receiver(post_delete, sender=Professor)
+@receiver(post_save, sender=ModuleInstance)
+@receiver(post_delete, sender=ModuleInstance)
+@receiver(post_save, sender=ModuleInstanceProfessor)
+@receiver(post_delete, sender=ModuleInstanceProfessor)
+def catalogue_changed(sender, **kwargs):
+    versions.bump(versions.CATALOGUE)
+    catalogue.reset()
@@ -1,3 +1,918 @@
-from django.test import TestCase
+import csv
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import unittest
+import unittest.mock
+from contextlib import ExitStack
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from api import aggregates, async_views, bulk, cache, catalogue, export, hashing, throttle, timing, versions, views, writebehind
+from api.models import Module, ModuleInstance, ModuleInstanceProfessor, PendingRating, Professor, ProfessorAggregate, ProfessorModuleAggregate, ProfessorTermAggregate, Rating
+from benchmark import datagen, hashers, sqlite_stress
+
+
+def setUpModule():
+    # Keep the per-request timing log out of the test output
+    logging.getLogger("api.timing").setLevel(logging.WARNING)
+
+
+def tearDownModule():
+    logging.getLogger("api.timing").setLevel(logging.NOTSET)
+
+
+def create_catalogue(instances, professors_per_instance=2, offset=0):
+    # Create module instances, each taught by its own set of professors
+    for i in range(offset, offset + instances):
+        module = Module.objects.create(name=f"Module {i}", code=f"M{i}")
+        instance = ModuleInstance.objects.create(module=module, year=2024, semester=1)
+        for j in range(professors_per_instance):
+            professor = Professor.objects.create(name=f"Professor {i}-{j}", code=f"P{i}-{j}")
+            ModuleInstanceProfessor.objects.create(moduleInstance=instance, professor=professor)
+
+
+class ListViewTests(TestCase):
+    def test_list_returns_instances_with_professors(self):
+        create_catalogue(2)
+        response = self.client.get(reverse("list"))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row["module_code"] for row in data], ["M0", "M1"])
+        self.assertEqual([p["professor_code"] for p in data[0]["taught_by"]], ["P0-0", "P0-1"])
+
+    def test_list_returns_404_when_empty(self):
+        response = self.client.get(reverse("list"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_query_count_is_constant(self):
+        # The number of queries must not grow with the size of the catalogue
+        # (one data version lookup, then module instances and their professors)
+        create_catalogue(3)
+        with self.assertNumQueries(3):
+            self.client.get(reverse("list"))
+        create_catalogue(30, offset=3)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("list"))
+        self.assertEqual(len(response.json()), 33)
+
+    def test_list_streams_ndjson_in_chunks(self):
+        create_catalogue(5)
+        with self.settings(API_LIST_CHUNK_SIZE=2):
+            response = self.client.get(reverse("list"), {"format": "ndjson"})
+            self.assertTrue(response.streaming)
+            self.assertEqual(response["Content-Type"], "application/x-ndjson")
+            rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["module_code"] for row in rows], ["M0", "M1", "M2", "M3", "M4"])
+        self.assertEqual([p["professor_code"] for p in rows[4]["taught_by"]], ["P4-0", "P4-1"])
+
+    def test_list_ndjson_returns_404_when_empty(self):
+        response = self.client.get(reverse("list"), {"format": "ndjson"})
+        self.assertEqual(response.status_code, 404)
+
+
+class AggregateTests(TestCase):
+    def setUp(self):
+        create_catalogue(1)
+        self.professor = Professor.objects.get(code="P0-0")
+        self.module = Module.objects.get(code="M0")
+        self.mip = ModuleInstanceProfessor.objects.get(professor=self.professor)
+        self.users = [User.objects.create_user(f"user{i}", f"user{i}@test.com", "password") for i in range(3)]
+
+    def aggregate(self):
+        pair = ProfessorModuleAggregate.objects.get(professor=self.professor, module=self.module)
+        professor = ProfessorAggregate.objects.get(professor=self.professor)
+        return (pair.total, pair.count), (professor.total, professor.count)
+
+    def test_rate_updates_aggregates(self):
+        self.client.force_login(self.users[0])
+        response = self.client.post(reverse("rate"), {
+            "professor_code": "P0-0", "module_code": "M0", "year": 2024, "semester": 1, "rating": 4,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.aggregate(), ((4, 1), (4, 1)))
+
+    def test_repeat_rating_is_rejected(self):
+        self.client.force_login(self.users[0])
+        params = {"professor_code": "P0-0", "module_code": "M0", "year": 2024, "semester": 1, "rating": 4}
+        self.assertEqual(self.client.post(reverse("rate"), params).status_code, 200)
+        response = self.client.post(reverse("rate"), dict(params, rating=1))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Rating.objects.count(), 1)
+        self.assertEqual(self.aggregate(), ((4, 1), (4, 1)))
+
+    def test_delete_and_update_adjust_aggregates(self):
+        ratings = [Rating.objects.create(user=user, moduleInstanceProfessor=self.mip, rating=value) for user, value in zip(self.users, [1, 2, 5])]
+        self.assertEqual(self.aggregate(), ((8, 3), (8, 3)))
+        ratings[2].delete()
+        self.assertEqual(self.aggregate(), ((3, 2), (3, 2)))
+        ratings[0].rating = 4
+        ratings[0].save()
+        self.assertEqual(self.aggregate(), ((6, 2), (6, 2)))
+
+    def test_deleting_rated_catalogue_keeps_aggregates_correct(self):
+        other = Module.objects.create(name="Module X", code="MX")
+        other_mip = ModuleInstanceProfessor.objects.create(
+            moduleInstance=ModuleInstance.objects.create(module=other, year=2024, semester=2), professor=self.professor
+        )
+        Rating.objects.create(user=self.users[0], moduleInstanceProfessor=self.mip, rating=4)
+        Rating.objects.create(user=self.users[1], moduleInstanceProfessor=other_mip, rating=2)
+        Rating.objects.create(user=self.users[2], moduleInstanceProfessor=ModuleInstanceProfessor.objects.get(professor__code="P0-1"), rating=5)
+        # The professor keeps the ratings from the other module
+        other.delete()
+        self.assertEqual(aggregates.verify(), [])
+        self.assertEqual(self.aggregate(), ((4, 1), (4, 1)))
+        professor_id = self.professor.id
+        self.professor.delete()
+        self.assertEqual(aggregates.verify(), [])
+        self.assertFalse(ProfessorAggregate.objects.filter(professor_id=professor_id).exists())
+        self.assertFalse(ProfessorModuleAggregate.objects.filter(count__lt=0).exists())
+        connection.check_constraints()
+
+    def test_read_endpoints_use_aggregates(self):
+        for user, value in zip(self.users, [1, 2, 5]):
+            Rating.objects.create(user=user, moduleInstanceProfessor=self.mip, rating=value)
+        response = self.client.get(reverse("average"), {"professor_code": "P0-0", "module_code": "M0"})
+        self.assertEqual(response.json()["average_rating"], 3)
+        ratings = {row["professor_code"]: row["average_rating"] for row in self.client.get(reverse("view")).json()}
+        self.assertEqual(ratings, {"P0-0": 3, "P0-1": None})
+
+    def test_rebuild_command_repairs_aggregates(self):
+        Rating.objects.create(user=self.users[0], moduleInstanceProfessor=self.mip, rating=5)
+        ProfessorAggregate.objects.update(total=0, count=0)
+        with self.assertRaises(CommandError):
+            call_command("rebuild_aggregates", "--verify", stdout=StringIO(), stderr=StringIO())
+        call_command("rebuild_aggregates", stdout=StringIO())
+        self.assertEqual(self.aggregate(), ((5, 1), (5, 1)))
+        call_command("rebuild_aggregates", "--verify", stdout=StringIO())
+
+    def test_star_counts_follow_changes(self):
+        ratings = [Rating.objects.create(user=user, moduleInstanceProfessor=self.mip, rating=value) for user, value in zip(self.users, [1, 2, 5])]
+        ratings[1].rating = 5
+        ratings[1].save()
+        ratings[0].delete()
+        pair = ProfessorModuleAggregate.objects.get(professor=self.professor, module=self.module)
+        self.assertEqual([pair.stars_1, pair.stars_2, pair.stars_3, pair.stars_4, pair.stars_5], [0, 0, 0, 0, 2])
+        self.assertEqual(aggregates.verify(), [])
+
+    def test_distribution_endpoint(self):
+        for user, value in zip(self.users, [1, 2, 5]):
+            Rating.objects.create(user=user, moduleInstanceProfessor=self.mip, rating=value)
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse("distribution"), {"professor_code": "P0-0"}).json()
+        self.assertEqual(data["counts"], {"1": 1, "2": 1, "3": 0, "4": 0, "5": 1})
+        self.assertEqual((data["mean"], data["median"], data["stdev"]), (2.67, 2.0, 1.7))
+        data = self.client.get(reverse("distribution"), {"professor_code": "P0-1", "module_code": "M0"}).json()
+        self.assertEqual((data["module_code"], data["mean"], data["median"]), ("M0", None, None))
+        self.assertEqual(self.client.get(reverse("distribution"), {"professor_code": "X"}).status_code, 404)
+
+    def test_rate_rejects_out_of_range_rating(self):
+        self.client.force_login(self.users[0])
+        params = {"professor_code": "P0-0", "module_code": "M0", "year": 2024, "semester": 1}
+        self.assertEqual(self.client.post(reverse("rate"), dict(params, rating=6)).status_code, 400)
+        self.assertEqual(self.client.post(reverse("rate"), dict(params, rating="abc")).status_code, 400)
+        self.assertEqual(Rating.objects.count(), 0)
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        create_catalogue(1)
+        self.user = User.objects.create_user("user", "user@test.com", "password")
+        cache.reset_stats()
+
+    def test_repeat_reads_are_served_from_cache(self):
+        first = self.client.get(reverse("list"))
+        with self.assertNumQueries(1):
+            second = self.client.get(reverse("list"))
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(second["Content-Type"], "application/json")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_parameters_are_part_of_the_key(self):
+        self.client.get(reverse("average"), {"professor_code": "P0-0", "module_code": "M0"})
+        response = self.client.get(reverse("average"), {"professor_code": "P0-1", "module_code": "M0"})
+        self.assertEqual(response.json()["professor_code"], "P0-1")
+        self.assertEqual(cache.stats()["hits"], 0)
+
+    def test_writes_invalidate_cached_responses(self):
+        params = {"professor_code": "P0-0", "module_code": "M0"}
+        self.assertIsNone(self.client.get(reverse("average"), params).json()["average_rating"])
+        Rating.objects.create(user=self.user, moduleInstanceProfessor=ModuleInstanceProfessor.objects.first(), rating=4)
+        self.assertEqual(self.client.get(reverse("average"), params).json()["average_rating"], 4)
+
+        self.client.get(reverse("list"))
+        Professor.objects.filter(code="P0-0").update(name="Renamed")
+        Professor.objects.get(code="P0-0").save()
+        self.assertEqual(self.client.get(reverse("list")).json()[0]["taught_by"][0]["professor_name"], "Renamed")
+        self.assertEqual(cache.stats()["hits"], 0)
+
+    def test_stats_endpoint(self):
+        self.client.get(reverse("view"))
+        self.client.get(reverse("view"))
+        self.assertEqual(self.client.get(reverse("cache-stats")).json(), {"hits": 1, "misses": 1})
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        create_catalogue(1)
+        self.user = User.objects.create_user("user", "user@test.com", "password")
+
+    def test_matching_etag_returns_304_without_building_body(self):
+        response = self.client.get(reverse("view"))
+        self.assertTrue(response["ETag"].startswith('"'))
+        cache.reset_stats()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("view"), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(cache.stats(), {"hits": 0, "misses": 0})
+
+    def test_etag_changes_with_data_and_parameters(self):
+        params = {"professor_code": "P0-0", "module_code": "M0"}
+        etag = self.client.get(reverse("average"), params)["ETag"]
+        self.assertNotEqual(etag, self.client.get(reverse("average"), dict(params, professor_code="P0-1"))["ETag"])
+        Rating.objects.create(user=self.user, moduleInstanceProfessor=ModuleInstanceProfessor.objects.first(), rating=2)
+        response = self.client.get(reverse("average"), params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_last_modified_is_only_given_once_its_second_is_over(self):
+        # The catalogue was just created, so the second it changed in isn't over yet
+        self.assertNotIn("Last-Modified", self.client.get(reverse("view")))
+        with unittest.mock.patch("api.conditional.time.time", return_value=time.time() + 2):
+            last_modified = self.client.get(reverse("view"))["Last-Modified"]
+            self.assertEqual(self.client.get(reverse("view"), HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        # A rating added within the same second as that response isn't hidden by a 304
+        Rating.objects.create(user=self.user, moduleInstanceProfessor=ModuleInstanceProfessor.objects.first(), rating=2)
+        self.assertEqual(self.client.get(reverse("view"), HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_errors_have_no_validators(self):
+        response = self.client.get(reverse("average"), {"professor_code": "P9", "module_code": "M0"})
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_list_etag_ignores_ratings(self):
+        etag = self.client.get(reverse("list"))["ETag"]
+        Rating.objects.create(user=self.user, moduleInstanceProfessor=ModuleInstanceProfessor.objects.first(), rating=2)
+        self.assertEqual(self.client.get(reverse("list"), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class BulkRateTests(TestCase):
+    def setUp(self):
+        create_catalogue(3)
+        self.user = User.objects.create_user("user", "user@test.com", "password")
+        self.client.force_login(self.user)
+        Rating.objects.create(user=self.user, moduleInstanceProfessor=ModuleInstanceProfessor.objects.get(professor__code="P2-0"), rating=1)
+        # Every test here is the same user, so don't let earlier tests use up its bulk rating allowance
+        throttle.reset()
+        self.addCleanup(throttle.reset)
+
+    def row(self, professor_code, module_code, rating=4, **kwargs):
+        return dict({"professor_code": professor_code, "module_code": module_code, "year": 2024, "semester": 1, "rating": rating}, **kwargs)
+
+    def test_bulk_rate_reports_per_row_results(self):
+        rows = [
+            self.row("P0-0", "M0", 5),
+            self.row("P0-1", "M0", 3),
+            self.row("P0-0", "M0", 2),
+            self.row("P1-0", "M0"),
+            self.row("P2-0", "M2"),
+            self.row("P1-0", "M1", 9),
+            {"professor_code": "P1-0"},
+        ]
+        response = self.client.post(reverse("rate-bulk") + "?chunk_size=1", json.dumps(rows), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(
+            [result["status"] for result in data["results"]],
+            ["created", "created", "duplicate", "not_found", "already_rated", "invalid", "invalid"],
+        )
+        self.assertEqual(ProfessorModuleAggregate.objects.get(professor__code="P0-0").total, 5)
+        self.assertEqual(aggregates.verify(), [])
+
+    def test_bulk_rate_accepts_ndjson(self):
+        rows = [self.row(f"P{i}-{j}", f"M{i}") for i in range(2) for j in range(2)]
+        body = "\n".join(json.dumps(row) for row in rows)
+        response = self.client.post(reverse("rate-bulk"), body, content_type="application/x-ndjson")
+        self.assertEqual(response.json()["created"], 4)
+        self.assertEqual(Rating.objects.count(), 5)
+
+    def test_bulk_rate_requires_authentication(self):
+        self.client.logout()
+        response = self.client.post(reverse("rate-bulk"), "[]", content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_bulk_rate_reports_out_of_range_numbers_per_row(self):
+        rows = [self.row("P0-0", "M0", "1e999"), self.row("P0-1", "M0", "Infinity"), self.row("P1-0", "M1", year=2024.5), self.row("P1-1", "M1")]
+        response = self.client.post(reverse("rate-bulk"), json.dumps(rows), content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result["status"] for result in response.json()["results"]], ["invalid", "invalid", "invalid", "created"])
+
+    @override_settings(API_BULK_RATE_MAX_ROWS=2)
+    def test_bulk_rate_caps_rows(self):
+        rows = [self.row(f"P{i}-0", f"M{i}") for i in range(3)]
+        response = self.client.post(reverse("rate-bulk"), json.dumps(rows), content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Rating.objects.filter(rating=4).exists())
+
+    def test_bulk_rate_looks_up_targets_in_chunks(self):
+        rows = [self.row(f"P{i}-{j}", f"M{i}") for i in range(2) for j in range(2)]
+        with unittest.mock.patch.object(bulk, "LOOKUP_CHUNK_SIZE", 1):
+            response = self.client.post(reverse("rate-bulk"), json.dumps(rows), content_type="application/json")
+        self.assertEqual(response.json()["created"], 4)
+
+    def test_bulk_rate_rejects_unparseable_body(self):
+        response = self.client.post(reverse("rate-bulk"), "[{", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+
+class TokenAuthTests(TestCase):
+    def setUp(self):
+        create_catalogue(1)
+        self.user = User.objects.create_user("user", "user@test.com", "password")
+        self.params = {"professor_code": "P0-0", "module_code": "M0", "year": 2024, "semester": 1, "rating": 4}
+
+    def login(self):
+        response = self.client.post(reverse("login"), {"username": "user", "password": "password", "token": "1"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["token"]
+
+    def test_token_login_rates_without_session(self):
+        token = self.login()
+        self.assertNotIn("sessionid", self.client.cookies)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("rate"), self.params, HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries if "django_session" in query["sql"]])
+        # Only the check that the token's user is still active reads the user table
+        self.assertEqual(len([query for query in queries if "auth_user" in query["sql"]]), 1)
+        self.assertEqual(Rating.objects.get().user, self.user)
+        response = self.client.post(reverse("rate-bulk"), json.dumps([dict(self.params, professor_code="P0-1")]),
+                                    content_type="application/json", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(response.json()["created"], 1)
+
+    def test_bad_and_expired_tokens_are_rejected(self):
+        token = self.login()
+        response = self.client.post(reverse("rate"), self.params, HTTP_AUTHORIZATION=f"Token {token}x")
+        self.assertEqual(response.status_code, 403)
+        with override_settings(API_TOKEN_MAX_AGE=-1):
+            response = self.client.post(reverse("rate"), self.params, HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Rating.objects.exists())
+
+    def test_tokens_of_deleted_or_inactive_users_are_rejected(self):
+        token = self.login()
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        response = self.client.post(reverse("rate"), self.params, HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], "Token")
+        self.user.delete()
+        response = self.client.post(reverse("rate-bulk"), json.dumps([self.params]),
+                                    content_type="application/json", HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Rating.objects.exists())
+
+
+class PasswordHashingTests(TestCase):
+    def test_login_rehashes_with_current_hasher(self):
+        with override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.PBKDF2PasswordHasher"]):
+            User.objects.create_user("user", "user@test.com", "password")
+        self.assertTrue(User.objects.get().password.startswith("pbkdf2_sha256$"))
+        response = self.client.post(reverse("login"), {"username": "user", "password": "password"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get().password.startswith("argon2$argon2id$v=19$m=19456,t=2,p=1$"))
+
+    def test_requests_wait_for_a_hashing_slot(self):
+        User.objects.create_user("user", "user@test.com", "password")
+        with override_settings(API_PASSWORD_HASH_TIMEOUT=0.01), ExitStack() as slots:
+            # Take every slot
+            for _ in range(settings.API_PASSWORD_HASH_WORKERS):
+                slots.enter_context(hashing.slot())
+            response = self.client.post(reverse("login"), {"username": "user", "password": "password"})
+            self.assertEqual((response.status_code, response["Retry-After"]), (503, "1"))
+            response = self.client.post(reverse("register"), {"username": "new", "email": "new@test.com", "password": "password"})
+            self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.client.post(reverse("login"), {"username": "user", "password": "password"}).status_code, 200)
+
+    def test_benchmark_measures_each_hasher(self):
+        result = hashers.measure(get_hasher("argon2"), duration=0.05)
+        self.assertGreater(result["checks"], 0)
+
+
+@override_settings(API_RATE_LIMITS={"rate": (1, 2), "login": (1, 1)}, API_WRITE_CONCURRENCY=1)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        create_catalogue(1)
+        self.users = [User.objects.create_user(f"user{i}", f"user{i}@test.com", "password") for i in range(2)]
+        throttle.reset()
+        self.addCleanup(throttle.reset)
+
+    def rate(self, user, professor_code):
+        self.client.force_login(user)
+        return self.client.post(reverse("rate"), {"professor_code": professor_code, "module_code": "M0", "year": 2024, "semester": 1, "rating": 3})
+
+    def test_limits_each_user_with_retry_after(self):
+        self.assertEqual(self.rate(self.users[0], "P0-0").status_code, 200)
+        self.assertEqual(self.rate(self.users[0], "P0-1").status_code, 200)
+        response = self.rate(self.users[0], "P0-1")
+        self.assertEqual((response.status_code, response["Retry-After"]), (429, "1"))
+        # Other users and read endpoints aren't affected
+        self.assertEqual(self.rate(self.users[1], "P0-0").status_code, 200)
+        self.assertEqual(self.client.get(reverse("view")).status_code, 200)
+
+    def test_limits_anonymous_clients_by_ip(self):
+        login = {"username": "user0", "password": "password", "token": "1"}
+        self.assertEqual(self.client.post(reverse("login"), login, REMOTE_ADDR="10.0.0.1").status_code, 200)
+        self.assertEqual(self.client.post(reverse("login"), login, REMOTE_ADDR="10.0.0.1").status_code, 429)
+        self.assertEqual(self.client.post(reverse("login"), login, REMOTE_ADDR="10.0.0.2").status_code, 200)
+
+    @override_settings(API_RATE_LIMIT_CLIENT_IP_HEADER="HTTP_X_FORWARDED_FOR", API_RATE_LIMIT_TRUSTED_PROXIES=1)
+    def test_limits_clients_behind_proxy_by_forwarded_address(self):
+        request = RequestFactory().get("/", REMOTE_ADDR="10.0.0.9", HTTP_X_FORWARDED_FOR="1.2.3.4, 192.168.0.1")
+        self.assertEqual(throttle.client_ip(request), "192.168.0.1")
+        self.assertEqual(throttle.client_ip(RequestFactory().get("/", REMOTE_ADDR="10.0.0.9")), "10.0.0.9")
+        with override_settings(API_RATE_LIMIT_TRUSTED_PROXIES=2):
+            self.assertEqual(throttle.client_ip(request), "1.2.3.4")
+        login = {"username": "user0", "password": "password", "token": "1"}
+        self.assertEqual(self.client.post(reverse("login"), login, REMOTE_ADDR="10.0.0.9", HTTP_X_FORWARDED_FOR="192.168.0.1").status_code, 200)
+        self.assertEqual(self.client.post(reverse("login"), login, REMOTE_ADDR="10.0.0.9", HTTP_X_FORWARDED_FOR="192.168.0.2").status_code, 200)
+        self.assertEqual(self.client.post(reverse("login"), login, REMOTE_ADDR="10.0.0.9", HTTP_X_FORWARDED_FOR="192.168.0.1").status_code, 429)
+
+    @override_settings(API_RATE_LIMIT_BACKEND="cache")
+    def test_cache_backend_shares_buckets(self):
+        throttle.reset()
+        self.assertIsInstance(throttle.buckets(), throttle.CacheBuckets)
+        self.rate(self.users[0], "P0-0")
+        self.rate(self.users[0], "P0-1")
+        # Another process with its own memory would still see the bucket in the cache
+        self.assertEqual(self.rate(self.users[0], "P0-1").status_code, 429)
+
+    def test_sheds_writes_over_concurrency_cap(self):
+        slots = throttle.write_slots()
+        slots.acquire()
+        try:
+            response = self.rate(self.users[0], "P0-0")
+        finally:
+            slots.release()
+        self.assertEqual((response.status_code, response["Retry-After"]), (503, "1"))
+        self.assertEqual(self.rate(self.users[0], "P0-0").status_code, 200)
+
+
+@override_settings(API_RATE_WRITE_BEHIND=True, API_RATE_QUEUE_WORKER=False)
+class WriteBehindTests(TestCase):
+    def setUp(self):
+        create_catalogue(1)
+        self.user = User.objects.create_user("user", "user@test.com", "password")
+        self.client.force_login(self.user)
+
+    def rate(self, professor_code, rating=4):
+        return self.client.post(reverse("rate"), {"professor_code": professor_code, "module_code": "M0", "year": 2024, "semester": 1, "rating": rating})
+
+    def test_rating_is_queued_then_added_in_a_batch(self):
+        response = self.rate("P0-0")
+        self.assertEqual(response.status_code, 202)
+        status_url = response["Location"]
+        self.assertEqual(self.client.get(status_url).json()["status"], "pending")
+        self.assertEqual(self.rate("P0-1", 2).status_code, 202)
+        self.assertFalse(Rating.objects.exists())
+        self.assertEqual(self.client.get(reverse("rate-queue")).json()["pending"], 2)
+        # Queued twice
+        self.assertEqual(self.rate("P0-0").status_code, 422)
+
+        self.assertEqual(writebehind.drain_batch(), (2, 0))
+        status = self.client.get(status_url).json()
+        self.assertEqual(status["status"], "added")
+        self.assertEqual(Rating.objects.get(id=status["rating_id"]).rating, 4)
+        self.assertEqual(ProfessorAggregate.objects.get(professor__code="P0-1").total, 2)
+        self.assertEqual(aggregates.verify(), [])
+        self.assertEqual(self.client.get(reverse("rate-queue")).json()["pending"], 0)
+
+    def test_drain_rejects_ratings_added_meanwhile(self):
+        mip = ModuleInstanceProfessor.objects.get(professor__code="P0-0")
+        queued = [writebehind.enqueue(self.user.id, mip.id, rating) for rating in (3, 5)]
+        call_command("drain_ratings", "--once", stdout=StringIO())
+        statuses = [PendingRating.objects.get(id=pending.id) for pending in queued]
+        self.assertEqual([pending.status for pending in statuses], ["added", "rejected"])
+        self.assertEqual(statuses[1].reason, "User has already rated this Module Instance")
+        self.assertEqual(Rating.objects.get().rating, 3)
+
+    def test_status_is_only_shown_to_its_user(self):
+        queued = self.rate("P0-0").json()["id"]
+        self.client.force_login(User.objects.create_user("other", "other@test.com", "password"))
+        self.assertEqual(self.client.get(reverse("rate-status"), {"id": queued}).status_code, 404)
+
+    def test_worker_starts_with_first_request(self):
+        with unittest.mock.patch.object(writebehind, "worker") as worker:
+            self.client.get(reverse("rate-queue"))
+            worker.assert_not_called()
+            with override_settings(API_RATE_QUEUE_WORKER=True):
+                self.client.get(reverse("rate-queue"))
+            worker.assert_called_once_with()
+
+
+class CatalogueIndexTests(TestCase):
+    def setUp(self):
+        create_catalogue(2)
+        self.users = [User.objects.create_user(f"user{i}", f"user{i}@test.com", "password") for i in range(2)]
+        self.client.force_login(self.users[0])
+
+    def rate(self, professor_code, module_code="M0", year=2024):
+        return self.client.post(reverse("rate"), {"professor_code": professor_code, "module_code": module_code, "year": year, "semester": 1, "rating": 4})
+
+    def test_rate_resolves_codes_without_queries(self):
+        self.assertEqual(self.rate("P0-0").status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.rate("P1-0", "M1").status_code, 200)
+        self.assertFalse([query for query in queries if re.search(r'FROM "api_(professor|module|moduleinstance|moduleinstanceprofessor)"', query["sql"])])
+        self.assertEqual(self.rate("P1-0", "M0").status_code, 404)
+        self.assertEqual(aggregates.verify(), [])
+
+    def test_index_follows_catalogue_changes(self):
+        self.rate("P0-0")
+        # Made in this process, so applied straight away
+        instance = ModuleInstance.objects.create(module=Module.objects.get(code="M0"), year=2025, semester=1)
+        ModuleInstanceProfessor.objects.create(moduleInstance=instance, professor=Professor.objects.get(code="P0-0"))
+        self.assertEqual(self.rate("P0-0", year=2025).status_code, 200)
+
+        # Made elsewhere (bulk_create skips signals), so the index doesn't know it yet
+        ModuleInstanceProfessor.objects.bulk_create([ModuleInstanceProfessor(moduleInstance=instance, professor=Professor.objects.get(code="P1-0"))])
+        # Without a new catalogue version a miss only costs reading the version
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.rate("P1-0", year=2025).status_code, 404)
+        self.assertFalse([query for query in queries if "api_moduleinstanceprofessor" in query["sql"]])
+        # With one the miss reloads the index straight away, rather than after API_CATALOGUE_CHECK_INTERVAL
+        versions.bump(versions.CATALOGUE)
+        self.assertEqual(self.rate("P1-0", year=2025).status_code, 200)
+
+    def test_index_only_moves_to_newer_versions(self):
+        catalogue.reset()
+        old = versions.current(versions.CATALOGUE)[0]
+        first = catalogue.index(old)
+        versions.bump(versions.CATALOGUE)
+        new = versions.current(versions.CATALOGUE)[0]
+        second = catalogue.index(new)
+        self.assertIsNot(second, first)
+        # A request that read the version before the bump keeps the newer index rather than reloading the old one
+        with self.assertNumQueries(0):
+            self.assertIs(catalogue.index(old), second)
+
+    def test_index_skips_teaching_added_while_loading(self):
+        professor = Professor.objects.get(code="P0-0")
+        with unittest.mock.patch.object(Professor.objects, "values_list", return_value=[(professor.id, professor.name, professor.code)]):
+            index = catalogue.Index(versions.current(versions.CATALOGUE)[0])
+        self.assertEqual({key[3] for key in index.instance_professors}, {"P0-0"})
+
+    def test_targets_never_load_the_index(self):
+        mip = ModuleInstanceProfessor.objects.select_related("moduleInstance").get(professor__code="P0-0")
+        catalogue.reset()
+        with CaptureQueriesContext(connection) as queries:
+            targets = catalogue.targets({mip.id})
+        self.assertEqual(targets, {mip.id: (mip.professor_id, mip.moduleInstance.module_id, 2024, 1)})
+        self.assertEqual(len(queries), 1)
+        # Once loaded by a read, the index answers without queries
+        catalogue.index()
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogue.targets({mip.id}), targets)
+
+    def test_average_reads_only_versions_and_aggregate(self):
+        self.rate("P0-0")
+        self.client.get(reverse("average"), {"professor_code": "P0-0", "module_code": "M1"})
+        with self.assertNumQueries(2):
+            data = self.client.get(reverse("average"), {"professor_code": "P0-0", "module_code": "M0"}).json()
+        self.assertEqual((data["professor_name"], data["module_name"], data["average_rating"]), ("Professor 0-0", "Module 0", 4))
+        self.assertEqual(self.client.get(reverse("average"), {"professor_code": "P9", "module_code": "M0"}).status_code, 404)
+
+
+class AverageBatchTests(TestCase):
+    def setUp(self):
+        create_catalogue(3)
+        user = User.objects.create_user("user", "user@test.com", "password")
+        for mip, rating in zip(ModuleInstanceProfessor.objects.order_by("id"), [4, 2, 5]):
+            Rating.objects.create(user=user, moduleInstanceProfessor=mip, rating=rating)
+
+    def post(self, pairs):
+        return self.client.post(reverse("average-batch"), json.dumps(pairs), content_type="application/json")
+
+    def test_averages_every_pair_in_constant_queries(self):
+        pairs = [{"professor_code": "P0-0", "module_code": "M0"}, ["P0-1", "M0"], ["P1-0", "M1"], ["P1-1", "M1"], ["P0-0", "M1"], ["X", "M0"]]
+        with self.assertNumQueries(3):
+            response = self.post(pairs)
+        data = response.json()
+        self.assertEqual(data["P0-0/M0"]["average_rating"], 4)
+        self.assertEqual(data["P0-1/M0"]["average_rating"], 2)
+        self.assertEqual(data["P1-0/M1"]["average_rating"], 5)
+        self.assertIsNone(data["P1-1/M1"]["average_rating"])
+        # Existing professor and module that were never paired, and an unknown professor
+        self.assertIsNone(data["P0-0/M1"]["average_rating"])
+        self.assertIsNone(data["X/M0"])
+        # Matches the single pair endpoint
+        single = self.client.get(reverse("average"), {"professor_code": "P0-0", "module_code": "M0"}).json()
+        self.assertEqual(data["P0-0/M0"], single)
+
+    def test_rejects_malformed_pairs(self):
+        self.assertEqual(self.post([{"professor_code": "P0-0"}]).status_code, 400)
+        self.assertEqual(self.client.post(reverse("average-batch"), "not json", content_type="application/json").status_code, 400)
+        with override_settings(API_AVERAGE_BATCH_MAX_PAIRS=1):
+            self.assertEqual(self.post([["P0-0", "M0"], ["P0-1", "M0"]]).status_code, 400)
+
+
+class TrendsTests(TestCase):
+    def setUp(self):
+        create_catalogue(2)
+        # P0-0 also taught M0 and M1 in an earlier term
+        professor = Professor.objects.get(code="P0-0")
+        for code in ("M0", "M1"):
+            instance = ModuleInstance.objects.create(module=Module.objects.get(code=code), year=2023, semester=2)
+            ModuleInstanceProfessor.objects.create(moduleInstance=instance, professor=professor)
+        users = [User.objects.create_user(f"user{i}", f"user{i}@test.com", "password") for i in range(2)]
+        for mip in ModuleInstanceProfessor.objects.filter(professor=professor):
+            for user, value in zip(users, [mip.moduleInstance.year - 2020, 5]):
+                Rating.objects.create(user=user, moduleInstanceProfessor=mip, rating=value)
+
+    def test_professor_trend_adds_up_modules_per_term(self):
+        data = self.client.get(reverse("trends"), {"professor_code": "P0-0"}).json()
+        self.assertEqual(data, [{"professor_name": "Professor 0-0", "professor_code": "P0-0", "terms": [
+            {"year": 2023, "semester": 2, "mean": 4.0, "count": 4},
+            {"year": 2024, "semester": 1, "mean": 4.5, "count": 2},
+        ]}])
+
+    def test_module_trend_and_full_report(self):
+        data = self.client.get(reverse("trends"), {"professor_code": "P0-0", "module_code": "M1"}).json()
+        self.assertEqual((data[0]["module_code"], data[0]["terms"]), ("M1", [{"year": 2023, "semester": 2, "mean": 4.0, "count": 2}]))
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse("trends")).json()
+        self.assertEqual([row["professor_code"] for row in data], ["P0-0"])
+        self.assertEqual(self.client.get(reverse("trends"), {"professor_code": "P1-1"}).status_code, 404)
+
+    def test_rollup_follows_deletes(self):
+        Rating.objects.filter(moduleInstanceProfessor__moduleInstance__year=2023).delete()
+        self.assertFalse(ProfessorTermAggregate.objects.filter(year=2023, count__gt=0).exists())
+        self.assertEqual(aggregates.verify(), [])
+
+    def test_rollups_follow_catalogue_changes(self):
+        instance = ModuleInstance.objects.get(module__code="M1", year=2023)
+        instance.year = 2022
+        instance.save()
+        self.assertEqual(aggregates.verify(), [])
+        instance.module = Module.objects.get(code="M0")
+        instance.save()
+        self.assertEqual(aggregates.verify(), [])
+        mip = ModuleInstanceProfessor.objects.get(moduleInstance=instance)
+        mip.professor = Professor.objects.get(code="P1-0")
+        mip.save()
+        self.assertEqual(aggregates.verify(), [])
+        data = self.client.get(reverse("trends"), {"professor_code": "P1-0"}).json()
+        self.assertEqual(data[0]["terms"][0], {"year": 2022, "semester": 2, "mean": 4.0, "count": 2})
+        # Later changes to the moved ratings come off their new aggregates
+        Rating.objects.filter(moduleInstanceProfessor=mip).delete()
+        self.assertEqual(aggregates.verify(), [])
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        create_catalogue(2)
+        user = User.objects.create_user("user", "user@test.com", "password")
+        for mip, value in zip(ModuleInstanceProfessor.objects.order_by("id"), [1, 2, 3, 4]):
+            Rating.objects.create(user=user, moduleInstanceProfessor=mip, rating=value)
+        self.ids = list(Rating.objects.order_by("id").values_list("id", flat=True))
+
+    def test_csv_export_in_chunks_and_since(self):
+        summary = {}
+        parts = list(export.stream("csv", chunk_size=3, summary=summary))
+        self.assertEqual(len(parts), 2)
+        rows = list(csv.reader(StringIO(b"".join(parts).decode())))
+        self.assertEqual(rows[0], list(export.COLUMNS))
+        self.assertEqual(rows[1][:4], [str(self.ids[0]), str(User.objects.get().id), "1", "P0-0"])
+        self.assertEqual(summary, {"rows": 4, "last_id": self.ids[-1]})
+
+        rows = list(csv.reader(StringIO(b"".join(export.stream("csv", since=self.ids[1], summary=summary)).decode())))
+        self.assertEqual([int(row[0]) for row in rows[1:]], self.ids[2:])
+        list(export.stream("csv", since=self.ids[-1], summary=summary))
+        self.assertEqual(summary, {"rows": 0, "last_id": self.ids[-1]})
+
+    @unittest.skipIf(export.pyarrow is None, "pyarrow isn't installed")
+    def test_parquet_and_arrow_round_trip(self):
+        table = export.pyarrow.parquet.read_table(BytesIO(b"".join(export.stream("parquet", chunk_size=3))))
+        self.assertEqual(table.column("rating").to_pylist(), [1, 2, 3, 4])
+        self.assertEqual(table.column("module_code").to_pylist(), ["M0", "M0", "M1", "M1"])
+        reader = export.pyarrow.ipc.open_stream(b"".join(export.stream("arrow", since=self.ids[0])))
+        self.assertEqual(reader.read_all().column("rating_id").to_pylist(), self.ids[1:])
+
+    def test_endpoint_is_staff_only(self):
+        staff = User.objects.create_user("staff", "staff@test.com", "password", is_staff=True)
+        self.assertEqual(self.client.get(reverse("export")).status_code, 403)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("export"), {"format": "csv", "since": self.ids[2]})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertEqual(len(b"".join(response.streaming_content).decode().splitlines()), 2)
+        self.assertEqual(self.client.get(reverse("export"), {"format": "xml"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("export"), {"since": "last"}).status_code, 400)
+
+    def test_command_reports_last_id(self):
+        out, err = StringIO(), StringIO()
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), "ratings.csv")
+        call_command("export_ratings", path, "--format", "csv", "--since", str(self.ids[0]), stdout=out, stderr=err)
+        self.assertIn(f"Exported 3 ratings, last rating id {self.ids[-1]}", err.getvalue())
+        with open(path) as f:
+            self.assertEqual(len(f.read().splitlines()), 4)
+
+
+class PaginationTests(TestCase):
+    def setUp(self):
+        create_catalogue(5)
+        ModuleInstance.objects.filter(module__code="M3").update(year=2023)
+
+    def fetch_all(self, name, params):
+        # Follow Link headers until there are no more pages
+        rows, pages = [], 0
+        url, data = reverse(name), params
+        while url:
+            response = self.client.get(url, data)
+            rows += response.json()
+            pages += 1
+            url, data = response.get("Link", "").partition(">")[0][1:] or None, None
+        return rows, pages
+
+    def test_list_pages_follow_link_header(self):
+        rows, pages = self.fetch_all("list", {"limit": 2})
+        self.assertEqual([row["module_code"] for row in rows], ["M0", "M1", "M2", "M3", "M4"])
+        self.assertEqual(pages, 3)
+
+    def test_view_pages_follow_link_header(self):
+        rows, pages = self.fetch_all("view", {"limit": 4})
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(pages, 3)
+
+    def test_page_query_count_is_constant(self):
+        first = self.client.get(reverse("list"), {"limit": 1})
+        with self.assertNumQueries(4):
+            self.client.get(first["Link"].partition(">")[0][1:] + "&nocache=1")
+
+    def test_list_filters(self):
+        response = self.client.get(reverse("list"), {"year": 2023})
+        self.assertEqual([row["module_code"] for row in response.json()], ["M3"])
+        response = self.client.get(reverse("list"), {"professor_code": "P2-1", "semester": 1})
+        self.assertEqual([row["module_code"] for row in response.json()], ["M2"])
+        response = self.client.get(reverse("list"), {"module_code": "M1", "year": 2023})
+        self.assertEqual(response.status_code, 404)
+
+    def test_view_filters(self):
+        response = self.client.get(reverse("view"), {"module_code": "M1"})
+        self.assertEqual([row["professor_code"] for row in response.json()], ["P1-0", "P1-1"])
+        response = self.client.get(reverse("view"), {"professor_code": "P4-0", "limit": 5})
+        self.assertEqual([row["professor_code"] for row in response.json()], ["P4-0"])
+        self.assertNotIn("Link", response)
+
+    def test_invalid_page_parameters(self):
+        self.assertEqual(self.client.get(reverse("list"), {"limit": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("view"), {"year": "x"}).status_code, 400)
+
+    def test_link_header_survives_cache(self):
+        first = self.client.get(reverse("list"), {"limit": 2})
+        second = self.client.get(reverse("list"), {"limit": 2})
+        self.assertEqual(first["Link"], second["Link"])
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        create_catalogue(3)
+        user = User.objects.create_user("user", "user@test.com", "password")
+        Rating.objects.create(user=user, moduleInstanceProfessor=ModuleInstanceProfessor.objects.first(), rating=4)
+        self.factory = RequestFactory()
+        self.async_factory = AsyncRequestFactory()
+
+    async def assertSameResponse(self, sync_view, async_view, path, params):
+        expected = await sync_to_async(sync_view)(self.factory.get(path, params))
+        actual = await async_view(self.async_factory.get(path, params))
+        self.assertEqual(actual.status_code, expected.status_code)
+        self.assertEqual(actual.content, expected.content)
+        self.assertEqual(actual.get("ETag"), expected.get("ETag"))
+        self.assertEqual(actual.get("Link"), expected.get("Link"))
+
+    async def test_async_views_match_sync_views(self):
+        await self.assertSameResponse(views.list_view, async_views.alist_view, "/api/list", {"limit": 2})
+        await self.assertSameResponse(views.view_view, async_views.aview_view, "/api/view", {"module_code": "M0"})
+        await self.assertSameResponse(views.average_view, async_views.aaverage_view, "/api/average", {"professor_code": "P0-0", "module_code": "M0"})
+        await self.assertSameResponse(views.average_view, async_views.aaverage_view, "/api/average", {"professor_code": "X", "module_code": "M0"})
+
+    async def test_async_list_streams_ndjson(self):
+        response = await async_views.alist_view(self.async_factory.get("/api/list", {"format": "ndjson"}))
+        lines = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([json.loads(line)["module_code"] for line in lines], ["M0", "M1", "M2"])
+
+    async def test_async_conditional_get(self):
+        response = await async_views.aview_view(self.async_factory.get("/api/view"))
+        response = await async_views.aview_view(self.async_factory.get("/api/view", headers={"if-none-match": response["ETag"]}))
+        self.assertEqual(response.status_code, 304)
+
+
+class TimingMiddlewareTests(TestCase):
+    def setUp(self):
+        create_catalogue(3)
+        cache.get_cache().clear()
+        timing.metrics.reset()
+
+    def server_timing(self, response):
+        return dict(re.findall(r"(\w+);dur=([\d.]+)", response["Server-Timing"]))
+
+    def test_server_timing_reports_queries(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("list"))
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+        self.assertEqual(set(self.server_timing(response)), {"db", "view", "serialize", "total"})
+
+        # Cached responses skip the queries and the serialisation
+        response = self.client.get(reverse("list"))
+        self.assertIn('desc="1 queries"', response["Server-Timing"])
+
+    def test_logs_timing_line(self):
+        with self.assertLogs("api.timing", "INFO") as logs:
+            self.client.get(reverse("view"), {"module_code": "M0"})
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["endpoint"], line["status"]), ("view", 200))
+        self.assertGreater(line["queries"], 0)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("list"))
+        self.client.get(reverse("average"), {"professor_code": "X", "module_code": "M0"})
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn('api_requests_total{endpoint="list",status="200"} 1', body)
+        self.assertIn('api_requests_total{endpoint="average",status="404"} 1', body)
+        self.assertIn('api_request_duration_seconds_bucket{endpoint="list",le="+Inf"} 1', body)
+        self.assertIn('api_cache_requests_total{result="miss"}', body)
+
+    async def test_counts_queries_of_async_requests(self):
+        response = await self.async_client.get(reverse("view"))
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+
+class DatagenTests(TestCase):
+    def test_generate_creates_consistent_dataset(self):
+        counts = datagen.generate(professors=5, modules=3, instances=6, users=4, ratings=10, password_hash="!")
+        self.assertEqual(counts["professors"], Professor.objects.count())
+        self.assertEqual(counts["module instances"], 6)
+        self.assertEqual(Rating.objects.count(), 10)
+        self.assertEqual(aggregates.verify(), [])
+        self.assertEqual(ProfessorAggregate.objects.aggregate(Sum("count"))["count__sum"], 10)
+
+    def test_load_derives_catalogue_from_rows(self):
+        rows = [
+            {"professor_code": "RR", "professor_name": "Roy Ruddle", "module_code": "IV", "module_name": "Info Vis", "year": "2024", "semester": "1", "username": "alice", "rating": "4"},
+            {"professor_code": "RR", "module_code": "IV", "year": 2024, "semester": 1, "username": "bob", "rating": 2},
+            {"professor_code": "JS", "professor_name": "John Stell", "module_code": "IV", "year": 2023, "semester": 2, "username": "", "rating": ""},
+        ]
+        counts = datagen.load(rows, password_hash="!")
+        self.assertEqual((counts["professors"], counts["module instances"], counts["users"], counts["ratings"]), (2, 2, 2, 2))
+        self.assertEqual(Professor.objects.get(code="RR").name, "Roy Ruddle")
+        self.assertEqual(self.client.get(reverse("average"), {"professor_code": "RR", "module_code": "IV"}).json()["average_rating"], 3)
+
+    def test_load_rejects_ratings_out_of_range(self):
+        rows = [
+            {"professor_code": "RR", "module_code": "IV", "year": 2024, "semester": 1, "username": "alice", "rating": 4},
+            {"professor_code": "RR", "module_code": "IV", "year": 2024, "semester": 1, "username": "bob", "rating": 6},
+        ]
+        with self.assertRaisesMessage(ValueError, "Row 1"):
+            datagen.load(rows, password_hash="!")
+        self.assertFalse(Professor.objects.exists())
+
+    def test_load_names_the_row_of_bad_input(self):
+        row = {"professor_code": "RR", "module_code": "IV", "year": 2024, "semester": 1, "username": "alice", "rating": 4}
+        for bad, message in [
+            (dict(row, year="next"), "Row 1: year and semester"),
+            (dict(row, semester=None), "Row 1: year and semester"),
+            (dict(row, rating="four"), "Row 1: rating must be a number"),
+            (dict(row, professor_code=""), "Row 1: professor_code"),
+            (dict(row, rating=2), "Row 1: alice already rated this module instance professor in row 0"),
+        ]:
+            with self.subTest(bad=bad), self.assertRaisesMessage(ValueError, message):
+                datagen.load([row, bad], password_hash="!")
+        self.assertFalse(Rating.objects.exists())
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "Stress test copies a SQLite database")
+class SqliteStressTests(TransactionTestCase):
+    def test_compare_reads_and_writes_each_config(self):
+        create_catalogue(2)
+        user = User.objects.create_user("user", "user@test.com", "password")
+        Rating.objects.create(user=user, moduleInstanceProfessor=ModuleInstanceProfessor.objects.first(), rating=4)
+        results = sqlite_stress.compare(connection.settings_dict["NAME"], readers=1, writers=1, duration=0.3)
+        self.assertEqual(set(results), {"default", "tuned"})
+        for summary in results.values():
+            self.assertGreater(summary["reads"], 0)
+            self.assertGreater(summary["writes"], 0)
+        # The source database is left alone
+        self.assertEqual(Rating.objects.count(), 1)
@@ -0,0 +1,139 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from api import tokens
+
+# Throttle
+# Description: Limit how often each client may call the write endpoints, and how many write requests
+# a process handles at once, so one misbehaving script can't queue everyone else behind the single
+# SQLite writer. Used by api.middleware.ThrottleMiddleware.
+# Each (endpoint, client) pair has a token bucket holding up to burst requests, refilled at rate
+# requests per second (API_RATE_LIMITS). Clients are users if authenticated and IP addresses otherwise.
+# A bucket is stored as the time it will next be full, so taking a token is a single read and write:
+# a request is allowed if the bucket would still be full enough after adding 1 / rate seconds to that time.
+# Buckets are kept in this process's memory, or in a Django cache shared between processes with
+# API_RATE_LIMIT_BACKEND = 'cache'. Cache updates aren't atomic, so racing processes may let an extra
+# request or two through.
+
+
+# In-process buckets
+class MemoryBuckets:
+    # Forget full buckets once there are this many
+    PRUNE_AT = 10_000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.full_at = {}
+
+    def take(self, key, rate, burst, now):
+        with self.lock:
+            full_at, wait = _take(self.full_at.get(key, now), rate, burst, now)
+            if not wait:
+                self.full_at[key] = full_at
+                if len(self.full_at) > self.PRUNE_AT:
+                    self.full_at = {key: value for key, value in self.full_at.items() if value > now}
+            return wait
+
+    def reset(self):
+        with self.lock:
+            self.full_at.clear()
+
+
+# Buckets in the Django cache named by API_RATE_LIMIT_CACHE_ALIAS, shared by every process using it
+class CacheBuckets:
+    def __init__(self, alias):
+        self.alias = alias
+
+    def take(self, key, rate, burst, now):
+        cache = caches[self.alias]
+        key = f"throttle:{key}"
+        full_at, wait = _take(cache.get(key, now), rate, burst, now)
+        if not wait:
+            # Expire the entry once the bucket is full again, as it then holds nothing to remember
+            cache.set(key, full_at, timeout=math.ceil(full_at - now) + 1)
+        return wait
+
+    def reset(self):
+        caches[self.alias].clear()
+
+
+# Take a token from a bucket that is full at full_at
+# Returns (the new full_at, 0) if allowed, or (full_at, seconds until a token is available) if not
+def _take(full_at, rate, burst, now):
+    full_at = max(full_at, now) + 1 / rate
+    wait = full_at - now - burst / rate
+    if wait > 0:
+        return None, wait
+    return full_at, 0
+
+
+_buckets = None
+_slots = None
+_lock = threading.Lock()
+
+
+def buckets():
+    global _buckets
+    with _lock:
+        if _buckets is None:
+            if getattr(settings, 'API_RATE_LIMIT_BACKEND', 'memory') == 'cache':
+                _buckets = CacheBuckets(getattr(settings, 'API_RATE_LIMIT_CACHE_ALIAS', 'default'))
+            else:
+                _buckets = MemoryBuckets()
+        return _buckets
+
+
+# Semaphore counting the write requests in progress in this process
+def write_slots():
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(getattr(settings, 'API_WRITE_CONCURRENCY', 8))
+        return _slots
+
+
+# Empty every bucket, and pick up changed settings
+def reset():
+    global _buckets, _slots
+    with _lock:
+        if _buckets is not None:
+            _buckets.reset()
+        _buckets = None
+        _slots = None
+
+
+# Address of the client making a request
+# Behind a reverse proxy REMOTE_ADDR is the proxy's, so with API_RATE_LIMIT_CLIENT_IP_HEADER set
+# (e.g. 'HTTP_X_FORWARDED_FOR') the client is the entry API_RATE_LIMIT_TRUSTED_PROXIES from the right
+# of that header, the one added by the outermost trusted proxy. Entries left of it are whatever the
+# client sent, so can't be trusted.
+def client_ip(request):
+    header = getattr(settings, 'API_RATE_LIMIT_CLIENT_IP_HEADER', None)
+    if header:
+        addresses = [address.strip() for address in request.META.get(header, '').split(',') if address.strip()]
+        proxies = getattr(settings, 'API_RATE_LIMIT_TRUSTED_PROXIES', 1)
+        if 0 < proxies <= len(addresses):
+            return addresses[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+# Who is making a request, for keying its buckets
+def client(request):
+    user_id = tokens.claimed_user_id(request)
+    if user_id is not None:
+        return f"user:{user_id}"
+    return f"ip:{client_ip(request)}"
+
+
+# Take a token from the request's bucket for an endpoint
+# Returns 0 if the request is allowed, or the seconds until it would be
+def check(request, endpoint):
+    limit = getattr(settings, 'API_RATE_LIMITS', {}).get(endpoint)
+    if limit is None:
+        return 0
+    rate, burst = limit
+    return buckets().take(f"{endpoint}:{client(request)}", rate, burst, time.time())
@@ -0,0 +1,149 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from django.http.response import JsonResponse as DjangoJsonResponse
+
+from api import cache
+
+# Timing
+# Description: Per-request timing collected by api.middleware.TimingMiddleware.
+# Every database connection runs its queries through record_query, which adds them to the
+# timings of the request being handled in the current context, if any. Since the timings live
+# in a context variable they follow a request into the threads the async ORM uses.
+
+# Upper bounds, in seconds, of the request duration histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+
+
+_current = contextvars.ContextVar('api_request_timings', default=None)
+
+
+# Start collecting timings for the request in the current context
+# Returns a token for stop()
+def start():
+    return _current.set(RequestTimings())
+
+
+def current():
+    return _current.get()
+
+
+def stop(token):
+    _current.reset(token)
+
+
+# Database execute wrapper, see connect_query_recorder
+def record_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.db += time.perf_counter() - started
+
+
+# connection_created receiver installing record_query on every new database connection
+def connect_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# JsonResponse that records the time spent encoding its data as serialisation time
+class JsonResponse(DjangoJsonResponse):
+    def __init__(self, *args, **kwargs):
+        started = time.perf_counter()
+        super().__init__(*args, **kwargs)
+        timings = _current.get()
+        if timings is not None:
+            timings.serialize += time.perf_counter() - started
+
+
+class Metrics:
+    # Cumulative per-endpoint request metrics for this process, in Prometheus text format
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.durations = {}
+        self.db = {}
+        self.queries = {}
+
+    def observe(self, endpoint, status, total, db, queries):
+        with self.lock:
+            key = (endpoint, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            buckets, total_sum, count = self.durations.get(endpoint, ([0] * len(BUCKETS), 0.0, 0))
+            index = bisect.bisect_left(BUCKETS, total)
+            if index < len(BUCKETS):
+                buckets[index] += 1
+            self.durations[endpoint] = (buckets, total_sum + total, count + 1)
+            self.db[endpoint] = self.db.get(endpoint, 0.0) + db
+            self.queries[endpoint] = self.queries.get(endpoint, 0) + queries
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.durations.clear()
+            self.db.clear()
+            self.queries.clear()
+
+    def render(self):
+        lines = []
+        with self.lock:
+            lines += [
+                "# HELP api_requests_total Requests handled, by endpoint and status code.",
+                "# TYPE api_requests_total counter",
+            ]
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'api_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP api_request_duration_seconds Time to handle a request, by endpoint.",
+                "# TYPE api_request_duration_seconds histogram",
+            ]
+            for endpoint, (buckets, total_sum, count) in sorted(self.durations.items()):
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS, buckets):
+                    cumulative += bucket
+                    lines.append(f'api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'api_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {count}')
+                lines.append(f'api_request_duration_seconds_sum{{endpoint="{endpoint}"}} {total_sum:.6f}')
+                lines.append(f'api_request_duration_seconds_count{{endpoint="{endpoint}"}} {count}')
+
+            lines += [
+                "# HELP api_db_seconds_total Time spent in database queries, by endpoint.",
+                "# TYPE api_db_seconds_total counter",
+            ]
+            for endpoint, db in sorted(self.db.items()):
+                lines.append(f'api_db_seconds_total{{endpoint="{endpoint}"}} {db:.6f}')
+
+            lines += [
+                "# HELP api_db_queries_total Database queries run, by endpoint.",
+                "# TYPE api_db_queries_total counter",
+            ]
+            for endpoint, queries in sorted(self.queries.items()):
+                lines.append(f'api_db_queries_total{{endpoint="{endpoint}"}} {queries}')
+
+        stats = cache.stats()
+        lines += [
+            "# HELP api_cache_requests_total Response cache lookups, by result.",
+            "# TYPE api_cache_requests_total counter",
+            f'api_cache_requests_total{{result="hit"}} {stats["hits"]}',
+            f'api_cache_requests_total{{result="miss"}} {stats["misses"]}',
+        ]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
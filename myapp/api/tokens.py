@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+
+# Tokens
+# Description: Signed, expiring tokens issued by /api/login as an alternative to a session.
+# A token is the user's id signed together with the time it was issued (django.core.signing with
+# SECRET_KEY), so checking one is an HMAC rather than a session and user lookup in the database.
+# Clients send it back in an "Authorization: Token <token>" header. Tokens can't be revoked:
+# one stays valid until it is API_TOKEN_MAX_AGE seconds old, even after logging out, but only
+# while its user still exists and is active.
+
+SALT = 'api.tokens'
+PREFIX = 'Token '
+
+
+# Raised for a valid token whose user has since been deleted or deactivated
+class InactiveUser(Exception):
+    pass
+
+
+def max_age():
+    return getattr(settings, 'API_TOKEN_MAX_AGE', 24 * 60 * 60)
+
+
+# Issue a token for a user
+def issue(user):
+    return signing.TimestampSigner(salt=SALT).sign(str(user.pk))
+
+
+# Id of the user a request claims to be, from its token's signature alone if it sent one and from
+# its session otherwise, without checking that a token's user still exists (e.g. for rate limiting)
+# Returns None if the request isn't authenticated, or if its token is invalid or has expired
+def claimed_user_id(request):
+    header = request.headers.get('Authorization', '')
+    if header.startswith(PREFIX):
+        try:
+            return int(signing.TimestampSigner(salt=SALT).unsign(header[len(PREFIX):], max_age=max_age()))
+        except (signing.BadSignature, ValueError):
+            return None
+    return request.user.id if request.user.is_authenticated else None
+
+
+# Id of the user making the request, from its token if it sent one and from its session otherwise
+# Returns None if the request isn't authenticated, or if its token is invalid or has expired
+# Raises InactiveUser if the token's user has been deleted or deactivated since it was issued
+def user_id(request):
+    claimed = claimed_user_id(request)
+    if claimed is not None and request.headers.get('Authorization', '').startswith(PREFIX):
+        # Sessions of deleted or inactive users are already dropped by the authentication middleware
+        if not User.objects.filter(pk=claimed, is_active=True).exists():
+            raise InactiveUser
+    return claimed
@@ -1,13 +1,30 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
 
+# Serve the read endpoints from the async views when running under ASGI
+if getattr(settings, 'API_ASYNC_VIEWS', False):
+    from . import async_views
+    list_view, view_view, average_view = async_views.alist_view, async_views.aview_view, async_views.aaverage_view
+else:
+    list_view, view_view, average_view = views.list_view, views.view_view, views.average_view
+
 urlpatterns = [
     path("register", views.register_view, name="register"),
     path("login", views.login_view, name="login"),
     path("logout", views.logout_view, name="logout"),
-    path("list", views.list_view, name="list"),
-    path("view", views.view_view, name="view"),
-    path("average", views.average_view, name="average"),
+    path("list", list_view, name="list"),
+    path("view", view_view, name="view"),
+    path("average", average_view, name="average"),
+    path("average/batch", views.average_batch_view, name="average-batch"),
+    path("distribution", views.distribution_view, name="distribution"),
+    path("trends", views.trends_view, name="trends"),
     path("rate", views.rate_view, name="rate"),
+    path("rate/bulk", views.bulk_rate_view, name="rate-bulk"),
+    path("rate/status", views.rate_status_view, name="rate-status"),
+    path("rate/queue", views.rate_queue_view, name="rate-queue"),
+    path("export", views.export_view, name="export"),
+    path("cache/stats", views.cache_stats_view, name="cache-stats"),
+    path("metrics", views.metrics_view, name="metrics"),
 ]
\ No newline at end of file
@@ -0,0 +1,61 @@
+import uuid
+
+from django.utils import timezone
+
+from api.models import DataVersion
+
+# Versions
+# Description: Track a stamp per data scope that changes on every write to that scope.
+# Anything derived from a scope (cached responses, ETags) is keyed by its current stamp,
+# so a write makes every derived copy stale straight away.
+# Stamps are random rather than counters so they never repeat, even if the table is reset.
+
+# Modules, professors, module instances and who teaches them
+CATALOGUE = 'catalogue'
+# Ratings and anything computed from them
+RATINGS = 'ratings'
+
+
+def _new_stamp():
+    return uuid.uuid4().hex
+
+
+# Give a scope a new stamp
+def bump(scope):
+    now = timezone.now()
+    if not DataVersion.objects.filter(scope=scope).update(stamp=_new_stamp(), modified=now):
+        DataVersion.objects.get_or_create(scope=scope, defaults={'stamp': _new_stamp(), 'modified': now})
+
+
+# Get the current DataVersion rows of the given scopes, in the order given
+def current(*scopes):
+    rows = {row.scope: row for row in DataVersion.objects.filter(scope__in=scopes)}
+    for scope in scopes:
+        if scope not in rows:
+            rows[scope] = DataVersion.objects.get_or_create(scope=scope, defaults={'stamp': _new_stamp()})[0]
+    return tuple(rows[scope] for scope in scopes)
+
+
+# Async version of current()
+async def acurrent(*scopes):
+    rows = {row.scope: row async for row in DataVersion.objects.filter(scope__in=scopes)}
+    for scope in scopes:
+        if scope not in rows:
+            rows[scope] = (await DataVersion.objects.aget_or_create(scope=scope, defaults={'stamp': _new_stamp()}))[0]
+    return tuple(rows[scope] for scope in scopes)
+
+
+# Get the current DataVersion rows for a request, reading them at most once per request
+def for_request(request, *scopes):
+    loaded = request.__dict__.setdefault('_data_versions', {})
+    if scopes not in loaded:
+        loaded[scopes] = current(*scopes)
+    return loaded[scopes]
+
+
+# Async version of for_request()
+async def afor_request(request, *scopes):
+    loaded = request.__dict__.setdefault('_data_versions', {})
+    if scopes not in loaded:
+        loaded[scopes] = await acurrent(*scopes)
+    return loaded[scopes]
@@ -1,16 +1,27 @@
-from django.http import HttpResponse
+import json
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from api.models import ModuleInstance, Professor, Rating, ModuleInstanceProfessor, Module
-from django.db.models import Avg, Q
+from api import aggregates, bulk, cache, catalogue, export, hashing, pagination, timing, tokens, versions, writebehind
+from api.cache import cached_response
+from api.conditional import conditional_response
+from api.models import ModuleInstance, Professor, Rating, ModuleInstanceProfessor, Module, PendingRating, ProfessorModuleAggregate, ProfessorTermAggregate
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Q, Sum
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
-from django.http.response import JsonResponse
+from django.urls import reverse
+from api.timing import JsonResponse
 
 # Register
 # Description: Allow registration with username, email and password from POST request
 # Return 200 OK on success
 # Return 422 Unprocessable Entity with a text/plain reason on fields missing
+# Return 503 Service Unavailable with a text/plain reason and Retry-After if too many passwords are being hashed
 # Return 422 Unprocessable Entity with a text/plain reason otherwise
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -26,8 +37,12 @@ def register_view(request):
         if User.objects.filter(Q(email=email) | Q(username=username)).exists():
             return HttpResponse("A user with the provided credentials already exists", status=422, content_type="text/plain")
         
-        # Create user
-        user = User.objects.create_user(username, email, password)
+        # Create user, hashing the password in one of the limited hashing slots
+        try:
+            with hashing.slot():
+                user = User.objects.create_user(username, email, password)
+        except hashing.Busy:
+            return HttpResponse("Too many registrations and logins at once, try again shortly", status=503, content_type="text/plain", headers={"Retry-After": "1"})
         user.save()
         return HttpResponse("Success", status=200, content_type="text/plain")
     except Exception:
@@ -36,9 +51,11 @@ def register_view(request):
 
 # Login
 # Description: Take a username and password and authorise session
-# Return 200 OK on success
+# Params: token (optional) - if true, issue a signed token instead of starting a session, see api/tokens.py
+# Return 200 OK on success, with {token, expires_in} as JSON if a token was asked for
 # Return 404 Not Found with a text/plain reason if incorrect user/pass
 # Return 422 Unprocessable Entity with a text/plain reason on fields missing
+# Return 503 Service Unavailable with a text/plain reason and Retry-After if too many passwords are being hashed
 # Return 422 Unprocessable Entity with a text/plain reason otherwise
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -50,11 +67,20 @@ def login_view(request):
         if not username or not password:
             return HttpResponse("Missing required fields", status=422, content_type="text/plain")
         
-        # Try to authenticate
-        user = authenticate(username=username, password=password)
+        # Try to authenticate in one of the limited hashing slots
+        # A password hashed with an older hasher or cost is rehashed with the current one here
+        try:
+            with hashing.slot():
+                user = authenticate(username=username, password=password)
+        except hashing.Busy:
+            return HttpResponse("Too many registrations and logins at once, try again shortly", status=503, content_type="text/plain", headers={"Retry-After": "1"})
         if user is None:
             return HttpResponse('The username or password is incorrect', status=404, content_type="text/plain")
         
+        # Issue a token instead of a session if asked to
+        if request.POST.get('token', '').lower() in ('1', 'true', 'yes'):
+            return JsonResponse({"token": tokens.issue(user), "expires_in": tokens.max_age()}, status=200)
+
         # Log in if authenticated
         login(request, user)
         return HttpResponse('Success', status=200, content_type="text/plain")
@@ -81,74 +107,175 @@ def logout_view(request):
         # Fallback error response
         return HttpResponse("Something went wrong", status=422, content_type="text/plain")
 
+# Serialise a module instance (with its module and professors loaded) for the list endpoint
+def _list_row(instance):
+    taught_by = []
+    for professor in instance.professors.all():
+        taught_by.append({
+            "professor_name": professor.name,
+            "professor_code": professor.code
+        })
+    return {
+        "module_code": instance.module.code,
+        "module_name": instance.module.name,
+        "year": instance.year,
+        "semester": instance.semester,
+        "taught_by": taught_by
+    }
+
+# Get all module instances, joining modules and prefetching professors so the
+# query count stays constant no matter how many instances there are
+def _list_queryset():
+    return ModuleInstance.objects.select_related('module').prefetch_related(
+        Prefetch('professors', queryset=Professor.objects.only('name', 'code').order_by('id'))
+    ).order_by('id')
+
+# Filter module instances by the module_code, year, semester and professor_code query parameters
+# Raises ValueError if year or semester isn't a whole number
+def _filter_instances(request, instances):
+    if request.GET.get('module_code'):
+        instances = instances.filter(module__code=request.GET['module_code'])
+    if request.GET.get('year'):
+        instances = instances.filter(year=int(request.GET['year']))
+    if request.GET.get('semester'):
+        instances = instances.filter(semester=int(request.GET['semester']))
+    if request.GET.get('professor_code'):
+        instances = instances.filter(id__in=ModuleInstanceProfessor.objects.filter(
+            professor__code=request.GET['professor_code']
+        ).values('moduleInstance_id'))
+    return instances
+
+# Stream list rows as NDJSON, one JSON object per line
+def _stream_list_rows(first, rows):
+    yield json.dumps(_list_row(first)) + "\n"
+    for instance in rows:
+        yield json.dumps(_list_row(instance)) + "\n"
+
 # List
 # Description: View a list of all module instances and the professor(s) teaching each of them (option 1 on spec)
-# Return 200 OK with [{modcode, modname, year, semester, [{taughtbyname}]}] on success
+# Params: format (optional) - 'ndjson' to stream one JSON object per line as rows are read
+#         module_code, year, semester, professor_code (optional) - only list matching module instances
+#         limit, after (optional) - keyset pagination, see api/pagination.py
+# Return 200 OK with [{modcode, modname, year, semester, [{taughtbyname}]}] on success,
+#        with a Link header to the next page if there is one
+# Return 400 Bad Request with a text/plain reason if a filter or page parameter isn't a number
+# Return 304 Not Modified if the If-None-Match or If-Modified-Since validators are current
 # Return 404 Not Found with a text/plain reason on failure
 # Return 422 Unprocessable Entity with a text/plain reason otherwise
 @require_http_methods(["GET"])
+@conditional_response([versions.CATALOGUE])
+@cached_response("list", [versions.CATALOGUE])
 def list_view(request):
     try:
-        # Get all module instances
-        instances = ModuleInstance.objects.all()
-        if not instances.exists():
-            return HttpResponse("No module instances found", status=404, content_type="text/plain")
-        
+        instances = _list_queryset()
+
+        # Apply filters and pagination
+        try:
+            instances = _filter_instances(request, instances)
+            instances, next_url = pagination.paginate(request, instances)
+        except ValueError:
+            return HttpResponse("Filters and page parameters must be numbers where expected", status=400, content_type="text/plain")
+
+        if request.GET.get('format') == 'ndjson':
+            # Read the instances a chunk at a time (prefetching professors per chunk) and send
+            # each row as soon as it is built, so memory use doesn't grow with the catalogue
+            rows = instances.iterator(chunk_size=getattr(settings, 'API_LIST_CHUNK_SIZE', 500))
+            first = next(rows, None)
+            if first is None:
+                return HttpResponse("No module instances found", status=404, content_type="text/plain")
+            response = StreamingHttpResponse(_stream_list_rows(first, rows), status=200, content_type="application/x-ndjson")
+            return pagination.link(response, next_url)
+
         # Build response
-        data = []
-        for instance in instances:
-            taught_by = []
-            for professor in instance.professors.all():
-                taught_by.append({
-                    "professor_name": professor.name,
-                    "professor_code": professor.code
-                })
-            data.append({
-                "module_code": instance.module.code,
-                "module_name": instance.module.name,
-                "year": instance.year,
-                "semester": instance.semester,
-                "taught_by": taught_by
-            })
-        return JsonResponse(data, safe=False, status=200)
+        data = [_list_row(instance) for instance in instances]
+        if not data:
+            return HttpResponse("No module instances found", status=404, content_type="text/plain")
+        return pagination.link(JsonResponse(data, safe=False, status=200), next_url)
     except Exception:
         # Fallback error response
         return HttpResponse("Something went wrong", status=422, content_type="text/plain")
 
+# Filter professors by the professor_code query parameter, and by module_code, year and semester
+# of the module instances they taught
+# Raises ValueError if year or semester isn't a whole number
+def _filter_professors(request, professors):
+    if request.GET.get('professor_code'):
+        professors = professors.filter(code=request.GET['professor_code'])
+    taught = {}
+    if request.GET.get('module_code'):
+        taught['moduleInstance__module__code'] = request.GET['module_code']
+    if request.GET.get('year'):
+        taught['moduleInstance__year'] = int(request.GET['year'])
+    if request.GET.get('semester'):
+        taught['moduleInstance__semester'] = int(request.GET['semester'])
+    if taught:
+        professors = professors.filter(id__in=ModuleInstanceProfessor.objects.filter(**taught).values('professor_id'))
+    return professors
+
+# Serialise a professor (with its aggregate loaded) for the view endpoint
+def _view_row(professor):
+    aggregate = getattr(professor, 'aggregate', None)
+    return {
+        "professor_name": professor.name,
+        "professor_code": professor.code,
+        "average_rating": aggregates.average(aggregate.total, aggregate.count) if aggregate else None,
+    }
+
 # View
 # Description: View the rating of all professors (option 2 on spec)
-# Return 200 OK with {[profname, profcode, avgrating]} on success
+# Params: professor_code (optional) - only include the matching professor
+#         module_code, year, semester (optional) - only include professors who taught matching module instances
+#         limit, after (optional) - keyset pagination, see api/pagination.py
+# Return 200 OK with {[profname, profcode, avgrating]} on success, with a Link header to the next page if there is one
+# Return 400 Bad Request with a text/plain reason if a filter or page parameter isn't a number
+# Return 304 Not Modified if the If-None-Match or If-Modified-Since validators are current
 # Return 404 Not Found with text/plain if no professors found
 # Return 422 Unprocessable Entity with a text/plain reason otherwise
 @require_http_methods(["GET"])
+@conditional_response([versions.CATALOGUE, versions.RATINGS])
+@cached_response("view", [versions.CATALOGUE, versions.RATINGS])
 def view_view(request):
     try:
-        # Get average ratings for each professor
-        professors = Professor.objects.annotate(avg_rating=Avg('moduleinstanceprofessor__rating__rating'))
-        if not professors.exists():
-            return HttpResponse("No ratings found", status=404, content_type="text/plain")
+        # Get each professor alongside their materialised rating totals
+        professors = Professor.objects.select_related('aggregate').order_by('id')
+
+        # Apply filters and pagination
+        try:
+            professors = _filter_professors(request, professors)
+            professors, next_url = pagination.paginate(request, professors)
+        except ValueError:
+            return HttpResponse("Filters and page parameters must be numbers where expected", status=400, content_type="text/plain")
 
          # Build response
-        data = []
-        for professor in professors:
-            data.append({
-                "professor_name": professor.name,
-                "professor_code": professor.code,
-                "average_rating": round(professor.avg_rating) if professor.avg_rating else None,
-            })
-        return JsonResponse(data, safe=False, status=200)
+        data = [_view_row(professor) for professor in professors]
+        if not data:
+            return HttpResponse("No ratings found", status=404, content_type="text/plain")
+        return pagination.link(JsonResponse(data, safe=False, status=200), next_url)
     except Exception:
         # Fallback error response
         return HttpResponse("Something went wrong", status=422, content_type="text/plain")
 
+# Serialise the average rating of a professor in a module for the average endpoint
+def _average_row(professor, module, aggregate):
+    avg_rating = aggregates.average(aggregate.total, aggregate.count) if aggregate else None
+    return {"professor_name": professor.name, 
+            "professor_code": professor.code, 
+            "module_name": module.name,
+            "module_code": module.code,
+            "average_rating": avg_rating
+    }
+
 # Average
 # Description: View the average rating of a certain professor in a certain module (option 3 on spec)
 # Params: professorCode, moduleCode
 # Return 200 OK with {profname, profcode, modulename, modulecode, rating} on success
+# Return 304 Not Modified if the If-None-Match or If-Modified-Since validators are current
 # Return 404 Not Found with a text/plain reason on failure
 # Return 422 Unprocessable Entity with a text/plain reason on fields missing
 # Return 422 Unprocessable Entity with a text/plain reason otherwise
 @require_http_methods(["GET"])
+@conditional_response([versions.CATALOGUE, versions.RATINGS])
+@cached_response("average", [versions.CATALOGUE, versions.RATINGS])
 def average_view(request):
     try:
         # Unpack params
@@ -157,26 +284,173 @@ def average_view(request):
         if not professor_code or not module_code:
                 return HttpResponse("Missing required fields", status=422, content_type="text/plain")
         
-        # Make an aggregate query - group and average out matching professor/module pairs
-        avg_rating = Rating.objects.filter(
-            moduleInstanceProfessor__professor__code=professor_code,
-            moduleInstanceProfessor__moduleInstance__module__code=module_code
-        ).aggregate(avg_rating=Avg('rating'))['avg_rating']
+        # Look up professor and module details in the catalogue index, at the catalogue version the request was checked against
+        index = catalogue.index(versions.for_request(request, versions.CATALOGUE, versions.RATINGS)[0])
+        professor = index.professors.get(professor_code)
+        module = index.modules.get(module_code)
+        if professor is None or module is None:
+            return HttpResponse("Professor or module not found", status=404, content_type="text/plain")
+
+        # Look up the materialised rating totals for the professor/module pair
+        aggregate = ProfessorModuleAggregate.objects.filter(professor=professor, module=module).first()
+
+        # Build response
+        return JsonResponse(_average_row(professor, module, aggregate), status=200)
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
+
+# Distribution
+# Description: View how many ratings of each star value a professor has, overall or in a certain module,
+# with their mean, median and standard deviation
+# Params: professorCode, moduleCode (optional)
+# Return 200 OK with {profname, profcode, [modulename, modulecode,] counts: {1-5: count}, mean, median, stdev}
+#        on success, with null statistics if there are no ratings
+# Return 304 Not Modified if the If-None-Match or If-Modified-Since validators are current
+# Return 404 Not Found with a text/plain reason on failure
+# Return 422 Unprocessable Entity with a text/plain reason on fields missing
+# Return 422 Unprocessable Entity with a text/plain reason otherwise
+@require_http_methods(["GET"])
+@conditional_response([versions.CATALOGUE, versions.RATINGS])
+@cached_response("distribution", [versions.CATALOGUE, versions.RATINGS])
+def distribution_view(request):
+    try:
+        # Unpack params
+        professor_code = request.GET.get('professor_code')
+        module_code = request.GET.get('module_code')
+        if not professor_code:
+            return HttpResponse("Missing required fields", status=422, content_type="text/plain")
 
-        # Fetch professor and module details
+        # Fetch professor and module details with the star counts, which are all the statistics need
         try:
-            professor = Professor.objects.get(code=professor_code)
-            module = Module.objects.get(code=module_code)
+            professor = Professor.objects.select_related('aggregate').get(code=professor_code)
+            module = Module.objects.get(code=module_code) if module_code else None
         except (Professor.DoesNotExist, Module.DoesNotExist):
             return HttpResponse("Professor or module not found", status=404, content_type="text/plain")
+        if module is None:
+            aggregate = getattr(professor, 'aggregate', None)
+        else:
+            aggregate = ProfessorModuleAggregate.objects.filter(professor=professor, module=module).first()
 
         # Build response
-        data = {"professor_name": professor.name, 
-                "professor_code": professor.code, 
-                "module_name": module.name,
-                "module_code": module.code,
-                "average_rating": round(avg_rating) if avg_rating else None
-        }
+        data = {"professor_name": professor.name, "professor_code": professor.code}
+        if module is not None:
+            data.update(module_name=module.name, module_code=module.code)
+        data.update(aggregates.distribution(aggregate))
+        return JsonResponse(data, status=200)
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
+
+# Trends
+# Description: View how ratings change over time, as the mean and number of ratings in each (year, semester)
+# term, per professor across their modules or per professor in a certain module
+# Params: professorCode (optional), moduleCode (optional) - without either every professor is reported
+# Return 200 OK with [{profname, profcode, [modulename, modulecode,] terms: [{year, semester, mean, count}]}]
+#        on success, with terms in time order
+# Return 304 Not Modified if the If-None-Match or If-Modified-Since validators are current
+# Return 404 Not Found with a text/plain reason on failure
+# Return 422 Unprocessable Entity with a text/plain reason otherwise
+@require_http_methods(["GET"])
+@conditional_response([versions.CATALOGUE, versions.RATINGS])
+@cached_response("trends", [versions.CATALOGUE, versions.RATINGS])
+def trends_view(request):
+    try:
+        # Unpack params
+        professor_code = request.GET.get('professor_code')
+        module_code = request.GET.get('module_code')
+
+        # Narrow the materialised term totals to the professor and module asked for
+        terms = ProfessorTermAggregate.objects.filter(count__gt=0)
+        module = None
+        try:
+            if professor_code:
+                terms = terms.filter(professor=Professor.objects.get(code=professor_code))
+            if module_code:
+                module = Module.objects.get(code=module_code)
+                terms = terms.filter(module=module)
+        except (Professor.DoesNotExist, Module.DoesNotExist):
+            return HttpResponse("Professor or module not found", status=404, content_type="text/plain")
+
+        # Add up each professor's modules per term in the database, then fetch the professors in one query
+        rows = list(terms.values_list('professor_id', 'year', 'semester').annotate(
+            term_total=Sum('total'), term_count=Sum('count')
+        ).order_by('professor_id', 'year', 'semester'))
+        if not rows:
+            return HttpResponse("No ratings found", status=404, content_type="text/plain")
+        professors = Professor.objects.in_bulk({row[0] for row in rows})
+
+        # Build response
+        data = []
+        for professor_id, professor_rows in groupby(rows, key=itemgetter(0)):
+            professor = professors[professor_id]
+            row = {"professor_name": professor.name, "professor_code": professor.code}
+            if module is not None:
+                row.update(module_name=module.name, module_code=module.code)
+            row["terms"] = [
+                {"year": year, "semester": semester, "mean": round(total / count, 2), "count": count}
+                for _, year, semester, total, count in professor_rows
+            ]
+            data.append(row)
+        return JsonResponse(data, safe=False, status=200)
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
+
+# Validate the pairs given to the batched average endpoint
+# Each pair is a {professor_code, module_code} object or a [professor_code, module_code] array
+# Returns a list of (professor_code, module_code) tuples, raises ValueError if a pair is malformed
+def _average_pairs(rows):
+    pairs = []
+    for row in rows:
+        if isinstance(row, dict):
+            row = (row.get('professor_code'), row.get('module_code'))
+        if not isinstance(row, (list, tuple)) or len(row) != 2 or not all(isinstance(code, str) and code for code in row):
+            raise ValueError("Each pair needs a professor_code and a module_code")
+        pairs.append(tuple(row))
+    return pairs
+
+# Average batch
+# Description: View the average ratings of many professor/module pairs in one request
+# Body: JSON array, or NDJSON with Content-Type application/x-ndjson, of {professor_code, module_code}
+#       objects or [professor_code, module_code] arrays, at most API_AVERAGE_BATCH_MAX_PAIRS of them
+# Return 200 OK with {"professorcode/modulecode": {profname, profcode, modulename, modulecode, rating}}
+#        on success, with null for pairs whose professor or module doesn't exist
+# Return 400 Bad Request with a text/plain reason if the body can't be parsed or has too many pairs
+# Return 422 Unprocessable Entity with a text/plain reason otherwise
+@csrf_exempt
+@require_http_methods(["POST"])
+def average_batch_view(request):
+    try:
+        try:
+            pairs = _average_pairs(bulk.parse_body(request.body, request.content_type))
+        except ValueError as e:
+            return HttpResponse(f"Request body could not be parsed: {e}", status=400, content_type="text/plain")
+        max_pairs = getattr(settings, 'API_AVERAGE_BATCH_MAX_PAIRS', 5000)
+        if len(pairs) > max_pairs:
+            return HttpResponse(f"At most {max_pairs} pairs can be requested at once", status=400, content_type="text/plain")
+
+        # Fetch every professor and module with one query per model
+        professors = Professor.objects.in_bulk({professor_code for professor_code, _ in pairs}, field_name='code')
+        modules = Module.objects.in_bulk({module_code for _, module_code in pairs}, field_name='code')
+
+        # Read the materialised rating totals of every pair in one query. Filtering on both id sets
+        # can also match pairs that weren't asked for, which are ignored
+        aggregates_by_pair = {
+            (aggregate.professor_id, aggregate.module_id): aggregate
+            for aggregate in ProfessorModuleAggregate.objects.filter(
+                professor_id__in=[p.id for p in professors.values()], module_id__in=[m.id for m in modules.values()]
+            )
+        } if professors and modules else {}
+
+        # Build response
+        data = {}
+        for professor_code, module_code in pairs:
+            professor, module = professors.get(professor_code), modules.get(module_code)
+            if professor is None or module is None:
+                data[f"{professor_code}/{module_code}"] = None
+            else:
+                data[f"{professor_code}/{module_code}"] = _average_row(professor, module, aggregates_by_pair.get((professor.id, module.id)))
         return JsonResponse(data, status=200)
     except Exception:
         # Fallback error response
@@ -185,17 +459,25 @@ def average_view(request):
 # Rate
 # Description: Rate the teaching of a certain professor in a certain module instance (option 4 on spec)
 # Params: professorCode, moduleCode, year, semester, rating
+# Auth: a logged-in session, or an Authorization: Token header with a token from /api/login
 # Return 201 Created on success
+# Return 202 Accepted with {id, status} if the rating was queued in write-behind mode, see /api/rate/status
 # Return 404 Not Found with a text/plain reason on failure
-# Return 403 Unauthorised with a text/plain reason on authentication failure
-# Return 400 Bad Request if rating isn't numerical
+# Return 403 Unauthorised with a text/plain reason on authentication failure, or if the token is invalid or has expired
+# Return 401 Unauthorized with a text/plain reason if the token's user has been deleted or deactivated
+# Return 400 Bad Request if rating isn't numerical or isn't between 1 and 5
 # Return 422 Unprocessable Entity with a text/plain reason on fields missing
 # Return 422 Unprocessable Entity with a text/plain reason otherwise
 @csrf_exempt
 @require_http_methods(["POST"])
 def rate_view(request):
     try:
-        if (not request.user.is_authenticated):
+        # A token is checked without loading the session or the user
+        try:
+            user_id = tokens.user_id(request)
+        except tokens.InactiveUser:
+            return HttpResponse('Token user no longer exists or is inactive', status=401, content_type="text/plain", headers={"WWW-Authenticate": "Token"})
+        if user_id is None:
             return HttpResponse('User is not authenticated', status=403, content_type="text/plain")
         
         # Unpack parameters
@@ -210,33 +492,204 @@ def rate_view(request):
         try:
             # Only validate rating for rounding - others will just cause a moduleInstance not to be found
             rating = round(float(rating))
-        except TypeError:
+        except (TypeError, ValueError, OverflowError):
             return HttpResponse('Provided rating is not a number', status=400, content_type="text/plain")
+        if rating < 1 or rating > 5:
+            return HttpResponse('Rating must be between 1 and 5', status=400, content_type="text/plain")
         
-        # Search for module instance using parameters
-        moduleInstanceProfessor = ModuleInstanceProfessor.objects.filter(
-            moduleInstance__module__code=moduleCode,
-            moduleInstance__year=year,
-            moduleInstance__semester=semester,
-            professor__code=professorCode
-        ).first()
-        
-        if (moduleInstanceProfessor is None):
+        # Search for module instance using parameters, in the catalogue index
+        try:
+            mip_id = catalogue.index().instance_professor(moduleCode, year, semester, professorCode)
+            if mip_id is None:
+                # The index can trail another process's catalogue changes by API_CATALOGUE_CHECK_INTERVAL,
+                # so on a miss check the catalogue version and look again in the index for it
+                mip_id = catalogue.index(versions.current(versions.CATALOGUE)[0]).instance_professor(moduleCode, year, semester, professorCode)
+        except ValueError:
+            mip_id = None
+        if (mip_id is None):
             return HttpResponse('Module instance not found', status=404, content_type="text/plain")
         
-        # Search for existing ratings for the found module instance
-        existingRating = Rating.objects.filter(
-            user=request.user.id,
-            moduleInstanceProfessor=moduleInstanceProfessor.id,
-        ).first()
-        
-        if (existingRating is not None):
+        # In write-behind mode queue the rating to be added in a batch, see api/writebehind.py
+        if writebehind.enabled():
+            if Rating.objects.filter(user_id=user_id, moduleInstanceProfessor_id=mip_id).exists() or writebehind.is_pending(user_id, mip_id):
+                return HttpResponse('User has already rated this Module Instance', status=422, content_type="text/plain")
+            pending = writebehind.enqueue(user_id, mip_id, rating)
+            return JsonResponse({"id": pending.id, "status": pending.status}, status=202, headers={
+                "Location": f"{reverse('rate-status')}?id={pending.id}",
+            })
+
+        # Create rating, updating the aggregates in the same transaction
+        # The unique constraint on (user, moduleInstanceProfessor) rejects repeat ratings
+        try:
+            with transaction.atomic():
+                Rating.objects.create(user_id=user_id, moduleInstanceProfessor_id=mip_id, rating=rating)
+        except IntegrityError:
+            # The index can trail another process's catalogue changes by API_CATALOGUE_CHECK_INTERVAL
+            if not ModuleInstanceProfessor.objects.filter(id=mip_id).exists():
+                catalogue.reset()
+                return HttpResponse('Module instance not found', status=404, content_type="text/plain")
             return HttpResponse('User has already rated this Module Instance', status=422, content_type="text/plain")
-        
-        # Create rating
-        rating = Rating(user=request.user, moduleInstanceProfessor=moduleInstanceProfessor, rating=request.POST['rating'])
-        rating.save()
         return HttpResponse('Added rating', status=200, content_type="text/plain")
     except Exception:
         # Fallback error response
-        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
\ No newline at end of file
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
+
+# Rate status
+# Description: Report what became of a rating queued by /api/rate in write-behind mode
+# Params: id - the id /api/rate returned
+# Return 200 OK with {id, status, reason, rating_id} on success, status being pending, added or rejected
+# Return 403 Unauthorised with a text/plain reason on authentication failure, or if the token is invalid or has expired
+# Return 401 Unauthorized with a text/plain reason if the token's user has been deleted or deactivated
+# Return 404 Not Found with a text/plain reason if the user has no queued rating with that id
+# Return 422 Unprocessable Entity with a text/plain reason otherwise
+@require_http_methods(["GET"])
+def rate_status_view(request):
+    try:
+        try:
+            user_id = tokens.user_id(request)
+        except tokens.InactiveUser:
+            return HttpResponse('Token user no longer exists or is inactive', status=401, content_type="text/plain", headers={"WWW-Authenticate": "Token"})
+        if user_id is None:
+            return HttpResponse('User is not authenticated', status=403, content_type="text/plain")
+
+        pending = PendingRating.objects.filter(id=request.GET.get('id'), user_id=user_id).first()
+        if pending is None:
+            return HttpResponse('Queued rating not found', status=404, content_type="text/plain")
+        return JsonResponse({"id": pending.id, "status": pending.status, "reason": pending.reason, "rating_id": pending.added_id}, status=200)
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
+
+# Rate queue
+# Description: Report how many ratings are waiting in the write-behind queue and how long the oldest has waited
+# Return 200 OK with {pending, oldest_age_s, max_staleness_s} on success
+@require_http_methods(["GET"])
+def rate_queue_view(request):
+    return JsonResponse(writebehind.backlog(), status=200)
+
+# Bulk rate
+# Description: Rate many module instances in one request, e.g. when importing survey exports
+# Body: JSON array, or NDJSON with Content-Type application/x-ndjson, of
+#       {professor_code, module_code, year, semester, rating} objects, at most API_BULK_RATE_MAX_ROWS of them
+# Auth: a logged-in session, or an Authorization: Token header with a token from /api/login
+# Params: chunk_size (optional) - number of ratings per INSERT, defaults to API_BULK_RATE_CHUNK_SIZE
+# Return 200 OK with {created, results: [{index, status, reason}]} on success, where status is one of
+#        created, invalid, not_found, duplicate (repeated in this request) or already_rated
+# Return 403 Unauthorised with a text/plain reason on authentication failure, or if the token is invalid or has expired
+# Return 401 Unauthorized with a text/plain reason if the token's user has been deleted or deactivated
+# Return 400 Bad Request with a text/plain reason if the body can't be parsed or has too many rows
+# Return 409 Conflict with a text/plain reason if another request added one of the ratings meanwhile
+# Return 422 Unprocessable Entity with a text/plain reason otherwise
+@csrf_exempt
+@require_http_methods(["POST"])
+def bulk_rate_view(request):
+    try:
+        try:
+            user_id = tokens.user_id(request)
+        except tokens.InactiveUser:
+            return HttpResponse('Token user no longer exists or is inactive', status=401, content_type="text/plain", headers={"WWW-Authenticate": "Token"})
+        if user_id is None:
+            return HttpResponse('User is not authenticated', status=403, content_type="text/plain")
+
+        try:
+            rows = bulk.parse_body(request.body, request.content_type)
+            chunk_size = int(request.GET.get('chunk_size', getattr(settings, 'API_BULK_RATE_CHUNK_SIZE', 500)))
+            if chunk_size < 1:
+                raise ValueError
+        except ValueError:
+            return HttpResponse('Request body or chunk size could not be parsed', status=400, content_type="text/plain")
+        max_rows = getattr(settings, 'API_BULK_RATE_MAX_ROWS', 20_000)
+        if len(rows) > max_rows:
+            return HttpResponse(f"At most {max_rows} ratings can be added at once", status=400, content_type="text/plain")
+
+        # Validate every row before touching the database
+        results = []
+        valid = []
+        for index, row in enumerate(rows):
+            try:
+                key, rating = bulk.validate_row(row)
+            except ValueError as e:
+                results.append({"index": index, "status": "invalid", "reason": str(e)})
+                continue
+            results.append({"index": index, "status": "created"})
+            valid.append((index, key, rating))
+
+        # Resolve targets and existing ratings as sets
+        targets = bulk.resolve_targets(key for _, key, _ in valid)
+        rated = bulk.already_rated(user_id, targets.values())
+
+        to_create = []
+        seen = set()
+        for index, key, rating in valid:
+            mip_id = targets.get(key)
+            if mip_id is None:
+                results[index].update(status="not_found", reason="Module instance not found")
+            elif mip_id in rated:
+                results[index].update(status="already_rated", reason="User has already rated this Module Instance")
+            elif mip_id in seen:
+                results[index].update(status="duplicate", reason="Module Instance is rated more than once in this request")
+            else:
+                seen.add(mip_id)
+                to_create.append(Rating(user_id=user_id, moduleInstanceProfessor_id=mip_id, rating=rating))
+
+        # Insert in chunks within one transaction, bulk_create skips signals so update aggregates here
+        try:
+            with transaction.atomic():
+                Rating.objects.bulk_create(to_create, batch_size=chunk_size)
+                if to_create:
+                    aggregates.record((r.moduleInstanceProfessor_id, r.rating) for r in to_create)
+                    versions.bump(versions.RATINGS)
+        except IntegrityError:
+            return HttpResponse('Ratings were added concurrently, please retry', status=409, content_type="text/plain")
+
+        return JsonResponse({"created": len(to_create), "results": results}, status=200)
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
+
+# Cache stats
+# Description: Report the response cache hit and miss counts of this server process
+# Return 200 OK with {hits, misses} on success
+@require_http_methods(["GET"])
+def cache_stats_view(request):
+    return JsonResponse(cache.stats(), status=200)
+
+# Metrics
+# Description: Report request counts, latency histograms and database time per endpoint, and the
+# response cache counters, for this server process in the Prometheus text format
+# Return 200 OK with the metrics on success
+@require_http_methods(["GET"])
+def metrics_view(request):
+    return HttpResponse(timing.metrics.render(), status=200, content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Export
+# Description: Download the ratings, joined with their professors, modules and module instances, for analysis
+# Params: format (optional) - parquet, arrow or csv, defaults to parquet if pyarrow is installed and csv otherwise
+#         since (optional) - only export ratings with ids above this one
+# Return 200 OK with the export streamed as an attachment on success
+# Return 400 Bad Request with a text/plain reason if the parameters are invalid
+# Return 403 Unauthorised with a text/plain reason if the user isn't staff
+# Return 422 Unprocessable Entity with a text/plain reason otherwise
+@require_http_methods(["GET"])
+def export_view(request):
+    try:
+        if not request.user.is_staff:
+            return HttpResponse('Only staff can export ratings', status=403, content_type="text/plain")
+
+        try:
+            since = int(request.GET['since']) if request.GET.get('since') else None
+        except ValueError:
+            return HttpResponse("Since must be a rating id", status=400, content_type="text/plain")
+
+        format = request.GET.get('format') or export.default_format()
+        try:
+            parts = export.stream(format, since, getattr(settings, 'API_EXPORT_CHUNK_SIZE', 10_000))
+        except ValueError as e:
+            return HttpResponse(str(e), status=400, content_type="text/plain")
+
+        response = StreamingHttpResponse(parts, status=200, content_type=export.CONTENT_TYPES[format])
+        response.headers["Content-Disposition"] = f'attachment; filename="ratings.{format}"'
+        return response
+    except Exception:
+        # Fallback error response
+        return HttpResponse("Something went wrong", status=422, content_type="text/plain")
@@ -0,0 +1,160 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from api import aggregates, versions
+from api.models import PendingRating, Rating
+
+# Write-behind
+# Description: Optional queue for /api/rate (API_RATE_WRITE_BEHIND). The view validates a rating and
+# inserts it into the PendingRating staging table, a single narrow INSERT, then returns. A drainer adds
+# the pending ratings to the Rating table in batches of up to API_RATE_QUEUE_BATCH_SIZE, each in one
+# transaction that also updates the aggregates and the ratings data version once, instead of once per
+# rating. Pending ratings are in the database, so they survive a restart and are added by the next drain.
+# The drainer runs as a thread in each server process (API_RATE_QUEUE_WORKER), started with the first
+# request the process handles, or on its own with 'manage.py drain_ratings'. Either way it drains at least every API_RATE_QUEUE_MAX_STALENESS seconds,
+# which bounds how far the aggregates lag behind accepted ratings, and sooner once a batch is full.
+
+logger = logging.getLogger('api.writebehind')
+
+
+def enabled():
+    return getattr(settings, 'API_RATE_WRITE_BEHIND', False)
+
+
+def batch_size():
+    return getattr(settings, 'API_RATE_QUEUE_BATCH_SIZE', 500)
+
+
+def max_staleness():
+    return getattr(settings, 'API_RATE_QUEUE_MAX_STALENESS', 2.0)
+
+
+# Queue a validated rating
+# Returns the PendingRating
+def enqueue(user_id, mip_id, rating):
+    pending = PendingRating.objects.create(user_id=user_id, moduleInstanceProfessor_id=mip_id, rating=rating)
+    if getattr(settings, 'API_RATE_QUEUE_WORKER', True):
+        worker().queued()
+    return pending
+
+
+# Whether a user has a pending rating for a module instance professor
+def is_pending(user_id, mip_id):
+    return PendingRating.objects.filter(user_id=user_id, moduleInstanceProfessor_id=mip_id, status=PendingRating.PENDING).exists()
+
+
+# Add the oldest batch of pending ratings in one transaction
+# Ratings that can't be added (already rated, or queued twice) are marked rejected with a reason
+# Returns (added, rejected) counts
+def drain_batch(size=None):
+    with transaction.atomic():
+        # Other drainers skip the locked rows (SQLite doesn't need this, its writers already take turns)
+        batch = list(PendingRating.objects.select_for_update(skip_locked=True).filter(
+            status=PendingRating.PENDING
+        ).order_by('id')[:size or batch_size()])
+        if not batch:
+            return 0, 0
+
+        rated = set(Rating.objects.filter(
+            user_id__in={pending.user_id for pending in batch},
+            moduleInstanceProfessor_id__in={pending.moduleInstanceProfessor_id for pending in batch},
+        ).values_list('user_id', 'moduleInstanceProfessor_id'))
+
+        to_add = []
+        for pending in batch:
+            key = (pending.user_id, pending.moduleInstanceProfessor_id)
+            if key in rated:
+                pending.status, pending.reason = PendingRating.REJECTED, 'User has already rated this Module Instance'
+            else:
+                rated.add(key)
+                pending.status = PendingRating.ADDED
+                pending.added = Rating(user_id=pending.user_id, moduleInstanceProfessor_id=pending.moduleInstanceProfessor_id, rating=pending.rating)
+                to_add.append(pending)
+
+        # bulk_create skips signals, so update the aggregates and version here
+        Rating.objects.bulk_create([pending.added for pending in to_add])
+        if to_add:
+            aggregates.record((pending.moduleInstanceProfessor_id, pending.rating) for pending in to_add)
+            versions.bump(versions.RATINGS)
+
+        now = timezone.now()
+        for pending in batch:
+            pending.processed = now
+        PendingRating.objects.bulk_update(batch, ['status', 'reason', 'added', 'processed'])
+        return len(to_add), len(batch) - len(to_add)
+
+
+# Drain batches until no ratings are pending
+# Returns (added, rejected) counts
+def drain():
+    added = rejected = 0
+    while True:
+        batch_added, batch_rejected = drain_batch()
+        if not batch_added and not batch_rejected:
+            return added, rejected
+        added += batch_added
+        rejected += batch_rejected
+
+
+# Number of pending ratings and the age in seconds of the oldest
+def backlog():
+    oldest = PendingRating.objects.filter(status=PendingRating.PENDING).order_by('id').values_list('queued', flat=True).first()
+    return {
+        "pending": PendingRating.objects.filter(status=PendingRating.PENDING).count(),
+        "oldest_age_s": round((timezone.now() - oldest).total_seconds(), 3) if oldest else None,
+        "max_staleness_s": max_staleness(),
+    }
+
+
+# Drainer thread, started with the first request or queued rating in a process
+class Worker:
+    def __init__(self):
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.count = 0
+        self.thread = threading.Thread(target=self.run, name='rating-drainer', daemon=True)
+        self.thread.start()
+
+    # Called for each queued rating, drains early once a batch is full
+    def queued(self):
+        with self.lock:
+            self.count += 1
+            if self.count >= batch_size():
+                self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(max_staleness())
+            self.wake.clear()
+            with self.lock:
+                self.count = 0
+            try:
+                close_old_connections()
+                drain()
+            except Exception:
+                logger.exception("Draining the rating queue failed, retrying on the next drain")
+
+
+_worker = None
+_lock = threading.Lock()
+
+
+def worker():
+    global _worker
+    with _lock:
+        if _worker is None:
+            _worker = Worker()
+        return _worker
+
+
+# request_started receiver, connected in ApiConfig.ready. Starts the drainer when a server process
+# handles its first request, so ratings left queued by a previous process are added straight away
+# rather than with the next queued rating. Management commands, including drain_ratings, handle no
+# requests and so don't start one.
+def start_worker(sender, **kwargs):
+    if _worker is None and enabled() and getattr(settings, 'API_RATE_QUEUE_WORKER', True):
+        worker()
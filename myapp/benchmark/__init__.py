@@ -0,0 +1,11 @@
+# Benchmark
+# Description: Synthetic data generation (datagen) and load testing (runner) for the API.
+# See __main__.py for the command line.
+
+# Named sizes for convenience, any count can also be given directly
+SIZES = {
+    "tiny": {"professors": 20, "modules": 10, "instances": 40, "users": 50, "ratings": 500},
+    "small": {"professors": 500, "modules": 200, "instances": 2_000, "users": 2_000, "ratings": 50_000},
+    "medium": {"professors": 2_000, "modules": 1_000, "instances": 10_000, "users": 20_000, "ratings": 1_000_000},
+    "large": {"professors": 10_000, "modules": 5_000, "instances": 50_000, "users": 100_000, "ratings": 5_000_000},
+}
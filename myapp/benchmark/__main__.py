@@ -0,0 +1,156 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+from benchmark import SIZES
+
+# Benchmark
+# Description: Command line entry point for the benchmark suite, run from the myapp directory
+# Usage: python -m benchmark generate --size large
+#        python -m benchmark run --url http://127.0.0.1:8000/api/ --concurrency 16 --output results.json
+#        python -m benchmark sqlite-stress --readers 4 --writers 2 --duration 10
+#        python -m benchmark hashers --duration 5
+
+
+def setup_django():
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rateprofs.settings')
+    django.setup()
+
+
+def generate(args):
+    setup_django()
+    from benchmark import datagen
+    sizes = dict(SIZES[args.size])
+    for table in sizes:
+        if getattr(args, table) is not None:
+            sizes[table] = getattr(args, table)
+    with datagen.fast_load():
+        datagen.generate(**sizes, seed=args.seed, batch_size=args.batch_size, out=print)
+
+
+def run(args):
+    from benchmark import runner
+    scenarios = args.scenarios.split(",") if args.scenarios else runner.DEFAULT_SCENARIOS
+    staff = (args.staff_username, args.staff_password) if args.staff_username else None
+    results = {
+        "meta": {
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "requests_per_scenario": args.requests,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "scenarios": runner.Runner(args.url, args.concurrency, args.requests, args.seed, staff).run(scenarios),
+    }
+    if args.queries:
+        setup_django()
+        for scenario, count in runner.count_queries(scenarios).items():
+            results["scenarios"][scenario]["queries_per_request"] = count
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def sqlite_stress(args):
+    setup_django()
+    from django.conf import settings
+    from benchmark import sqlite_stress
+    if not args.database and settings.DATABASES["default"]["ENGINE"] != "django.db.backends.sqlite3":
+        sys.exit("sqlite-stress needs a SQLite database, give one with --database")
+    source = args.database or str(settings.DATABASES["default"]["NAME"])
+    results = {
+        "meta": {
+            "database": source,
+            "readers": args.readers,
+            "writers": args.writers,
+            "duration_s": args.duration,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "configs": sqlite_stress.compare(source, args.readers, args.writers, args.duration, seed=args.seed),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def hashers(args):
+    setup_django()
+    from benchmark import hashers
+    results = {
+        "meta": {
+            "duration_s": args.duration,
+            "threads": args.threads,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "hashers": hashers.compare(args.duration, args.threads),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="RateProfs benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = commands.add_parser("generate", help="Load a synthetic dataset into an empty database")
+    generate_parser.add_argument("--size", choices=SIZES, default="small", help="Named dataset size (default: small)")
+    for table in SIZES["small"]:
+        generate_parser.add_argument(f"--{table}", type=int, help=f"Number of {table}, overriding --size")
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--batch-size", type=int, default=5_000)
+    generate_parser.set_defaults(func=generate)
+
+    run_parser = commands.add_parser("run", help="Load test a running server and print JSON results")
+    run_parser.add_argument("--url", default="http://127.0.0.1:8000/api/", help="API base URL")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    run_parser.add_argument("--scenarios", help="Comma separated scenarios (default: all)")
+    run_parser.add_argument("--queries", action="store_true", help="Also count SQL queries per request in process, against DJANGO_SETTINGS_MODULE's database")
+    run_parser.add_argument("--staff-username", help="Staff user to log in as for the export scenario, which is skipped without one")
+    run_parser.add_argument("--staff-password", default="password")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--output", help="Write results to this file instead of stdout")
+    run_parser.set_defaults(func=run)
+
+    stress_parser = commands.add_parser("sqlite-stress", help="Compare SQLite read latency under concurrent rating writes, default vs tuned settings")
+    stress_parser.add_argument("--database", help="SQLite database to copy (default: DJANGO_SETTINGS_MODULE's database)")
+    stress_parser.add_argument("--readers", type=int, default=4)
+    stress_parser.add_argument("--writers", type=int, default=2)
+    stress_parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run each configuration for")
+    stress_parser.add_argument("--seed", type=int, default=0)
+    stress_parser.add_argument("--output", help="Write results to this file instead of stdout")
+    stress_parser.set_defaults(func=sqlite_stress)
+
+    hashers_parser = commands.add_parser("hashers", help="Measure password checks (logins) per second for each configured password hasher")
+    hashers_parser.add_argument("--duration", type=float, default=2.0, help="Seconds to measure each hasher for")
+    hashers_parser.add_argument("--threads", type=int, default=1, help="Threads checking passwords at once (default: 1, i.e. per core)")
+    hashers_parser.add_argument("--output", help="Write results to this file instead of stdout")
+    hashers_parser.set_defaults(func=hashers)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
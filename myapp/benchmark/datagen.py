@@ -0,0 +1,265 @@
+import csv
+import json
+import math
+import random
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from api import aggregates, catalogue, versions
+from api.models import Module, ModuleInstance, ModuleInstanceProfessor, Professor, Rating
+
+# Datagen
+# Description: Generate a synthetic catalogue and rating dataset of a given size with bulk inserts,
+# for finding scaling problems. Output is deterministic for a given seed.
+# Codes and usernames follow fixed patterns, so load into an empty database.
+
+# Password shared by every generated user, hashed once up front
+PASSWORD = "password"
+
+
+class Progress:
+    # Report rows per second for each table as it is loaded
+    def __init__(self, out=None):
+        self.out = out
+        self.counts = {}
+
+    def table(self, name, rows, started):
+        elapsed = time.perf_counter() - started
+        self.counts[name] = rows
+        if self.out is not None:
+            rate = rows / elapsed if elapsed else float("inf")
+            self.out(f"{name}: {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+    # Report the rows per second across every table since the load started
+    def total(self, started):
+        elapsed = time.perf_counter() - started
+        rows = sum(self.counts.values())
+        if self.out is not None:
+            rate = rows / elapsed if elapsed else float("inf")
+            self.out(f"total: {rows} rows in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+
+
+# Relax SQLite durability while bulk loading, restoring the previous settings afterwards
+# Must be entered outside of a transaction. Does nothing on other databases.
+# journal_mode: journal used during the load, MEMORY keeps it off disk
+# synchronous: OFF hands writes to the OS without waiting for them to reach the disk
+@contextmanager
+def fast_load(journal_mode="MEMORY", synchronous="OFF"):
+    if connection.vendor != "sqlite":
+        yield
+        return
+    with connection.cursor() as cursor:
+        previous_journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+        previous_synchronous = cursor.execute("PRAGMA synchronous").fetchone()[0]
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode={previous_journal_mode}")
+            cursor.execute(f"PRAGMA synchronous={previous_synchronous}")
+
+
+# Insert objects produced by a generator in batches, without holding them all in memory
+# Returns the number of rows inserted
+def _insert(model, objects, batch_size):
+    count = 0
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == batch_size:
+            model.objects.bulk_create(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        count += len(batch)
+    return count
+
+
+# Generate a dataset
+# professors, modules, instances, users, ratings: number of rows to create
+# Each module instance is taught by one to three professors. Users rate distinct module instance
+# professors, so the number of ratings is capped at users x module instance professors.
+# Returns {table name: rows created}
+def generate(professors, modules, instances, users, ratings, seed=0, batch_size=5_000, password_hash=None, out=None):
+    rng = random.Random(seed)
+    progress = Progress(out)
+    password_hash = password_hash or make_password(PASSWORD)
+    load_started = time.perf_counter()
+
+    with transaction.atomic():
+        started = time.perf_counter()
+        professor_ids = [p.id for p in Professor.objects.bulk_create(
+            (Professor(name=f"Professor {i}", code=f"P{i:06d}") for i in range(professors)), batch_size=batch_size
+        )]
+        progress.table("professors", len(professor_ids), started)
+
+        started = time.perf_counter()
+        module_ids = [m.id for m in Module.objects.bulk_create(
+            (Module(name=f"Module {i}", code=f"M{i:05d}") for i in range(modules)), batch_size=batch_size
+        )]
+        progress.table("modules", len(module_ids), started)
+
+        started = time.perf_counter()
+        instance_ids = [i.id for i in ModuleInstance.objects.bulk_create(
+            (ModuleInstance(module_id=rng.choice(module_ids), year=rng.randint(2015, 2024), semester=rng.randint(1, 2)) for _ in range(instances)),
+            batch_size=batch_size,
+        )]
+        progress.table("module instances", len(instance_ids), started)
+
+        started = time.perf_counter()
+        mip_ids = [mip.id for mip in ModuleInstanceProfessor.objects.bulk_create(
+            (
+                ModuleInstanceProfessor(moduleInstance_id=instance_id, professor_id=professor_id)
+                for instance_id in instance_ids
+                for professor_id in rng.sample(professor_ids, min(rng.randint(1, 3), len(professor_ids)))
+            ),
+            batch_size=batch_size,
+        )]
+        progress.table("module instance professors", len(mip_ids), started)
+
+        started = time.perf_counter()
+        user_ids = [u.id for u in User.objects.bulk_create(
+            (User(username=f"user{i:07d}", email=f"user{i}@example.com", password=password_hash) for i in range(users)),
+            batch_size=batch_size,
+        )]
+        progress.table("users", len(user_ids), started)
+
+        started = time.perf_counter()
+        per_user = min(math.ceil(ratings / len(user_ids)), len(mip_ids)) if user_ids and mip_ids else 0
+
+        def rating_rows():
+            remaining = ratings
+            for user_id in user_ids:
+                if remaining <= 0:
+                    return
+                for mip_id in rng.sample(mip_ids, min(per_user, remaining)):
+                    yield Rating(user_id=user_id, moduleInstanceProfessor_id=mip_id, rating=rng.randint(1, 5))
+                remaining -= per_user
+
+        count = _insert(Rating, rating_rows(), batch_size)
+        progress.table("ratings", count, started)
+
+        # Bulk inserts skip signals, so bring the derived tables up to date in one pass
+        started = time.perf_counter()
+        aggregates.rebuild()
+        versions.bump(versions.CATALOGUE)
+        versions.bump(versions.RATINGS)
+        catalogue.reset()
+        if out is not None:
+            out(f"aggregates rebuilt in {time.perf_counter() - started:.2f}s")
+
+    progress.total(load_started)
+    return progress.counts
+
+
+# Columns of rows accepted by load(), one row per rating or, with the rating columns left empty,
+# per professor teaching a module instance
+ROW_FIELDS = ("professor_code", "professor_name", "module_code", "module_name", "year", "semester", "username", "rating")
+
+
+# Read rows for load() from a CSV file with a ROW_FIELDS header, or a JSON file holding a list of objects
+def read_rows(path):
+    with open(path, newline="") as f:
+        if path.lower().endswith(".json"):
+            return json.load(f)
+        return list(csv.DictReader(f))
+
+
+# Bulk load a dataset described by denormalised rows (see ROW_FIELDS)
+# Professors, modules, module instances, who teaches them and users are derived from the rows.
+# Every user gets the same, already hashed, password.
+# Returns {table name: rows created}
+# Raises ValueError naming the row, without loading anything, if a row is missing a code, its year,
+# semester or rating isn't a number, its rating isn't between 1 and 5, or its user rated the same
+# module instance professor in an earlier row
+def load(rows, batch_size=5_000, password_hash=None, out=None):
+    progress = Progress(out)
+    password_hash = password_hash or make_password(PASSWORD)
+    load_started = time.perf_counter()
+
+    # Collect each distinct entity, keeping the first name given for a code
+    professors, modules, instances, teaching, usernames, ratings = {}, {}, {}, {}, {}, []
+    rated = {}
+    for index, row in enumerate(rows):
+        professor_code, module_code = row.get("professor_code"), row.get("module_code")
+        if not professor_code or not module_code:
+            raise ValueError(f"Row {index}: professor_code and module_code are required")
+        try:
+            instance = (module_code, int(row["year"]), int(row["semester"]))
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Row {index}: year and semester must be whole numbers, not {row.get('year')!r} and {row.get('semester')!r}")
+        professors.setdefault(professor_code, row.get("professor_name") or professor_code)
+        modules.setdefault(module_code, row.get("module_name") or module_code)
+        instances.setdefault(instance, None)
+        teaching.setdefault((instance, professor_code), None)
+        if row.get("username"):
+            usernames.setdefault(row["username"], None)
+            if row.get("rating") not in (None, ""):
+                try:
+                    rating = round(float(row["rating"]))
+                except (TypeError, ValueError, OverflowError):
+                    raise ValueError(f"Row {index}: rating must be a number, not {row['rating']!r}")
+                if rating < 1 or rating > 5:
+                    raise ValueError(f"Row {index}: rating must be between 1 and 5, not {row['rating']}")
+                # Each user can only rate a module instance professor once
+                key = (row["username"], instance, professor_code)
+                if key in rated:
+                    raise ValueError(f"Row {index}: {row['username']} already rated this module instance professor in row {rated[key]}")
+                rated[key] = index
+                ratings.append((row["username"], (instance, professor_code), rating))
+
+    with transaction.atomic():
+        started = time.perf_counter()
+        professor_ids = {p.code: p.id for p in Professor.objects.bulk_create(
+            (Professor(code=code, name=name) for code, name in professors.items()), batch_size=batch_size
+        )}
+        progress.table("professors", len(professor_ids), started)
+
+        started = time.perf_counter()
+        module_ids = {m.code: m.id for m in Module.objects.bulk_create(
+            (Module(code=code, name=name) for code, name in modules.items()), batch_size=batch_size
+        )}
+        progress.table("modules", len(module_ids), started)
+
+        started = time.perf_counter()
+        instance_ids = dict(zip(instances, (i.id for i in ModuleInstance.objects.bulk_create(
+            (ModuleInstance(module_id=module_ids[code], year=year, semester=semester) for code, year, semester in instances),
+            batch_size=batch_size,
+        ))))
+        progress.table("module instances", len(instance_ids), started)
+
+        started = time.perf_counter()
+        mip_ids = dict(zip(teaching, (mip.id for mip in ModuleInstanceProfessor.objects.bulk_create(
+            (ModuleInstanceProfessor(moduleInstance_id=instance_ids[instance], professor_id=professor_ids[code]) for instance, code in teaching),
+            batch_size=batch_size,
+        ))))
+        progress.table("module instance professors", len(mip_ids), started)
+
+        started = time.perf_counter()
+        user_ids = {u.username: u.id for u in User.objects.bulk_create(
+            (User(username=username, email=f"{username}@example.com", password=password_hash) for username in usernames),
+            batch_size=batch_size,
+        )}
+        progress.table("users", len(user_ids), started)
+
+        started = time.perf_counter()
+        count = _insert(Rating, (
+            Rating(user_id=user_ids[username], moduleInstanceProfessor_id=mip_ids[target], rating=rating)
+            for username, target, rating in ratings
+        ), batch_size)
+        progress.table("ratings", count, started)
+
+        aggregates.rebuild()
+        versions.bump(versions.CATALOGUE)
+        versions.bump(versions.RATINGS)
+        catalogue.reset()
+
+    progress.total(load_started)
+    return progress.counts
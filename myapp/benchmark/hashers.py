@@ -0,0 +1,51 @@
+import threading
+import time
+
+from django.contrib.auth.hashers import get_hashers
+
+# Hashers
+# Description: Measure how many password checks per second, the CPU cost of a login, each hasher
+# in PASSWORD_HASHERS manages. With one thread that is the logins per second a single core can
+# serve. More threads show whether checks scale across cores, as the C hashers release the GIL.
+
+PASSWORD = "benchmark-password"
+
+
+# Check a password against a hash made by the hasher for duration seconds on each thread
+# Returns {checks, checks_per_s, ms_per_check}
+def measure(hasher, duration=2.0, threads=1):
+    encoded = hasher.encode(PASSWORD, hasher.salt())
+    counts = [0] * threads
+    deadline = time.perf_counter() + duration
+
+    def work(index):
+        while time.perf_counter() < deadline:
+            if not hasher.verify(PASSWORD, encoded):
+                raise ValueError(f"{hasher.algorithm} didn't verify its own hash")
+            counts[index] += 1
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    checks = sum(counts)
+    return {
+        "checks": checks,
+        "checks_per_s": round(checks / elapsed, 1),
+        "ms_per_check": round(elapsed * threads / checks * 1000, 1) if checks else None,
+    }
+
+
+# Measure every configured hasher, the one used for new passwords first
+# Returns {algorithm: result}, with {error} for hashers whose library isn't installed
+def compare(duration=2.0, threads=1):
+    results = {}
+    for hasher in get_hashers():
+        try:
+            results[hasher.algorithm] = measure(hasher, duration, threads)
+        except ValueError as e:
+            results[hasher.algorithm] = {"error": str(e)}
+    return results
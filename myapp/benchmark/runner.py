@@ -0,0 +1,279 @@
+import json
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Runner
+# Description: Load test the API of a running server. Each scenario sends requests to one
+# endpoint from a pool of worker threads, each with its own keep-alive session, and reports
+# latency percentiles, throughput and status codes. SQL query counts per request are measured
+# separately, in process, with the Django test client against the configured database.
+
+# Scenarios run by default, in order
+DEFAULT_SCENARIOS = [
+    "list", "list-page", "view", "view-page", "average", "average-batch", "distribution", "trends", "cache-stats", "metrics",
+    "register", "login", "logout", "rate", "rate-bulk", "rate-status", "rate-queue", "export",
+]
+# Targets rated by each rate-bulk and looked up by each average-batch request
+BATCH_SIZE = 50
+
+
+# Percentile of a sorted list using the nearest-rank method
+def percentile(values, pct):
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))]
+
+
+class Runner:
+    # staff is a (username, password) pair for the export scenario, which is skipped without one
+    def __init__(self, base_url, concurrency=8, requests_per_scenario=500, seed=0, staff=None):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.concurrency = concurrency
+        self.requests_per_scenario = requests_per_scenario
+        self.rng = random.Random(seed)
+        self.staff = staff
+        self.local = threading.local()
+        self.targets = []
+
+    def session(self):
+        session = getattr(self.local, "session", None)
+        if session is None:
+            session = self.local.session = requests.Session()
+        return session
+
+    # Collect (professor_code, module_code, year, semester) targets from the list endpoint
+    def load_targets(self, limit=1000):
+        response = requests.get(self.base_url + "list", params={"limit": limit})
+        response.raise_for_status()
+        self.targets = [
+            (professor["professor_code"], row["module_code"], row["year"], row["semester"])
+            for row in response.json()
+            for professor in row["taught_by"]
+        ]
+
+    # Register a fresh user on this thread's session, remembering its username
+    def register(self, session):
+        self.local.username = f"bench-{uuid.uuid4().hex[:12]}"
+        session.post(self.base_url + "register", data={"username": self.local.username, "email": f"{self.local.username}@example.com", "password": "password"})
+
+    # Register and log in a fresh user on this thread's session for each generation, so that a user
+    # never rates the same target twice as long as each generation rates each target at most once
+    def login(self, session, generation=0):
+        if getattr(self.local, "generation", None) == generation:
+            return
+        self.register(session)
+        session.post(self.base_url + "login", data={"username": self.local.username, "password": "password"})
+        self.local.generation = generation
+
+    # Targets for a batch request, a different slice of the targets for each index until they run out
+    # Returns (generation, targets), the generation going up each time the slices start over
+    def batch(self, index):
+        batches = max(1, len(self.targets) // BATCH_SIZE)
+        start = index % batches * BATCH_SIZE
+        return index // batches, self.targets[start:start + BATCH_SIZE]
+
+    # Set up this thread's session for one request of a scenario, outside of the timed request
+    def prepare(self, scenario, index):
+        session = self.session()
+        match scenario:
+            case "login":
+                if not getattr(self.local, "username", None):
+                    self.register(session)
+            case "logout":
+                if not getattr(self.local, "username", None):
+                    self.register(session)
+                session.post(self.base_url + "login", data={"username": self.local.username, "password": "password"})
+            case "rate":
+                # Each target once per user, so that the scenario measures added ratings rather than rejections
+                self.login(session, index // max(1, len(self.targets)))
+            case "rate-bulk":
+                self.login(session, self.batch(index)[0])
+            case "rate-status":
+                if not hasattr(self.local, "queued"):
+                    self.login(session)
+                    professor_code, module_code, year, semester = self.targets[self.rng.randrange(len(self.targets))] if self.targets else ("", "", 0, 0)
+                    response = session.post(self.base_url + "rate", data={
+                        "professor_code": professor_code, "module_code": module_code, "year": year, "semester": semester, "rating": 3,
+                    })
+                    # Only write-behind mode queues ratings, otherwise the scenario measures the 404 response
+                    self.local.queued = response.json()["id"] if response.status_code == 202 else 0
+            case "export":
+                if not getattr(self.local, "staff", False):
+                    session.post(self.base_url + "login", data={"username": self.staff[0], "password": self.staff[1]})
+                    self.local.staff = True
+
+    # Requests for each scenario, returning the response of one request
+    def request(self, scenario, index):
+        session = self.session()
+        target = self.targets[index % len(self.targets)] if self.targets else ("", "", 0, 0)
+        professor_code, module_code, year, semester = target
+        match scenario:
+            case "list":
+                return session.get(self.base_url + "list")
+            case "list-page":
+                return session.get(self.base_url + "list", params={"limit": 50})
+            case "view":
+                return session.get(self.base_url + "view")
+            case "view-page":
+                return session.get(self.base_url + "view", params={"limit": 50})
+            case "average":
+                return session.get(self.base_url + "average", params={"professor_code": professor_code, "module_code": module_code})
+            case "average-batch":
+                pairs = [[p, m] for p, m, _, _ in self.batch(index)[1]]
+                return session.post(self.base_url + "average/batch", data=json.dumps(pairs), headers={"Content-Type": "application/json"})
+            case "distribution":
+                return session.get(self.base_url + "distribution", params={"professor_code": professor_code, "module_code": module_code})
+            case "trends":
+                return session.get(self.base_url + "trends", params={"professor_code": professor_code})
+            case "cache-stats":
+                return session.get(self.base_url + "cache/stats")
+            case "metrics":
+                return session.get(self.base_url + "metrics")
+            case "register":
+                username = f"bench-{uuid.uuid4().hex[:12]}"
+                return session.post(self.base_url + "register", data={"username": username, "email": f"{username}@example.com", "password": "password"})
+            case "login":
+                return session.post(self.base_url + "login", data={"username": self.local.username, "password": "password"})
+            case "logout":
+                return session.post(self.base_url + "logout")
+            case "rate":
+                return session.post(self.base_url + "rate", data={
+                    "professor_code": professor_code, "module_code": module_code, "year": year, "semester": semester,
+                    "rating": self.rng.randint(1, 5),
+                })
+            case "rate-bulk":
+                rows = [
+                    {"professor_code": p, "module_code": m, "year": y, "semester": s, "rating": self.rng.randint(1, 5)}
+                    for p, m, y, s in self.batch(index)[1]
+                ]
+                return session.post(self.base_url + "rate/bulk", data=json.dumps(rows), headers={"Content-Type": "application/json"})
+            case "rate-status":
+                return session.get(self.base_url + "rate/status", params={"id": self.local.queued})
+            case "rate-queue":
+                return session.get(self.base_url + "rate/queue")
+            case "export":
+                return session.get(self.base_url + "export")
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    # Run one scenario and summarise it
+    def run_scenario(self, scenario):
+        latencies = []
+        statuses = {}
+        errors = 0
+        lock = threading.Lock()
+
+        def one(index):
+            nonlocal errors
+            try:
+                self.prepare(scenario, index)
+            except requests.RequestException:
+                pass
+            started = time.perf_counter()
+            try:
+                response = self.request(scenario, index)
+                status = str(response.status_code)
+            except requests.RequestException:
+                status = "error"
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == "error" or status.startswith("5"):
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            list(executor.map(one, range(self.requests_per_scenario)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "status_codes": statuses,
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                "p50": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+                "p95": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+                "p99": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+                "max": round(latencies[-1] * 1000, 2) if latencies else None,
+            },
+        }
+
+    def run(self, scenarios=DEFAULT_SCENARIOS):
+        self.load_targets()
+        results = {}
+        for scenario in scenarios:
+            if scenario == "export" and self.staff is None:
+                results[scenario] = {"skipped": "needs a staff user, see --staff-username and --staff-password"}
+                continue
+            results[scenario] = self.run_scenario(scenario)
+        return results
+
+
+# Count the SQL queries one request to each scenario's endpoint makes, in process
+# Requires Django to be set up against the same database the server uses. Each request runs in a
+# rolled back transaction, so write scenarios leave no data behind.
+def count_queries(scenarios=DEFAULT_SCENARIOS):
+    from django.contrib.auth.models import User
+    from django.db import connection, transaction
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    from api.cache import get_cache
+    from api.models import ModuleInstanceProfessor, PendingRating
+
+    mip = ModuleInstanceProfessor.objects.select_related("professor", "moduleInstance__module").order_by("id").first()
+    target = (mip.professor.code, mip.moduleInstance.module.code, mip.moduleInstance.year, mip.moduleInstance.semester) if mip else ("", "", 0, 0)
+    professor_code, module_code, year, semester = target
+    rating = {"professor_code": professor_code, "module_code": module_code, "year": year, "semester": semester, "rating": 3}
+
+    requests_by_scenario = {
+        "list": ("get", "/api/list", {}),
+        "list-page": ("get", "/api/list", {"limit": 50}),
+        "view": ("get", "/api/view", {}),
+        "view-page": ("get", "/api/view", {"limit": 50}),
+        "average": ("get", "/api/average", {"professor_code": professor_code, "module_code": module_code}),
+        "average-batch": ("post", "/api/average/batch", json.dumps([[professor_code, module_code]])),
+        "distribution": ("get", "/api/distribution", {"professor_code": professor_code, "module_code": module_code}),
+        "trends": ("get", "/api/trends", {"professor_code": professor_code}),
+        "cache-stats": ("get", "/api/cache/stats", {}),
+        "metrics": ("get", "/api/metrics", {}),
+        "register": ("post", "/api/register", {"username": "bench-queries", "email": "bench-queries@example.com", "password": "password"}),
+        "login": ("post", "/api/login", {"username": "bench-queries", "password": "password"}),
+        "logout": ("post", "/api/logout", {}),
+        "rate": ("post", "/api/rate", rating),
+        "rate-bulk": ("post", "/api/rate/bulk", json.dumps([rating])),
+        "rate-status": ("get", "/api/rate/status", {}),
+        "rate-queue": ("get", "/api/rate/queue", {}),
+        "export": ("get", "/api/export", {}),
+    }
+
+    counts = {}
+    for scenario in scenarios:
+        method, path, data = requests_by_scenario[scenario]
+        # Cached responses would hide the queries the endpoint makes
+        get_cache().clear()
+        with transaction.atomic():
+            client = Client()
+            user = User.objects.create_user("bench-queries", "bench-queries@example.com", "password", is_staff=scenario == "export") if scenario != "register" else None
+            if scenario in ("logout", "rate", "rate-bulk", "rate-status", "export"):
+                client.force_login(user)
+            if scenario == "rate-status" and mip:
+                data = {"id": PendingRating.objects.create(user=user, moduleInstanceProfessor=mip, rating=3).id}
+            extra = {"content_type": "application/json"} if scenario in ("rate-bulk", "average-batch") else {}
+            with CaptureQueriesContext(connection) as queries:
+                response = getattr(client, method)(path, data, **extra)
+                # Streamed responses, like the export, query the database as they are read
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            counts[scenario] = len(queries)
+            transaction.set_rollback(True)
+    return counts
@@ -0,0 +1,235 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from benchmark.runner import percentile
+
+# SQLite stress
+# Description: Measure read latency while ratings are being written, under SQLite's defaults and
+# under the tuning in rateprofs/settings.py (SQLITE_PRAGMAS, IMMEDIATE transactions, persistent
+# connections). Reader threads run the queries behind /api/view and /api/average, writer threads
+# the inserts and updates behind /api/rate, each on their own connections as server threads would.
+# Every configuration gets a fresh copy of the source database, which is left untouched.
+
+
+# Django's SQLite defaults: rollback journal, a new connection per request, deferred transactions
+# and the sqlite3 module's 5 second busy timeout
+def default_config():
+    return {"pragmas": {"journal_mode": "DELETE", "synchronous": "FULL"}, "transaction_mode": "DEFERRED", "persistent": False, "timeout": 5.0}
+
+
+# The database configuration from settings
+def tuned_config():
+    from django.conf import settings
+    options = settings.DATABASES["default"].get("OPTIONS", {})
+    return {
+        "pragmas": dict(settings.SQLITE_PRAGMAS),
+        "transaction_mode": options.get("transaction_mode") or "DEFERRED",
+        "persistent": bool(settings.DATABASES["default"].get("CONN_MAX_AGE")),
+        "timeout": options.get("timeout", 5.0),
+    }
+
+
+class Stress:
+    def __init__(self, path, config, seed=0):
+        self.path = path
+        self.config = config
+        self.seed = seed
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stop = threading.Event()
+        self.results = {"read": [], "write": [], "read_errors": 0, "write_errors": 0}
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.config["timeout"], isolation_level=None, check_same_thread=False)
+        for name, value in self.config["pragmas"].items():
+            conn.execute(f"PRAGMA {name}={value}")
+        return conn
+
+    # Run work on this thread's connection, or a new one when connections aren't persistent
+    def with_connection(self, work):
+        if not self.config["persistent"]:
+            conn = self.connect()
+            try:
+                return work(conn)
+            finally:
+                conn.close()
+        if getattr(self.local, "conn", None) is None:
+            self.local.conn = self.connect()
+        return work(self.local.conn)
+
+    def prepare(self):
+        conn = self.connect()
+        try:
+            self.pairs = conn.execute("SELECT professor_id, module_id FROM api_professormoduleaggregate").fetchall()
+            self.mip_ids = [row[0] for row in conn.execute("SELECT id FROM api_moduleinstanceprofessor")]
+        finally:
+            conn.close()
+        if not self.mip_ids:
+            raise ValueError("The database has no module instance professors to rate, load some data first")
+
+    # /api/view (first page) and /api/average, reading the data versions first as the views do
+    def read(self, conn, rng):
+        conn.execute("SELECT scope, stamp, modified FROM api_dataversion WHERE scope IN ('catalogue', 'ratings')").fetchall()
+        if rng.random() < 0.5 or not self.pairs:
+            conn.execute(
+                "SELECT p.id, p.name, p.code, a.total, a.count FROM api_professor p "
+                "LEFT OUTER JOIN api_professoraggregate a ON a.professor_id = p.id ORDER BY p.id LIMIT 50"
+            ).fetchall()
+        else:
+            professor_id, module_id = rng.choice(self.pairs)
+            conn.execute("SELECT code, name FROM api_professor WHERE id = ?", (professor_id,)).fetchone()
+            conn.execute("SELECT code, name FROM api_module WHERE id = ?", (module_id,)).fetchone()
+            conn.execute(
+                "SELECT total, count FROM api_professormoduleaggregate WHERE professor_id = ? AND module_id = ?", (professor_id, module_id)
+            ).fetchone()
+
+    # /api/rate: insert the rating, then update the aggregates and the ratings data version
+    def write(self, conn, user_id, mip_id, rating):
+        conn.execute(f"BEGIN {self.config['transaction_mode']}")
+        try:
+            conn.execute("INSERT INTO api_rating (user_id, moduleInstanceProfessor_id, rating) VALUES (?, ?, ?)", (user_id, mip_id, rating))
+            professor_id, module_id, year, semester = conn.execute(
+                "SELECT mip.professor_id, mi.module_id, mi.year, mi.semester FROM api_moduleinstanceprofessor mip "
+                "INNER JOIN api_moduleinstance mi ON mi.id = mip.moduleInstance_id WHERE mip.id = ?", (mip_id,)
+            ).fetchone()
+            stars = f"stars_{rating}"
+            if not conn.execute(
+                f"UPDATE api_professoraggregate SET total = total + ?, count = count + 1, {stars} = {stars} + 1 WHERE professor_id = ?", (rating, professor_id)
+            ).rowcount:
+                conn.execute(
+                    "INSERT INTO api_professoraggregate (professor_id, total, count, stars_1, stars_2, stars_3, stars_4, stars_5) VALUES (?, ?, 1, ?, ?, ?, ?, ?)",
+                    (professor_id, rating, *(int(star == rating) for star in range(1, 6))),
+                )
+            if not conn.execute(
+                f"UPDATE api_professormoduleaggregate SET total = total + ?, count = count + 1, {stars} = {stars} + 1 WHERE professor_id = ? AND module_id = ?",
+                (rating, professor_id, module_id),
+            ).rowcount:
+                conn.execute(
+                    "INSERT INTO api_professormoduleaggregate (professor_id, module_id, total, count, stars_1, stars_2, stars_3, stars_4, stars_5) VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?)",
+                    (professor_id, module_id, rating, *(int(star == rating) for star in range(1, 6))),
+                )
+            if not conn.execute(
+                f"UPDATE api_professortermaggregate SET total = total + ?, count = count + 1, {stars} = {stars} + 1 "
+                "WHERE professor_id = ? AND module_id = ? AND year = ? AND semester = ?",
+                (rating, professor_id, module_id, year, semester),
+            ).rowcount:
+                conn.execute(
+                    "INSERT INTO api_professortermaggregate (professor_id, module_id, year, semester, total, count, stars_1, stars_2, stars_3, stars_4, stars_5) "
+                    "VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?, ?)",
+                    (professor_id, module_id, year, semester, rating, *(int(star == rating) for star in range(1, 6))),
+                )
+            conn.execute("UPDATE api_dataversion SET stamp = ?, modified = ? WHERE scope = 'ratings'", (uuid.uuid4().hex, datetime.now(timezone.utc).isoformat(" ")))
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+
+    def create_user(self, conn):
+        username = f"stress-{uuid.uuid4().hex[:12]}"
+        return conn.execute(
+            "INSERT INTO auth_user (password, is_superuser, username, first_name, last_name, email, is_staff, is_active, date_joined) "
+            "VALUES ('!', 0, ?, '', '', '', 0, 1, ?)", (username, datetime.now(timezone.utc).isoformat(" "))
+        ).lastrowid
+
+    def reader(self, index):
+        rng = random.Random(f"{self.seed}-read-{index}")
+        latencies, errors = [], 0
+        while not self.stop.is_set():
+            started = time.perf_counter()
+            try:
+                self.with_connection(lambda conn: self.read(conn, rng))
+                latencies.append(time.perf_counter() - started)
+            except sqlite3.OperationalError:
+                errors += 1
+        with self.lock:
+            self.results["read"] += latencies
+            self.results["read_errors"] += errors
+
+    def writer(self, index):
+        rng = random.Random(f"{self.seed}-write-{index}")
+        latencies, errors = [], 0
+        user_id, targets = None, []
+        while not self.stop.is_set():
+            # Each user rates a module instance professor at most once
+            if not targets:
+                user_id = self.with_connection(self.create_user)
+                targets = rng.sample(self.mip_ids, len(self.mip_ids))
+            mip_id = targets.pop()
+            started = time.perf_counter()
+            try:
+                self.with_connection(lambda conn: self.write(conn, user_id, mip_id, rng.randint(1, 5)))
+                latencies.append(time.perf_counter() - started)
+            except sqlite3.OperationalError:
+                errors += 1
+        with self.lock:
+            self.results["write"] += latencies
+            self.results["write_errors"] += errors
+
+    def run(self, readers, writers, duration):
+        self.prepare()
+        threads = [threading.Thread(target=self.reader, args=(i,)) for i in range(readers)]
+        threads += [threading.Thread(target=self.writer, args=(i,)) for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        self.stop.set()
+        for thread in threads:
+            thread.join()
+        return summarise(self.results, duration)
+
+
+def _latency(latencies):
+    latencies = sorted(latencies)
+    if not latencies:
+        return None
+    return {
+        "p50": round(percentile(latencies, 50) * 1000, 2),
+        "p95": round(percentile(latencies, 95) * 1000, 2),
+        "p99": round(percentile(latencies, 99) * 1000, 2),
+        "max": round(latencies[-1] * 1000, 2),
+    }
+
+
+def summarise(results, duration):
+    return {
+        "reads": len(results["read"]),
+        "reads_per_s": round(len(results["read"]) / duration, 1),
+        "read_errors": results["read_errors"],
+        "read_latency_ms": _latency(results["read"]),
+        "writes": len(results["write"]),
+        "writes_per_s": round(len(results["write"]) / duration, 1),
+        "write_errors": results["write_errors"],
+        "write_latency_ms": _latency(results["write"]),
+    }
+
+
+# Copy a database with SQLite's backup API, which includes anything still in a WAL file
+def copy_database(source, target):
+    src = sqlite3.connect(source, uri=True)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+# Run the stress test under each configuration on its own copy of the source database
+# configs: {name: config}, defaults to Django's defaults and the tuned settings
+# Returns {name: summary}
+def compare(source, readers=4, writers=2, duration=10.0, configs=None, seed=0):
+    configs = configs or {"default": default_config(), "tuned": tuned_config()}
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, config in configs.items():
+            path = os.path.join(directory, f"{name}.sqlite3")
+            copy_database(source, path)
+            results[name] = Stress(path, config, seed).run(readers, writers, duration)
+    return results
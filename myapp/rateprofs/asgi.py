@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rateprofs.settings')
+# Serve the read endpoints from the async views
+os.environ.setdefault('RATEPROFS_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,11 +43,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ThrottleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,17 +74,234 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'rateprofs.wsgi.application'
 
+# Route the read endpoints to the async views in api/async_views.py
+# asgi.py turns this on by setting RATEPROFS_ASYNC_VIEWS=1, WSGI keeps the sync views
+API_ASYNC_VIEWS = os.environ.get('RATEPROFS_ASYNC_VIEWS') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+# SQLite by default, in db.sqlite3 unless RATEPROFS_DB_NAME gives another path.
+# Set RATEPROFS_DB_ENGINE=postgresql to use PostgreSQL instead, see below.
+
+# SQLite pragmas run on every new connection, see init_command below
+# WAL lets readers carry on while a rating is being written, and with WAL synchronous=NORMAL
+# only syncs at checkpoints. cache_size is in KiB when negative. busy_timeout (ms) makes a
+# connection wait for a lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64_000,
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5_000,
+}
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('RATEPROFS_DB_NAME', BASE_DIR / 'db.sqlite3'),
+        # Keep connections open between requests, checking they still work before reuse.
+        # Under ASGI each request runs its queries on a new thread, so connections can't be reused.
+        'CONN_MAX_AGE': 0 if API_ASYNC_VIEWS else 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock when a transaction starts. A deferred transaction that reads
+            # and then writes fails straight away if another connection is writing, as SQLite
+            # can't wait on the busy timeout without risking a deadlock.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+        },
+    }
+}
+
+# PostgreSQL, configured by RATEPROFS_DB_NAME, RATEPROFS_DB_USER, RATEPROFS_DB_PASSWORD,
+# RATEPROFS_DB_HOST and RATEPROFS_DB_PORT. Needs 'pip install "psycopg[binary,pool]"'.
+# RATEPROFS_DB_POOL=1 keeps a psycopg connection pool per process of between RATEPROFS_DB_POOL_MIN
+# and RATEPROFS_DB_POOL_MAX connections, which also works under ASGI.
+# RATEPROFS_DB_PGBOUNCER=1 is for connecting through PgBouncer in transaction pooling mode, which
+# hands each transaction to any server connection, so connections aren't kept and server side
+# cursors (used by /api/list?format=ndjson) are turned off.
+if os.environ.get('RATEPROFS_DB_ENGINE', 'sqlite') == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('RATEPROFS_DB_NAME', 'rateprofs'),
+            'USER': os.environ.get('RATEPROFS_DB_USER', ''),
+            'PASSWORD': os.environ.get('RATEPROFS_DB_PASSWORD', ''),
+            'HOST': os.environ.get('RATEPROFS_DB_HOST', ''),
+            'PORT': os.environ.get('RATEPROFS_DB_PORT', ''),
+            'CONN_MAX_AGE': 0 if API_ASYNC_VIEWS else 600,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
+    if os.environ.get('RATEPROFS_DB_POOL') == '1':
+        # Pooled connections go back to the pool after each request instead of persisting
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('RATEPROFS_DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('RATEPROFS_DB_POOL_MAX', 10)),
+            'timeout': 10,
+        }
+    if os.environ.get('RATEPROFS_DB_PGBOUNCER') == '1':
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The 'api' cache holds read endpoint responses. Local memory is per process and evicts the
+# least recently used entry once MAX_ENTRIES is reached. To share entries between processes
+# switch it to e.g. 'django.core.cache.backends.filebased.FileBasedCache' with a directory
+# LOCATION, or 'django.core.cache.backends.db.DatabaseCache' after 'manage.py createcachetable'.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'api': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'api-responses',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
 }
 
+API_CACHE_ALIAS = 'api'
+
+
+# Pagination
+# Largest page size /api/list and /api/view will return for the limit parameter
+
+API_PAGE_MAX_LIMIT = 1000
+
+
+# List streaming
+# Number of module instances read per query by /api/list?format=ndjson
+
+API_LIST_CHUNK_SIZE = 500
+
+
+# Bulk rating
+# Number of ratings inserted per query by /api/rate/bulk, unless the request gives chunk_size,
+# and the most ratings it accepts in one request
+
+API_BULK_RATE_CHUNK_SIZE = 500
+API_BULK_RATE_MAX_ROWS = 20_000
+
+
+# Batched averages
+# Largest number of professor/module pairs /api/average/batch accepts in one request
+
+API_AVERAGE_BATCH_MAX_PAIRS = 5000
+
+
+# Catalogue index
+# Seconds /api/rate trusts its in-memory catalogue index before checking the catalogue data version
+# again, see api/catalogue.py. Catalogue changes made by another process can take this long to apply.
+
+API_CATALOGUE_CHECK_INTERVAL = 5.0
+
+
+# Write-behind rating queue
+# With RATEPROFS_RATE_WRITE_BEHIND=1, /api/rate queues ratings to be added in batches instead of
+# adding each one straight away, see api/writebehind.py. A drainer adds up to API_RATE_QUEUE_BATCH_SIZE
+# ratings per transaction, at least every API_RATE_QUEUE_MAX_STALENESS seconds. It runs as a thread in
+# each server process, started with its first request, unless API_RATE_QUEUE_WORKER is False and
+# 'manage.py drain_ratings' runs instead.
+
+API_RATE_WRITE_BEHIND = os.environ.get('RATEPROFS_RATE_WRITE_BEHIND') == '1'
+API_RATE_QUEUE_BATCH_SIZE = 500
+API_RATE_QUEUE_MAX_STALENESS = 2.0
+API_RATE_QUEUE_WORKER = True
+
+
+# Tokens
+# Seconds a token issued by /api/login (with token=1) stays valid, see api/tokens.py
+
+API_TOKEN_MAX_AGE = 24 * 60 * 60
+
+
+# Rate limiting
+# See api/throttle.py. Each client (user, or IP address if not logged in) may make burst requests to
+# an endpoint at once, then rate requests per second: {endpoint: (rate, burst)}.
+# Buckets are per process with the 'memory' backend, or shared with API_RATE_LIMIT_BACKEND = 'cache'
+# through API_RATE_LIMIT_CACHE_ALIAS, which then needs a cache shared between processes (see CACHES).
+# API_WRITE_CONCURRENCY is the most API_WRITE_ENDPOINTS requests a process handles at once.
+# RATEPROFS_RATE_LIMITS=off turns the rate limits off, e.g. to load test from a single machine.
+# Anonymous clients are keyed on REMOTE_ADDR, which behind a reverse proxy is the proxy's address, so
+# every client would share one bucket. There, set API_RATE_LIMIT_CLIENT_IP_HEADER to the header the
+# proxies add the client address to (e.g. 'HTTP_X_FORWARDED_FOR') and API_RATE_LIMIT_TRUSTED_PROXIES
+# to the number of proxies in front of the server. Only set it behind a proxy, as clients can send
+# the header themselves.
+
+API_RATE_LIMITS = {} if os.environ.get('RATEPROFS_RATE_LIMITS') == 'off' else {
+    'register': (1, 10),
+    'login': (1, 10),
+    'rate': (5, 30),
+    'rate-bulk': (1, 5),
+}
+API_RATE_LIMIT_BACKEND = 'memory'
+API_RATE_LIMIT_CACHE_ALIAS = 'default'
+API_RATE_LIMIT_CLIENT_IP_HEADER = None
+API_RATE_LIMIT_TRUSTED_PROXIES = 1
+API_WRITE_ENDPOINTS = ('register', 'login', 'logout', 'rate', 'rate-bulk')
+API_WRITE_CONCURRENCY = 8
+
+
+# Export
+# Number of ratings read and encoded at a time by /api/export and 'manage.py export_ratings'
+
+API_EXPORT_CHUNK_SIZE = 10_000
+
+
+# Logging
+# https://docs.djangoproject.com/en/5.1/topics/logging/
+# api.middleware.TimingMiddleware logs one JSON line per request to the 'api.timing' logger.
+# Set RATEPROFS_TIMING_LOG=WARNING to silence it.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.timing': {
+            'handlers': ['console'],
+            'level': os.environ.get('RATEPROFS_TIMING_LOG', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
+# RATEPROFS_PASSWORD_HASHER picks the hasher for new passwords: argon2 (the default, see
+# api/hashers.py), scrypt or pbkdf2 (Django's default). The others stay listed so existing
+# passwords still verify, and they are rehashed with the chosen one when the user next logs in.
+
+PASSWORD_HASHER_CHOICES = {
+    'argon2': 'api.hashers.Argon2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+}
+_password_hasher = os.environ.get('RATEPROFS_PASSWORD_HASHER', 'argon2')
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[_password_hasher]] + [
+    hasher for name, hasher in PASSWORD_HASHER_CHOICES.items() if name != _password_hasher
+]
+
+# Most requests per process hashing a password at once (see api/hashing.py), and the seconds
+# a request waits for its turn before getting 503 Service Unavailable
+API_PASSWORD_HASH_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+API_PASSWORD_HASH_TIMEOUT = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
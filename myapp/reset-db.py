@@ -1,6 +1,7 @@
+import argparse
 import os
+import sys
 import django
-import shutil
 from django.core.management import call_command
 import random
 import string
@@ -10,11 +11,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rateprofs.settings')
 django.setup()
 
 from api.models import ModuleInstance, Professor, Rating, ModuleInstanceProfessor, Module
+from benchmark import SIZES, datagen
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 
-# Define the app name
-APP_NAME = "api"
-
 def seed(ratings=False):
     print("Seeding . . .")
 
@@ -95,42 +96,79 @@ def seed(ratings=False):
     print("Seeding complete")
 
 
-def reset_database():
-    # Delete the database file if it exists
-    db_path = "db.sqlite3"
-    if os.path.exists(db_path):
-        os.remove(db_path)
-        print("Deleted database file.")
-
-    # Delete migration files
-    migrations_path = os.path.join(APP_NAME, "migrations")
-    if os.path.exists(migrations_path):
-        shutil.rmtree(migrations_path)
-        print(f"Deleted migrations in {migrations_path}.")
-
-    # Run migrations
-    call_command("migrate")
-    print("Ran initial migrations.")
-
-    # Make and apply migrations for the ratings app
-    call_command("makemigrations", APP_NAME)
-    print(f"Created migrations for {APP_NAME}.")
-    
+def reset_database(interactive=True):
+    database = settings.DATABASES["default"]
+    if database["ENGINE"] == "django.db.backends.sqlite3":
+        # Delete the database file if it exists
+        db_path = str(database["NAME"])
+        if os.path.exists(db_path):
+            os.remove(db_path)
+            print(f"Deleted database file {db_path}.")
+
+        # Delete the write-ahead log left by WAL journaling, which must not be applied to a new database
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    else:
+        # Other databases can't be deleted from here, so empty their tables instead
+        call_command("flush", interactive=False)
+        print("Flushed database.")
+
+    # Create the tables from the committed migrations
     call_command("migrate")
     print("Applied migrations.")
 
     # Create a superuser (you can modify these details)
-    print("Creating superuser...")
-    call_command("createsuperuser", interactive=True)
+    if interactive:
+        print("Creating superuser...")
+        call_command("createsuperuser", interactive=True)
+    elif os.environ.get("DJANGO_SUPERUSER_USERNAME") and os.environ.get("DJANGO_SUPERUSER_PASSWORD"):
+        # Non-interactive createsuperuser reads DJANGO_SUPERUSER_USERNAME/EMAIL/PASSWORD
+        print("Creating superuser...")
+        call_command("createsuperuser", interactive=False)
+    else:
+        print("Skipped superuser, set DJANGO_SUPERUSER_USERNAME, DJANGO_SUPERUSER_EMAIL and DJANGO_SUPERUSER_PASSWORD to create one.")
+
+def bulk_seed(size=None, input_path=None, password=datagen.PASSWORD):
+    # Hash the password shared by every generated user once, rather than once per user
+    password_hash = make_password(password)
+    with datagen.fast_load():
+        if input_path:
+            print(f"Loading {input_path} . . .")
+            try:
+                datagen.load(datagen.read_rows(input_path), password_hash=password_hash, out=print)
+            except ValueError as e:
+                sys.exit(f"Could not load {input_path}: {e}")
+        else:
+            print(f"Generating {size} dataset . . .")
+            datagen.generate(**SIZES[size], password_hash=password_hash, out=print)
+    print("Seeding complete")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Reset the database and optionally seed it. Prompts for everything unless --no-input is given.")
+    parser.add_argument("--no-input", action="store_true", help="Don't prompt, seed according to the options below")
+    parser.add_argument("--demo", action="store_true", help="Seed the demo catalogue")
+    parser.add_argument("--ratings", action="store_true", help="With --demo, add the demo ratings too")
+    parser.add_argument("--size", choices=SIZES, help="Bulk load a synthetic dataset of this size")
+    parser.add_argument("--input", help="Bulk load rows from a CSV or JSON file, see benchmark/datagen.py ROW_FIELDS")
+    parser.add_argument("--password", default=datagen.PASSWORD, help="Password of the users created by --size or --input")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    reset_database()
-    
-    # Seed if necessary
-    to_seed = input("Would you like to seed demo data (y/n): ")
-    if (to_seed == 'y' or to_seed == 'Y'):
-        to_add_ratings = input("Would you like to add ratings too (y/n): ")
-        if (to_add_ratings == 'y' or to_add_ratings == 'Y'):
-            seed(ratings=True)
-        else:
-            seed(ratings=False)
+    args = parse_args()
+    reset_database(interactive=not args.no_input)
+
+    if args.no_input:
+        if args.size or args.input:
+            bulk_seed(size=args.size, input_path=args.input, password=args.password)
+        elif args.demo:
+            seed(ratings=args.ratings)
+    else:
+        # Seed if necessary
+        to_seed = input("Would you like to seed demo data (y/n): ")
+        if (to_seed == 'y' or to_seed == 'Y'):
+            to_add_ratings = input("Would you like to add ratings too (y/n): ")
+            if (to_add_ratings == 'y' or to_add_ratings == 'Y'):
+                seed(ratings=True)
+            else:
+                seed(ratings=False)
@@ -1,9 +1,141 @@
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
 import requests
 import texttable
 
 # Base URL of the API
 BASE_URL = "https://sc21ca.pythonanywhere.com/api/"
 # BASE_URL = "http://127.0.0.1:8000/api/"
+# Seconds a cached response is reused before it is revalidated with the server
+CACHE_TTL = 30
+# Log in with a signed token, sent with each request, instead of a session cookie
+USE_TOKEN = False
+
+# Session that caches GET responses and revalidates them instead of re-downloading them
+# Keeps the last successful response for each URL (with its query parameters). For ttl seconds after
+# it was fetched a kept response is reused without asking the server. After that its ETag and
+# Last-Modified are sent back to the server, which answers 304 Not Modified if nothing has changed
+# so the kept response is reused. With a path the cache is saved there and loaded by the next session.
+class ConditionalSession(requests.Session):
+    def __init__(self, ttl=0, path=None):
+        super().__init__()
+        self.ttl = ttl
+        self.path = path
+        self.validated = {}
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "invalidated": 0}
+        if path and os.path.exists(path):
+            self.load()
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def request(self, method, url, params=None, headers=None, stream=None, **kwargs):
+        if method.upper() != "GET":
+            return super().request(method, url, params=params, headers=headers, stream=stream, **kwargs)
+
+        # Key on the full URL including query parameters
+        key = requests.Request("GET", url, params=params).prepare().url
+        previous = self.validated.get(key)
+        if previous is not None and time.time() - previous.fetched_at < self.ttl:
+            self.count("hits")
+            return previous
+        headers = dict(headers or {})
+        if previous is not None:
+            if "ETag" in previous.headers:
+                headers.setdefault("If-None-Match", previous.headers["ETag"])
+            if "Last-Modified" in previous.headers:
+                headers.setdefault("If-Modified-Since", previous.headers["Last-Modified"])
+
+        response = super().request(method, url, params=params, headers=headers, stream=stream, **kwargs)
+        if response.status_code == 304 and previous is not None:
+            self.count("revalidated")
+            previous.fetched_at = time.time()
+            return previous
+        self.count("misses")
+        self.validated.pop(key, None)
+        if response.status_code == 200 and ("ETag" in response.headers or "Last-Modified" in response.headers):
+            response.fetched_at = time.time()
+            if stream:
+                self._keep_when_read(key, response)
+            else:
+                self.validated[key] = response
+        return response
+
+    # Keep a streamed response once the caller has read all of it, without buffering it up front
+    def _keep_when_read(self, key, response):
+        iter_content = response.iter_content
+
+        def keeping_iter_content(chunk_size=1, decode_unicode=False):
+            if decode_unicode:
+                yield from iter_content(chunk_size=chunk_size, decode_unicode=True)
+                return
+            chunks = []
+            for chunk in iter_content(chunk_size=chunk_size):
+                chunks.append(chunk)
+                yield chunk
+            # Fully read, so keep a copy whose body can be iterated again
+            self.validated[key] = _kept_response(response.status_code, response.headers, b"".join(chunks), response.encoding, response.url, response.fetched_at)
+
+        response.iter_content = keeping_iter_content
+
+    # Drop kept responses for the given endpoints, or every kept response if none are given
+    def invalidate(self, *endpoints):
+        for key in list(self.validated):
+            if not endpoints or urlsplit(key).path.rstrip("/").rsplit("/", 1)[-1] in endpoints:
+                if self.validated.pop(key, None) is not None:
+                    self.count("invalidated")
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+            self.validated = {
+                key: _kept_response(entry["status"], entry["headers"], base64.b64decode(entry["content"]), entry["encoding"], entry["url"], entry["fetched_at"])
+                for key, entry in entries.items()
+            }
+        except (OSError, ValueError, KeyError):
+            # Start with an empty cache rather than failing on an unreadable file
+            self.validated = {}
+
+    def save(self):
+        entries = {
+            key: {
+                "status": response.status_code,
+                "headers": dict(response.headers),
+                "content": base64.b64encode(response.content).decode(),
+                "encoding": response.encoding,
+                "url": response.url,
+                "fetched_at": response.fetched_at,
+            }
+            for key, response in list(self.validated.items())
+        }
+        # Write to a temporary file first so an interrupted save can't leave a truncated cache
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(entries, f)
+        os.replace(self.path + ".tmp", self.path)
+
+# Build a fully read response from its parts
+def _kept_response(status_code, headers, content, encoding, url, fetched_at):
+    kept = requests.Response()
+    kept.status_code = status_code
+    kept.headers = requests.structures.CaseInsensitiveDict(headers)
+    kept.encoding = encoding
+    kept.url = url
+    kept._content = content
+    kept._content_consumed = True
+    kept.fetched_at = fetched_at
+    return kept
 
 # Send a register request to create a user account
 def handle_register(session, username, email, password):
@@ -17,10 +149,18 @@ def handle_register(session, username, email, password):
         return f"Request failed: {e}"
 
 # Send a login request to log in the session
+# With USE_TOKEN the server issues a token instead, which the session then sends with every request
 def handle_login(session, url, username, password):
     try:
-        response = session.post('http://' + url + "/api/login", data={"username": username, "password": password})
+        data = {"username": username, "password": password}
+        if USE_TOKEN:
+            data["token"] = "1"
+        response = session.post('http://' + url + "/api/login", data=data)
         if response.status_code == 200:
+            if USE_TOKEN:
+                token = response.json()
+                session.headers["Authorization"] = "Token " + token["token"]
+                return f"Success, token valid for {token['expires_in']}s"
             return response.text
         else:
             return f"Error: {response.status_code} - {response.text}"
@@ -28,8 +168,11 @@ def handle_login(session, url, username, password):
         return f"Request failed: {e}"
 
 # Send a logout request to end the logged-in session
+# A token can't be ended on the server, so it is just forgotten
 def handle_logout(session):
     try:
+        if session.headers.pop("Authorization", None) is not None:
+            return "Success"
         response = session.post(BASE_URL + "logout")
         if response.status_code == 200:
             return response.text
@@ -38,37 +181,75 @@ def handle_logout(session):
     except Exception as e:
         return f"Request failed: {e}"
     
+# Number of list rows drawn per block of the table
+LIST_BLOCK_SIZE = 20
+# Number of rows requested per page from the list and view endpoints
+PAGE_SIZE = 100
+
+# Send GET requests for a paged endpoint, following each Link rel="next" header
+# Pages are only fetched once the previous one has been consumed
+def get_pages(session, url, params, **kwargs):
+    while url:
+        response = session.get(url, params=params, **kwargs)
+        yield response
+        if response.status_code != 200:
+            return
+        # The next page URL already carries every query parameter
+        url = response.links.get("next", {}).get("url")
+        params = None
+
 # Send a list request to view a list of all module instances
+# Rows are streamed from the server a page at a time and yielded as blocks of the table as they
+# arrive, so a large catalogue starts printing before it has been fully downloaded
 def handle_list(session):
-    # Table setup
-    table = texttable.Texttable()
-    table.set_cols_align(["c", "c", "c", "c", "c"])
-    table.set_cols_dtype(["a", "a", "i", "i", "a"])
-    table.set_cols_valign(["m", "m", "m", "m", "m"])
-    table.add_row(["Module Code", "Module Name", "Year", "Semester", "Taught by"])
+    # Fixed column widths keep successive blocks of the table aligned
+    widths = [11, 24, 6, 8, 30]
+    header = ["Module Code", "Module Name", "Year", "Semester", "Taught by"]
+
+    def draw(rows, first):
+        table = texttable.Texttable()
+        table.set_cols_width(widths)
+        table.set_cols_align(["c", "c", "c", "c", "c"])
+        table.set_cols_dtype(["a", "a", "i", "i", "a"])
+        table.set_cols_valign(["m", "m", "m", "m", "m"])
+        table.add_rows(([header] if first else []) + rows, header=False)
+        output = table.draw()
+        # Drop the top border of later blocks, it duplicates the bottom border of the previous one
+        return output if first else output.split("\n", 1)[1]
+
     try:
-        response = session.get(BASE_URL + "list")
-        if response.status_code == 200:
-            data = response.json()
-            # Build table
-            for row in data:
+        rows = []
+        first = True
+        for response in get_pages(session, BASE_URL + "list", {"format": "ndjson", "limit": PAGE_SIZE}, stream=True):
+            if response.status_code != 200:
+                yield f"Error: {response.status_code} - {response.text}"
+                return
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                row = json.loads(line)
                 # Iterate over teachers first for nicer formatting
                 professors = []
                 for professor in row['taught_by']:
                     professors.append(f"{professor['professor_code']}, {professor['professor_name']}")
-                table.add_row([row['module_code'], row['module_name'], row['year'], row['semester'], "\n".join(professors)])
-            output = table.draw()
-            return output
-        else:
-            return f"Error: {response.status_code} - {response.text}"
+                rows.append([row['module_code'], row['module_name'], row['year'], row['semester'], "\n".join(professors)])
+                if len(rows) == LIST_BLOCK_SIZE:
+                    yield draw(rows, first)
+                    rows = []
+                    first = False
+        if rows or first:
+            yield draw(rows, first)
     except Exception as e:
-        return f"Request failed: {e}"
+        yield f"Request failed: {e}"
     
 # Send a view request to view the ratings of all professors
+# Pages are fetched lazily and yielded as they arrive
 def handle_view(session):
     try:
-        response = session.get(BASE_URL + "view")
-        if response.status_code == 200:
+        for response in get_pages(session, BASE_URL + "view", {"limit": PAGE_SIZE}):
+            if response.status_code != 200:
+                yield f"Error: {response.status_code} - {response.text}"
+                return
             data = response.json()
             output_lines = []
             # Build output from data
@@ -77,12 +258,9 @@ def handle_view(session):
                     output_lines.append(f"The rating of Professor {row['professor_name']} ({row['professor_code']}) is {'*' * row['average_rating']}")
                 else:
                     output_lines.append(f"No ratings exist for Professor {row['professor_name']} ({row['professor_code']})")
-            output = "\n".join(output_lines)
-            return output
-        else:
-            return f"Error: {response.status_code} - {response.text}"
+            yield "\n".join(output_lines)
     except Exception as e:
-        return f"Request failed: {e}"
+        yield f"Request failed: {e}"
     
 # Send an average request to see the average rating of a professor in a module
 def handle_average(session, professorCode, moduleCode):
@@ -100,21 +278,140 @@ def handle_average(session, professorCode, moduleCode):
     except Exception as e:
         return f"Request failed: {e}"
 
+# Number of pairs sent per request by average-many
+AVERAGE_BATCH_SIZE = 1000
+
+# Send batched average requests to see the average ratings of many professor/module pairs
+# pairs: list of (professorCode, moduleCode)
+def handle_average_many(session, pairs):
+    try:
+        output_lines = []
+        for start in range(0, len(pairs), AVERAGE_BATCH_SIZE):
+            chunk = pairs[start:start + AVERAGE_BATCH_SIZE]
+            response = session.post(BASE_URL + "average/batch", json=[{"professor_code": p, "module_code": m} for p, m in chunk])
+            if response.status_code != 200:
+                return f"Error: {response.status_code} - {response.text}"
+            data = response.json()
+            for professorCode, moduleCode in chunk:
+                row = data.get(f"{professorCode}/{moduleCode}")
+                if row is None:
+                    output_lines.append(f"Professor {professorCode} or module {moduleCode} not found")
+                elif row['average_rating'] is not None:
+                    output_lines.append(f"The rating of Professor {row['professor_name']} ({row['professor_code']}) in module {row['module_name']} ({row['module_code']}) is {'*' * row['average_rating']}")
+                else:
+                    output_lines.append(f"Rating unavailable for Professor {professorCode} in module {moduleCode}")
+        return "\n".join(output_lines)
+    except Exception as e:
+        return f"Request failed: {e}"
+
 # Send a rate request to rate a module instance
 def handle_rate(session, professorCode, moduleCode, year, semester, rating):
     try:
         response = session.post(BASE_URL + "rate", data={"professor_code": professorCode, "module_code": moduleCode, "year": year, "semester": semester, "rating": rating})
         if response.status_code == 200:
+            # Cached ratings are now out of date
+            session.invalidate("view", "average")
             return response.text
+        elif response.status_code == 202:
+            # Queued by a server in write-behind mode, to be added shortly
+            return f"Rating queued with id {response.json()['id']}, check it with 'rate-status {response.json()['id']}'"
+        else:
+            return f"Error: {response.status_code} - {response.text}"
+    except Exception as e:
+        return f"Request failed: {e}"
+
+# Send a rate status request to see whether a queued rating has been added
+def handle_rate_status(session, id):
+    try:
+        response = session.get(BASE_URL + "rate/status", params={"id": id})
+        if response.status_code == 200:
+            status = response.json()
+            return f"Rating {status['id']}: {status['status']}" + (f" - {status['reason']}" if status["reason"] else "")
         else:
             return f"Error: {response.status_code} - {response.text}"
     except Exception as e:
         return f"Request failed: {e}"
 
+# Report or clear the client's response cache
+def handle_cache(session, action):
+    match action:
+        case 'stats':
+            stats = session.stats
+            return (f"{len(session.validated)} cached responses, TTL {session.ttl}s: {stats['hits']} hits, "
+                    f"{stats['revalidated']} revalidated, {stats['misses']} misses, {stats['invalidated']} invalidated")
+        case 'clear':
+            session.invalidate()
+            return "Cache cleared"
+    return "Invalid 'cache' command. Format: cache stats|clear"
+
+# Commands that only read, which batch mode runs concurrently
+READ_COMMANDS = {"list", "view", "average", "average-many"}
+# Number of threads, and pooled keep-alive connections, batch mode uses for reads
+BATCH_WORKERS = 8
+
+# Run one command from a batch, returning its output
+# Register and login take their details as arguments instead of prompting for them
+def run_batch_command(session, parts):
+    match parts[0].lower(), len(parts):
+        case 'list', 1:
+            return "\n".join(handle_list(session))
+        case 'view', 1:
+            return "\n".join(handle_view(session))
+        case 'average', 3:
+            return handle_average(session, parts[1], parts[2])
+        case 'average-many', n if n > 1 and n % 2:
+            return handle_average_many(session, list(zip(parts[1::2], parts[2::2])))
+        case 'rate', 6:
+            return handle_rate(session, *parts[1:])
+        case 'rate-status', 2:
+            return handle_rate_status(session, parts[1])
+        case 'register', 4:
+            return handle_register(session, *parts[1:])
+        case 'login', 4:
+            return handle_login(session, *parts[1:])
+        case 'logout', 1:
+            return handle_logout(session)
+        case 'cache', 2:
+            return handle_cache(session, parts[1].lower())
+    return f"Invalid command: {' '.join(parts)}"
+
+# Run commands read from lines of text, one per line, printing their output in input order
+# Reads run concurrently on a pool of threads sharing the session's pooled connections. Every other
+# command waits for the reads before it and finishes before anything after it starts, so e.g. an
+# average after a rate sees the new rating. Blank lines and lines starting with '#' are skipped.
+# Returns the number of commands run and the seconds taken
+def run_batch(session, lines, workers=BATCH_WORKERS, out=print):
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    started = time.perf_counter()
+    count = 0
+    with ThreadPoolExecutor(workers) as executor:
+        pending = deque()
+        for line in lines:
+            parts = line.split()
+            if not parts or parts[0].startswith("#"):
+                continue
+            if parts[0].lower() == 'exit':
+                break
+            count += 1
+            if parts[0].lower() in READ_COMMANDS:
+                pending.append(executor.submit(run_batch_command, session, parts))
+                # Print finished reads as soon as everything before them has been printed
+                while pending and pending[0].done():
+                    out(pending.popleft().result())
+                continue
+            while pending:
+                out(pending.popleft().result())
+            out(run_batch_command(session, parts))
+        while pending:
+            out(pending.popleft().result())
+    return count, time.perf_counter() - started
+
 # Main command loop
-def main():
+def main(session):
     print("Welcome to the API Client. Type 'exit' to quit.")
-    session = requests.session()
     
     # Continually ask for input
     while True:
@@ -154,14 +451,14 @@ def main():
                 if len(parts) != 1:
                     print("Invalid 'list' command. Format: list")
                     continue
-                response = handle_list(session)
-                print(response)
+                for output in handle_list(session):
+                    print(output, flush=True)
             case 'view':
                 if len(parts) != 1:
                     print("Invalid 'view' command. Format: view")
                     continue
-                response = handle_view(session)
-                print(response)
+                for output in handle_view(session):
+                    print(output, flush=True)
             case 'average':
                 if len(parts) != 3:
                     print("Invalid 'average' command. Format: average [professorCode] [moduleCode]")
@@ -170,6 +467,12 @@ def main():
                 moduleCode = parts[2]
                 response = handle_average(session, professorCode, moduleCode)
                 print(response)
+            case 'average-many':
+                if len(parts) < 3 or len(parts) % 2 == 0:
+                    print("Invalid 'average-many' command. Format: average-many [professorCode] [moduleCode] [professorCode] [moduleCode] ...")
+                    continue
+                response = handle_average_many(session, list(zip(parts[1::2], parts[2::2])))
+                print(response)
             case 'rate':
                 if len(parts) != 6:
                     print("Invalid 'rate' command. Format: rate [professorCode] [moduleCode] [year] [semester] [rating]")
@@ -181,9 +484,39 @@ def main():
                 rating = parts[5]
                 response = handle_rate(session, professorCode, moduleCode, year, semester, rating)
                 print(response)
+            case 'rate-status':
+                if len(parts) != 2:
+                    print("Invalid 'rate-status' command. Format: rate-status [id]")
+                    continue
+                response = handle_rate_status(session, parts[1])
+                print(response)
+            case 'cache':
+                if len(parts) != 2:
+                    print("Invalid 'cache' command. Format: cache stats|clear")
+                    continue
+                print(handle_cache(session, parts[1].lower()))
             case _:
                 print("Invalid command")
                 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="RateProfs API client")
+    parser.add_argument("--batch", metavar="FILE", help="Run the commands in FILE ('-' for stdin) instead of prompting")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help=f"Concurrent reads in batch mode (default: {BATCH_WORKERS})")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL, help=f"Seconds to reuse a response before revalidating it (default: {CACHE_TTL})")
+    parser.add_argument("--cache-file", help="Save the response cache to this file and load it on the next run")
+    parser.add_argument("--token", action="store_true", help="Log in with a signed token instead of a session cookie")
+    args = parser.parse_args()
+    USE_TOKEN = args.token
+    session = ConditionalSession(args.cache_ttl, args.cache_file)
+    try:
+        if args.batch:
+            batch = sys.stdin if args.batch == "-" else open(args.batch)
+            with batch:
+                count, elapsed = run_batch(session, batch, args.workers, out=lambda output: print(output, flush=True))
+            print(f"{count} commands in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.1f} commands/s)", file=sys.stderr)
+        else:
+            main(session)
+    finally:
+        if args.cache_file:
+            session.save()